@@ -0,0 +1,199 @@
+"""Аналитический снимок базы и отчеты по нему (выручка, отток, конверсия рефералов).
+
+Запуск:
+    python -m admin.analytics refresh             # пересобрать снимок
+    python -m admin.analytics revenue --days 30
+    python -m admin.analytics churn --months 6
+    python -m admin.analytics referrals --top 20
+
+Снимок - отдельный файл ANALYTICS_PATH: копия рабочей базы (через database/backup.py)
+с заранее посчитанными агрегатами. Отчеты читают только его и не касаются рабочего соединения бота.
+В обычном режиме снимок пересобирается из main.py каждые ANALYTICS_REFRESH_MIN минут.
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from utils.config_loader import config
+from database.backup import backup_manager
+from admin.export import open_readonly
+
+# Агрегаты считаются в копии один раз при сборке снимка
+AGGREGATES = [
+    """
+    CREATE TABLE agg_revenue_daily AS
+    SELECT substr(payment_date, 1, 10) AS day, tariff_type,
+           count(*) AS payments, sum(amount) AS revenue, sum(coalesce(discount_used, 0)) AS discounts
+    FROM payments WHERE status = 'completed'
+    GROUP BY day, tariff_type
+    """,
+    """
+    CREATE TABLE agg_signups_daily AS
+    SELECT substr(registration_date, 1, 10) AS day, count(*) AS users,
+           sum(referrer_phone IS NOT NULL) AS with_referrer, sum(has_paid) AS paid
+    FROM users
+    GROUP BY day
+    """,
+    # Подписка продлевается сдвигом subscription_end, поэтому истекшие в месяце - ушедшие в этом месяце
+    """
+    CREATE TABLE agg_churn_monthly AS
+    SELECT substr(subscription_end, 1, 7) AS month, tariff_type,
+           sum(subscription_end < :now) AS churned, sum(subscription_end >= :now) AS active
+    FROM users WHERE subscription_end IS NOT NULL
+    GROUP BY month, tariff_type
+    """,
+    """
+    CREATE TABLE agg_referrers AS
+    SELECT r.phone_number AS referrer_phone,
+           count(u.user_id) AS invited, coalesce(sum(u.has_paid), 0) AS paid,
+           coalesce((SELECT sum(bonus_amount) FROM referrals b WHERE b.referrer_key = r.phone_key), 0) AS bonus_total
+    FROM users r JOIN users u ON u.referrer_key = r.phone_key
+    GROUP BY r.user_id
+    """,
+    "CREATE TABLE snapshot_info AS SELECT :built_at AS built_at",
+]
+
+def build_aggregates(path: str) -> None:
+    """Агрегатные таблицы в копии базы (выполняется в отдельном потоке, рабочую базу не трогает)"""
+    connection = sqlite3.connect(path)
+    try:
+        params = {'now': datetime.now().isoformat(), 'built_at': datetime.now().isoformat(timespec='seconds')}
+        for statement in AGGREGATES:
+            connection.execute(statement, params)
+        connection.execute("CREATE INDEX idx_agg_revenue_day ON agg_revenue_daily (day)")
+        connection.execute("CREATE INDEX idx_agg_signups_day ON agg_signups_daily (day)")
+        connection.commit()
+        # Снимок только читается: WAL не нужен, один файл проще заменять
+        connection.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        connection.close()
+
+class AnalyticsSnapshot:
+    """Сборка и чтение аналитического снимка"""
+    
+    def __init__(self):
+        self.built_at: Optional[float] = None
+    
+    @property
+    def path(self) -> str:
+        return config.current.analytics_path
+    
+    async def refresh(self) -> str:
+        """Новый снимок: копия базы шагами, агрегаты в копии, атомарная замена файла"""
+        path = self.path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        building = f"{path}.new"
+        
+        started = time.perf_counter()
+        await backup_manager.snapshot(building)
+        await asyncio.to_thread(build_aggregates, building)
+        # Открытые отчеты дочитывают старый файл, новые открывают уже новый
+        os.replace(building, path)
+        self.built_at = time.time()
+        print(f"📊 Аналитический снимок обновлен за {time.perf_counter() - started:.1f} с: {path}")
+        return path
+    
+    async def refresh_periodically(self) -> None:
+        """Фоновое обновление снимка (интервал читается из текущих настроек)"""
+        while True:
+            interval = config.current.analytics_refresh_min
+            if interval <= 0:
+                # Обновление выключено - проверяем настройку раз в минуту
+                await asyncio.sleep(60)
+                continue
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"❌ Ошибка обновления аналитического снимка: {e}")
+            await asyncio.sleep(interval * 60)
+    
+    async def query(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        """Запрос к снимку (отдельное read-only соединение)"""
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"аналитический снимок не найден: {self.path} (python -m admin.analytics refresh)")
+        connection = await open_readonly(self.path)
+        try:
+            cursor = await connection.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in await cursor.fetchall()]
+        finally:
+            await connection.close()
+    
+    async def revenue(self, days: int = 30) -> List[Dict[str, Any]]:
+        """Выручка по дням и тарифам за последние days дней"""
+        since = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d')
+        return await self.query("""
+            SELECT day, tariff_type, payments, revenue, discounts
+            FROM agg_revenue_daily WHERE day >= ? ORDER BY day, tariff_type
+        """, (since,))
+    
+    async def churn(self, months: int = 6) -> List[Dict[str, Any]]:
+        """Отток по месяцам окончания подписки"""
+        return await self.query("""
+            SELECT month, sum(churned) AS churned, sum(active) AS active
+            FROM agg_churn_monthly GROUP BY month ORDER BY month DESC LIMIT ?
+        """, (months,))
+    
+    async def referral_conversion(self, top: int = 20) -> Dict[str, Any]:
+        """Конверсия приглашенных в оплату: в целом и по лучшим реферерам"""
+        totals = await self.query("""
+            SELECT coalesce(sum(users), 0) AS users, coalesce(sum(with_referrer), 0) AS with_referrer,
+                   coalesce(sum(paid), 0) AS paid
+            FROM agg_signups_daily
+        """)
+        referrers = await self.query("""
+            SELECT referrer_phone, invited, paid, bonus_total,
+                   round(100.0 * paid / invited, 1) AS conversion
+            FROM agg_referrers ORDER BY paid DESC, invited DESC LIMIT ?
+        """, (top,))
+        return {'totals': totals[0], 'referrers': referrers}
+
+# Глобальный аналитический снимок
+analytics = AnalyticsSnapshot()
+
+def print_rows(rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        print("(нет данных)")
+        return
+    columns = list(rows[0])
+    print(" | ".join(columns))
+    for row in rows:
+        print(" | ".join(str(row[column]) for column in columns))
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Аналитический снимок и отчеты")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('refresh', help="пересобрать снимок")
+    commands.add_parser('revenue', help="выручка по дням").add_argument('--days', type=int, default=30)
+    commands.add_parser('churn', help="отток по месяцам").add_argument('--months', type=int, default=6)
+    commands.add_parser('referrals', help="конверсия рефералов").add_argument('--top', type=int, default=20)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    async def main():
+        args = parse_args()
+        if args.command == 'refresh':
+            from database.connection import db
+            
+            await db.connect()
+            try:
+                await analytics.refresh()
+            finally:
+                await db.disconnect()
+        elif args.command == 'revenue':
+            print_rows(await analytics.revenue(args.days))
+        elif args.command == 'churn':
+            print_rows(await analytics.churn(args.months))
+        else:
+            conversion = await analytics.referral_conversion(args.top)
+            totals = conversion['totals']
+            rate = 100.0 * totals['paid'] / totals['users'] if totals['users'] else 0.0
+            print(f"👥 Пользователей: {totals['users']}, пришли по приглашению: {totals['with_referrer']}, "
+                  f"оплатили: {totals['paid']} ({rate:.1f}%)")
+            print_rows(conversion['referrers'])
+    
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""Потоковая выгрузка users / payments / referrals в CSV или NDJSON.
+
+Запуск (можно на работающем боте - выгрузка читает базу отдельным read-only соединением):
+    python -m admin.export payments --format csv --gzip
+    python -m admin.export referrals --format ndjson --since 2025-01-01 --until 2025-02-01 -o referrals.ndjson
+
+Строки читаются курсором пачками и сразу пишутся в файл, память не зависит от размера таблицы.
+Все пачки берутся из одной транзакции чтения - выгрузка согласована на момент начала.
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+from typing import IO, Any, AsyncIterator, List, Optional, Sequence, Tuple
+
+import aiosqlite
+
+from database.queries import USER_COLUMNS, PAYMENT_COLUMNS
+
+# Таблица -> (колонки, колонка даты для фильтра, ключ сортировки)
+EXPORTS = {
+    'users': (USER_COLUMNS, 'registration_date', 'user_id'),
+    'payments': (PAYMENT_COLUMNS, 'payment_date', 'payment_id'),
+    'referrals': (['id', 'referrer_phone', 'referred_phone', 'bonus_amount', 'earned_date'], 'earned_date', 'id'),
+}
+
+FORMATS = ('csv', 'ndjson')
+
+async def open_readonly(db_path: str) -> aiosqlite.Connection:
+    """Отдельное соединение только для чтения: в режиме WAL не блокирует запись бота"""
+    uri = f"file:{os.path.abspath(db_path)}?mode=ro"
+    connection = await aiosqlite.connect(uri, uri=True)
+    await connection.execute("PRAGMA busy_timeout = 5000")
+    return connection
+
+async def stream_rows(connection: aiosqlite.Connection, table: str, since: Optional[str] = None,
+                      until: Optional[str] = None, chunk_size: int = 1000) -> AsyncIterator[List[Tuple[Any, ...]]]:
+    """Пачки строк таблицы в порядке ключа (курсор не материализует всю выборку)"""
+    columns, date_column, order_by = EXPORTS[table]
+    conditions, params = [], []
+    if since:
+        conditions.append(f"{date_column} >= ?")
+        params.append(since)
+    if until:
+        conditions.append(f"{date_column} < ?")
+        params.append(until)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    cursor = await connection.execute(
+        f"SELECT {', '.join(columns)} FROM {table} {where} ORDER BY {order_by}", params
+    )
+    try:
+        while True:
+            rows = await cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        await cursor.close()
+
+class ExportWriter:
+    """Построчная запись CSV/NDJSON, при необходимости со сжатием gzip"""
+    
+    def __init__(self, file: IO[str], columns: Sequence[str], fmt: str):
+        self.file = file
+        self.columns = list(columns)
+        self.fmt = fmt
+        self._csv = csv.writer(file) if fmt == 'csv' else None
+        if self._csv:
+            self._csv.writerow(self.columns)
+    
+    def write(self, rows: List[Tuple[Any, ...]]) -> None:
+        if self._csv:
+            self._csv.writerows(rows)
+            return
+        self.file.writelines(
+            json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + "\n" for row in rows
+        )
+
+def _open_output(path: str, compress: bool) -> IO[str]:
+    if compress:
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+async def export_table(db_path: str, table: str, path: str, fmt: str = 'csv', compress: bool = False,
+                       since: Optional[str] = None, until: Optional[str] = None, chunk_size: int = 1000) -> int:
+    """Выгрузка таблицы в файл. Пишется во временный файл, который переименовывается после успеха"""
+    if table not in EXPORTS:
+        raise ValueError(f"неизвестная таблица {table}, доступны: {', '.join(EXPORTS)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"неизвестный формат {fmt}, доступны: {', '.join(FORMATS)}")
+    
+    columns = EXPORTS[table][0]
+    partial = f"{path}.part"
+    count = 0
+    connection = await open_readonly(db_path)
+    try:
+        # Одна транзакция чтения - все пачки видят один снимок базы
+        await connection.execute("BEGIN")
+        file = await asyncio.to_thread(_open_output, partial, compress)
+        try:
+            writer = ExportWriter(file, columns, fmt)
+            async for rows in stream_rows(connection, table, since, until, chunk_size):
+                # Запись на диск (и сжатие) - в потоке, event loop не блокируется
+                await asyncio.to_thread(writer.write, rows)
+                count += len(rows)
+        finally:
+            await asyncio.to_thread(file.close)
+        await connection.rollback()
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    finally:
+        await connection.close()
+    
+    os.replace(partial, path)
+    return count
+
+def default_path(table: str, fmt: str, compress: bool) -> str:
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    return os.path.join('exports', f"{table}-{stamp}.{fmt}{'.gz' if compress else ''}")
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Потоковая выгрузка таблиц бота")
+    parser.add_argument('table', choices=list(EXPORTS))
+    parser.add_argument('--format', dest='fmt', choices=FORMATS, default='csv')
+    parser.add_argument('--gzip', action='store_true', help="сжать выгрузку gzip")
+    parser.add_argument('--since', help="с даты включительно (YYYY-MM-DD или YYYY-MM-DD HH:MM:SS, UTC)")
+    parser.add_argument('--until', help="по дату не включительно")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="строк в одной пачке")
+    parser.add_argument('-o', '--output', help="файл выгрузки (по умолчанию exports/<таблица>-<время>)")
+    parser.add_argument('--db', help="путь к базе (по умолчанию база бота)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    async def main():
+        from database.connection import db
+        
+        args = parse_args()
+        path = args.output or default_path(args.table, args.fmt, args.gzip)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        
+        started = time.perf_counter()
+        count = await export_table(args.db or db.db_path, args.table, path, args.fmt, args.gzip,
+                                   args.since, args.until, args.chunk_size)
+        elapsed = time.perf_counter() - started
+        print(f"📤 {args.table}: выгружено {count} строк в {path} за {elapsed:.1f} с "
+              f"({os.path.getsize(path) / 1024:.0f} КБ)")
+    
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""Полнотекстовый поиск по переписке пользователей с ботом (для поддержки).
+
+Запуск (можно на работающем боте - поиск читает базу отдельным read-only соединением):
+    python -m admin.search "не пришла ссылка на урок"
+    python -m admin.search "возврат" --user 123456789 --limit 50
+    python -m admin.search "оплат*" --raw --before 15000      # синтаксис FTS5, следующая страница
+
+Индекс chat_search (FTS5) создается в database/connection.py и пополняется триггером
+при каждой записи в chat_history. Результаты - от новых к старым, страницы листаются
+по rowid последнего результата (--before), без OFFSET.
+"""
+import argparse
+import asyncio
+import re
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from admin.export import open_readonly
+
+# Слова запроса: буквы/цифры, остальное (кавычки, операторы FTS5) отбрасывается
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+@dataclass
+class SearchHit:
+    id: int
+    user_id: int
+    timestamp: str
+    message: str
+    response: str
+
+def build_match(query: str) -> str:
+    """Запрос пользователя -> выражение MATCH: все слова обязательны, совпадение по началу слова
+    
+    Префикс нужен для русских окончаний: "оплат" находит "оплата", "оплатил", "оплаты".
+    """
+    words = WORD_RE.findall(query.lower())
+    if not words:
+        raise ValueError("пустой поисковый запрос")
+    return " ".join(f'"{word}"*' for word in words)
+
+async def search_history(db_path: str, query: str, user_id: Optional[int] = None,
+                         since: Optional[str] = None, until: Optional[str] = None,
+                         before_id: Optional[int] = None, limit: int = 20, raw: bool = False) -> List[SearchHit]:
+    """Записи переписки по запросу, от новых к старым
+    
+    before_id - id последнего результата предыдущей страницы; raw - запрос уже в синтаксисе FTS5.
+    Найденные места выделяются в тексте [скобками].
+    """
+    conditions, params = ["chat_search MATCH ?"], [query if raw else build_match(query)]
+    if user_id is not None:
+        conditions.append("user_id = ?")
+        params.append(user_id)
+    if since:
+        conditions.append("timestamp >= ?")
+        params.append(since)
+    if until:
+        conditions.append("timestamp < ?")
+        params.append(until)
+    if before_id is not None:
+        conditions.append("rowid < ?")
+        params.append(before_id)
+    params.append(limit)
+    
+    connection = await open_readonly(db_path)
+    try:
+        cursor = await connection.execute(f"""
+            SELECT rowid, user_id, timestamp,
+                   snippet(chat_search, 0, '[', ']', '…', 16),
+                   snippet(chat_search, 1, '[', ']', '…', 16)
+            FROM chat_search WHERE {' AND '.join(conditions)}
+            ORDER BY rowid DESC LIMIT ?
+        """, params)
+        return [SearchHit(*row) for row in await cursor.fetchall()]
+    finally:
+        await connection.close()
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Поиск по переписке пользователей с ботом")
+    parser.add_argument('query', help="слова для поиска (все обязательны, по началу слова)")
+    parser.add_argument('--user', type=int, help="только переписка этого user_id")
+    parser.add_argument('--since', help="с даты включительно (YYYY-MM-DD или YYYY-MM-DD HH:MM:SS, UTC)")
+    parser.add_argument('--until', help="по дату не включительно")
+    parser.add_argument('--before', type=int, help="id последнего результата предыдущей страницы")
+    parser.add_argument('--limit', type=int, default=20, help="результатов на странице")
+    parser.add_argument('--raw', action='store_true', help="запрос в синтаксисе FTS5 (OR, NOT, \"фраза\", NEAR)")
+    parser.add_argument('--db', help="путь к базе (по умолчанию база бота)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    async def main():
+        from database.connection import db
+        
+        args = parse_args()
+        started = time.perf_counter()
+        hits = await search_history(args.db or db.db_path, args.query, args.user, args.since, args.until,
+                                    args.before, args.limit, args.raw)
+        elapsed = time.perf_counter() - started
+        
+        for hit in hits:
+            print(f"#{hit.id} 👤 {hit.user_id} 🕐 {hit.timestamp}")
+            print(f"   ❓ {hit.message}")
+            if hit.response:
+                print(f"   💬 {hit.response}")
+        print(f"🔍 Найдено на странице: {len(hits)} за {elapsed * 1000:.0f} мс")
+        if len(hits) == args.limit:
+            print(f"➡️ Следующая страница: --before {hits[-1].id}")
+    
+    asyncio.run(main())
\ No newline at end of file
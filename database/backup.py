@@ -0,0 +1,214 @@
+"""Онлайн резервное копирование базы без остановки бота.
+
+Запуск вручную:
+    python -m database.backup                      # снимок в BACKUP_DIR с ротацией
+    python -m database.backup --verify backups/bot_database-20250101-120000.db
+
+В обычном режиме копирование запускается из main.py каждые BACKUP_INTERVAL_HOURS часов.
+"""
+import argparse
+import asyncio
+import glob
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from utils.config_loader import config
+from database.connection import db
+
+@dataclass
+class BackupResult:
+    path: str
+    pages: int
+    size: int
+    seconds: float
+    integrity: str
+    # Задержка запроса к рабочему соединению бота до и во время копирования, мс
+    probe_before_ms: List[float] = field(default_factory=list)
+    probe_during_ms: List[float] = field(default_factory=list)
+    
+    @property
+    def ok(self) -> bool:
+        return self.integrity == 'ok'
+    
+    def __str__(self) -> str:
+        def p95(values: List[float]) -> float:
+            ordered = sorted(values)
+            return ordered[int(len(ordered) * 0.95)] if ordered else 0.0
+        
+        speed = self.size / 1024 / 1024 / self.seconds if self.seconds else 0.0
+        return (f"💾 Резервная копия {self.path}: {self.pages} страниц, {self.size / 1024 / 1024:.1f} МБ "
+                f"за {self.seconds:.1f} с ({speed:.1f} МБ/с), проверка: {self.integrity}; "
+                f"запрос к БД p95 {p95(self.probe_before_ms):.1f} мс до и "
+                f"{p95(self.probe_during_ms):.1f} мс во время копирования")
+
+def copy_database(source_path: str, target_path: str, pages_per_step: int, step_sleep: float) -> int:
+    """Копирование базы через online backup API небольшими шагами (выполняется в отдельном потоке)
+    
+    Источник открывается отдельным соединением и держит транзакцию чтения: в режиме WAL
+    копия согласована на момент начала и не перезапускается от записей бота, а сами
+    записи не блокируются. После каждого шага поток засыпает на step_sleep секунд
+    (в progress: параметр sleep у backup() действует только при занятой базе), отдавая диск
+    рабочему соединению.
+    """
+    source = sqlite3.connect(f"file:{os.path.abspath(source_path)}?mode=ro", uri=True)
+    target = sqlite3.connect(target_path)
+    try:
+        source.execute("PRAGMA busy_timeout = 5000")
+        source.execute("BEGIN")
+        source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        
+        copied = 0
+        def progress(status, remaining, total):
+            nonlocal copied
+            copied = total - remaining
+            if remaining and step_sleep > 0:
+                time.sleep(step_sleep)
+        
+        source.backup(target, pages=pages_per_step, progress=progress)
+        source.rollback()
+        return copied
+    finally:
+        target.close()
+        source.close()
+
+def verify_snapshot(path: str) -> str:
+    """PRAGMA integrity_check снимка: 'ok' или описание первой ошибки"""
+    connection = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        rows = connection.execute("PRAGMA integrity_check").fetchall()
+        return "ok" if rows == [("ok",)] else "; ".join(row[0] for row in rows[:5])
+    finally:
+        connection.close()
+
+def rotate(directory: str, prefix: str, keep: int) -> List[str]:
+    """Удаление старых снимков, остаются keep последних"""
+    snapshots = sorted(glob.glob(os.path.join(directory, f"{prefix}-*.db")))
+    removed = snapshots[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+class BackupManager:
+    """Снимки рабочей базы по расписанию: копирование шагами, проверка, ротация"""
+    
+    def __init__(self):
+        self._running = False
+        self.last: Optional[BackupResult] = None
+    
+    async def _probe(self, samples: List[float], stop: asyncio.Event, interval: float = 0.1) -> None:
+        """Замер задержки запроса к рабочему соединению (им пользуются обработчики)"""
+        while not stop.is_set():
+            started = time.perf_counter()
+            await db.fetchone("SELECT 1")
+            samples.append((time.perf_counter() - started) * 1000)
+            try:
+                await asyncio.wait_for(stop.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def snapshot(self, target_path: str, probe: bool = False) -> Tuple[int, float, List[float], List[float]]:
+        """Согласованная копия рабочей базы в target_path (без проверки и ротации)"""
+        settings = config.current
+        partial = f"{target_path}.part"
+        if os.path.exists(partial):
+            os.remove(partial)
+        
+        before: List[float] = []
+        during: List[float] = []
+        stop = asyncio.Event()
+        prober = None
+        if probe and db.connection is not None:
+            for _ in range(5):
+                started = time.perf_counter()
+                await db.fetchone("SELECT 1")
+                before.append((time.perf_counter() - started) * 1000)
+            prober = asyncio.create_task(self._probe(during, stop))
+        
+        started = time.perf_counter()
+        try:
+            pages = await asyncio.to_thread(
+                copy_database, db.db_path, partial,
+                settings.backup_pages_per_step, settings.backup_step_sleep_ms / 1000
+            )
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        finally:
+            stop.set()
+            if prober is not None:
+                await prober
+        elapsed = time.perf_counter() - started
+        
+        os.replace(partial, target_path)
+        return pages, elapsed, before, during
+    
+    async def run(self) -> Optional[BackupResult]:
+        """Снимок в BACKUP_DIR с проверкой целостности и ротацией"""
+        if self._running:
+            print("⚠️ Резервное копирование уже идет")
+            return None
+        self._running = True
+        try:
+            settings = config.current
+            os.makedirs(settings.backup_dir, exist_ok=True)
+            prefix = os.path.splitext(os.path.basename(db.db_path))[0]
+            path = os.path.join(settings.backup_dir, f"{prefix}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.db")
+            
+            pages, elapsed, before, during = await self.snapshot(path, probe=True)
+            integrity = await asyncio.to_thread(verify_snapshot, path)
+            result = BackupResult(path, pages, os.path.getsize(path), elapsed, integrity, before, during)
+            
+            if not result.ok:
+                # Битый снимок не должен вытеснить рабочие при ротации
+                os.replace(path, f"{path}.corrupt")
+                print(f"❌ Снимок не прошел проверку целостности: {integrity}")
+            else:
+                removed = await asyncio.to_thread(rotate, settings.backup_dir, prefix, settings.backup_keep)
+                if removed:
+                    print(f"🧹 Удалено старых снимков: {len(removed)}")
+            print(result)
+            self.last = result
+            return result
+        finally:
+            self._running = False
+    
+    async def run_periodically(self) -> None:
+        """Фоновое копирование (интервал читается из текущих настроек)"""
+        while True:
+            interval = config.current.backup_interval_hours
+            if interval <= 0:
+                # Копирование выключено - проверяем настройку раз в минуту
+                await asyncio.sleep(60)
+                continue
+            await asyncio.sleep(interval * 3600)
+            try:
+                await self.run()
+            except Exception as e:
+                print(f"❌ Ошибка резервного копирования: {e}")
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Онлайн резервное копирование базы бота")
+    parser.add_argument('--verify', metavar='PATH', help="только проверить целостность снимка")
+    return parser.parse_args()
+
+# Глобальный менеджер резервного копирования
+backup_manager = BackupManager()
+
+if __name__ == "__main__":
+    async def main():
+        args = parse_args()
+        if args.verify:
+            print(f"🔍 {args.verify}: {verify_snapshot(args.verify)}")
+            return
+        await db.connect()
+        try:
+            await backup_manager.run()
+        finally:
+            await db.disconnect()
+    
+    asyncio.run(main())
\ No newline at end of file
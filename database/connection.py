@@ -1,7 +1,10 @@
 import aiosqlite
 import asyncio
+import time
 from typing import Optional
 from utils.config_loader import config
+from database.query_stats import QueryStats
+from utils.phone import normalize_phone
 
 class Database:
     """Класс для работы с базой данных SQLite"""
@@ -9,12 +12,26 @@ class Database:
     def __init__(self):
         self.db_path = "bot_database.db"  # SQLite база для разработки
         self.connection: Optional[aiosqlite.Connection] = None
+        
+        # Инструментирование запросов: время, количество строк, журнал медленных запросов
+        self.query_stats = QueryStats()
+        self._apply_settings(config.current)
+        config.on_reload(self._apply_settings)
+    
+    def _apply_settings(self, settings):
+        """Применение настроек инструментирования (в том числе после перезагрузки)"""
+        self.query_stats.enabled = settings.db_query_stats
+        self.query_stats.slow_ms = settings.db_slow_query_ms
+        self.query_stats.explain_slow = settings.db_explain_slow
     
     async def connect(self):
         """Подключение к базе данных"""
         try:
             self.connection = await aiosqlite.connect(self.db_path)
             await self.connection.execute("PRAGMA foreign_keys = ON")  # Включаем внешние ключи
+            # WAL и ожидание блокировки - база используется несколькими процессами-воркерами
+            await self.connection.execute("PRAGMA journal_mode = WAL")
+            await self.connection.execute("PRAGMA busy_timeout = 5000")
             print("✅ Подключение к базе данных установлено")
             await self.create_tables()
         except Exception as e:
@@ -24,6 +41,8 @@ class Database:
     async def disconnect(self):
         """Отключение от базы данных"""
         if self.connection:
+            if self.query_stats.enabled and self.query_stats.stats:
+                print(self.query_stats.report())
             await self.connection.close()
             print("✅ Соединение с базой данных закрыто")
     
@@ -47,6 +66,8 @@ class Database:
                 privacy_consent BOOLEAN DEFAULT FALSE,
                 privacy_consent_date DATETIME,
                 waiting_for_referrer BOOLEAN DEFAULT FALSE,
+                phone_key INTEGER,
+                referrer_key INTEGER,
                 FOREIGN KEY (referrer_phone) REFERENCES users (phone_number)
             )
         """)
@@ -60,6 +81,7 @@ class Database:
                 tariff_type INTEGER NOT NULL,
                 payment_date DATETIME DEFAULT CURRENT_TIMESTAMP,
                 status TEXT DEFAULT 'pending',
+                discount_used REAL DEFAULT 0,
                 FOREIGN KEY (user_id) REFERENCES users (user_id)
             )
         """)
@@ -76,6 +98,27 @@ class Database:
             )
         """)
         
+        # Кэш file_id Telegram для вложений уроков (чтобы не загружать файлы повторно)
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS media_file_ids (
+                media_key TEXT PRIMARY KEY,
+                file_id TEXT NOT NULL,
+                media_type TEXT,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Резюме старых реплик диалога (свернуты все записи истории с id <= summarized_upto)
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS chat_summaries (
+                user_id INTEGER PRIMARY KEY,
+                summary TEXT NOT NULL,
+                summarized_upto INTEGER NOT NULL DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (user_id)
+            )
+        """)
+        
         # Таблица рефералов (для статистики)
         await self.connection.execute("""
             CREATE TABLE IF NOT EXISTS referrals (
@@ -84,19 +127,192 @@ class Database:
                 referred_phone TEXT NOT NULL,
                 bonus_amount REAL NOT NULL,
                 earned_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+                referrer_key INTEGER,
+                referred_key INTEGER,
                 FOREIGN KEY (referrer_phone) REFERENCES users (phone_number),
                 FOREIGN KEY (referred_phone) REFERENCES users (phone_number)
             )
         """)
         
+        # Кэш ответов LLM (ключ - хэш системного сообщения и нормализованного вопроса)
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_hit REAL NOT NULL,
+                hits INTEGER DEFAULT 0,
+                gen_ms REAL DEFAULT 0
+            )
+        """)
+        await self.connection.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_hit ON llm_cache (last_hit)")
+        
+        # Состояния FSM (регистрация и т.п.), в памяти кэшируются хранилищем utils/fsm_storage.py
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS fsm_states (
+                storage_key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL DEFAULT '{}',
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Выполненные разовые миграции данных (повторно при запуске не выполняются)
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name TEXT PRIMARY KEY,
+                applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Временные записи регистрации (temp_<id>) больше не создаются - данные шагов хранятся в FSM
+        await self.connection.execute("""
+            DELETE FROM users
+            WHERE phone_number LIKE 'temp!_%' ESCAPE '!'
+              AND user_id NOT IN (SELECT user_id FROM payments)
+              AND user_id NOT IN (SELECT user_id FROM chat_history)
+        """)
+        
+        # Целочисленные ключи телефонов (E.164 без +) - поиск по индексу без расхождений в формате
+        await self._migrate_phone_keys()
+        await self.connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_phone_key ON users (phone_key)")
+        await self.connection.execute("CREATE INDEX IF NOT EXISTS idx_users_referrer_key ON users (referrer_key)")
+        await self.connection.execute("CREATE INDEX IF NOT EXISTS idx_referrals_referrer_key ON referrals (referrer_key)")
+        
+        # История пользователя читается и обрезается по (user_id, id)
+        await self.connection.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_user ON chat_history (user_id, id)")
+        
+        # Полнотекстовый поиск по переписке (admin/search.py)
+        await self._create_chat_search()
+        
+        # Скидка с реферального баланса нужна для проведения платежа сверкой (services/reconciliation.py)
+        await self._add_column("payments", "discount_used", "REAL DEFAULT 0")
+        await self.connection.execute("CREATE INDEX IF NOT EXISTS idx_payments_status ON payments (status, payment_id)")
+        
         await self.connection.commit()
         print("✅ Таблицы базы данных созданы/обновлены")
     
+    async def _create_chat_search(self):
+        """Индекс FTS5 по chat_history, пополняется триггером при каждой записи истории
+        
+        Индекс хранит свою копию текста: chat_history обрезается после сворачивания в резюме,
+        а поиск для поддержки должен видеть переписку за месяцы. Срок хранения - CHAT_SEARCH_RETENTION_DAYS.
+        """
+        try:
+            await self.connection.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS chat_search USING fts5(
+                    message, response,
+                    user_id UNINDEXED, timestamp UNINDEXED,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3'
+                )
+            """)
+        except aiosqlite.OperationalError as e:
+            print(f"⚠️ FTS5 недоступен в этой сборке SQLite, поиск по переписке отключен: {e}")
+            return
+        
+        await self.connection.execute("""
+            CREATE TRIGGER IF NOT EXISTS chat_history_search_insert AFTER INSERT ON chat_history
+            BEGIN
+                INSERT INTO chat_search (rowid, message, response, user_id, timestamp)
+                VALUES (new.id, new.message, coalesce(new.response, ''), new.user_id, new.timestamp);
+            END
+        """)
+        
+        # Дозаполнение записями, появившимися до создания индекса
+        await self.connection.execute("""
+            INSERT INTO chat_search (rowid, message, response, user_id, timestamp)
+            SELECT id, message, coalesce(response, ''), user_id, timestamp FROM chat_history
+            WHERE id > (SELECT coalesce(max(rowid), 0) FROM chat_search)
+        """)
+        
+        retention_days = config.current.chat_search_retention_days
+        if retention_days > 0:
+            await self.connection.execute("""
+                DELETE FROM chat_search WHERE timestamp < datetime('now', ?)
+            """, (f"-{retention_days} days",))
+    
+    async def _add_column(self, table: str, column: str, definition: str):
+        """Добавление колонки в существующую таблицу, если ее еще нет"""
+        cursor = await self.connection.execute(f"PRAGMA table_info({table})")
+        columns = {row[1] for row in await cursor.fetchall()}
+        if column not in columns:
+            await self.connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
+    async def _migrate_phone_keys(self):
+        """Нормализация старых номеров к E.164 и заполнение phone_key / referrer_key (один раз)
+        
+        Новые записи получают ключи при создании. Нераспознанные номера (в том числе оставленные
+        temp_<id>) остаются без ключа для ручного разбора и при следующих запусках не перечитываются.
+        """
+        await self._add_column("users", "phone_key", "INTEGER")
+        await self._add_column("users", "referrer_key", "INTEGER")
+        await self._add_column("referrals", "referrer_key", "INTEGER")
+        await self._add_column("referrals", "referred_key", "INTEGER")
+        
+        cursor = await self.connection.execute("SELECT 1 FROM schema_migrations WHERE name = 'phone_keys'")
+        if await cursor.fetchone():
+            return
+        
+        cursor = await self.connection.execute("""
+            SELECT user_id, phone_number, referrer_phone FROM users WHERE phone_key IS NULL
+        """)
+        rows = await cursor.fetchall()
+        if rows:
+            # Текстовые номера - ключи внешних ключей; на время переписывания проверки отключаем
+            await self.connection.commit()
+            await self.connection.execute("PRAGMA foreign_keys = OFF")
+            try:
+                await self._fill_phone_keys(rows)
+            finally:
+                await self.connection.commit()
+                await self.connection.execute("PRAGMA foreign_keys = ON")
+        
+        await self.connection.execute("INSERT OR IGNORE INTO schema_migrations (name) VALUES ('phone_keys')")
+    
+    async def _fill_phone_keys(self, rows):
+        """Переписывание номеров пользователей и рефералов в E.164 с целочисленными ключами"""
+        seen = set()
+        skipped = 0
+        for user_id, phone_number, referrer_phone in rows:
+            phone = normalize_phone(phone_number)
+            referrer = normalize_phone(referrer_phone)
+            if phone is None or phone in seen:
+                # Не номер или дубликат после нормализации - оставляем как есть для ручного разбора
+                skipped += 1
+                continue
+            seen.add(phone)
+            try:
+                await self.connection.execute("""
+                    UPDATE users SET phone_number = ?, phone_key = ?, referrer_phone = ?, referrer_key = ?
+                    WHERE user_id = ?
+                """, (phone, int(phone[1:]), referrer or referrer_phone,
+                      int(referrer[1:]) if referrer else None, user_id))
+            except aiosqlite.IntegrityError:
+                skipped += 1
+        
+        cursor = await self.connection.execute("""
+            SELECT id, referrer_phone, referred_phone FROM referrals WHERE referrer_key IS NULL
+        """)
+        for referral_id, referrer_phone, referred_phone in await cursor.fetchall():
+            referrer = normalize_phone(referrer_phone)
+            referred = normalize_phone(referred_phone)
+            await self.connection.execute("""
+                UPDATE referrals SET referrer_phone = ?, referred_phone = ?, referrer_key = ?, referred_key = ?
+                WHERE id = ?
+            """, (referrer or referrer_phone, referred or referred_phone,
+                  int(referrer[1:]) if referrer else None, int(referred[1:]) if referred else None, referral_id))
+        
+        print(f"📱 Номера телефонов нормализованы: {len(rows) - skipped}, пропущено: {skipped}")
+    
     async def execute(self, query: str, params: tuple = ()):
         """Выполнение SQL запроса"""
         try:
+            started = time.perf_counter()
             cursor = await self.connection.execute(query, params)
             await self.connection.commit()
+            if self.query_stats.enabled:
+                await self._record(query, params, started, max(cursor.rowcount, 0))
             return cursor
         except Exception as e:
             print(f"❌ Ошибка выполнения запроса: {e}")
@@ -105,8 +321,12 @@ class Database:
     async def fetchone(self, query: str, params: tuple = ()):
         """Получение одной записи"""
         try:
+            started = time.perf_counter()
             cursor = await self.connection.execute(query, params)
-            return await cursor.fetchone()
+            row = await cursor.fetchone()
+            if self.query_stats.enabled:
+                await self._record(query, params, started, 1 if row else 0)
+            return row
         except Exception as e:
             print(f"❌ Ошибка получения записи: {e}")
             raise
@@ -114,11 +334,30 @@ class Database:
     async def fetchall(self, query: str, params: tuple = ()):
         """Получение всех записей"""
         try:
+            started = time.perf_counter()
             cursor = await self.connection.execute(query, params)
-            return await cursor.fetchall()
+            rows = await cursor.fetchall()
+            if self.query_stats.enabled:
+                await self._record(query, params, started, len(rows))
+            return rows
         except Exception as e:
             print(f"❌ Ошибка получения записей: {e}")
             raise
+    
+    async def _record(self, query: str, params: tuple, started: float, rows: int):
+        """Запись статистики запроса и снятие плана для новых медленных запросов"""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stat = self.query_stats.record(query, params, elapsed_ms, rows)
+        if stat is None:
+            return
+        
+        try:
+            cursor = await self.connection.execute(f"EXPLAIN QUERY PLAN {query}", params)
+            plan_rows = await cursor.fetchall()
+            stat.plan = " | ".join(str(row[-1]) for row in plan_rows)
+            print(f"🔎 План запроса: {stat.plan}")
+        except Exception as e:
+            print(f"⚠️ Не удалось получить план запроса: {e}")
 
 # Глобальный экземпляр базы данных
 db = Database()
\ No newline at end of file
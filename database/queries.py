@@ -1,6 +1,16 @@
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from database.connection import db
+from utils.phone import normalize_phone, phone_key
+
+# Колонки users в порядке выборки (SELECT * зависел бы от порядка ALTER TABLE)
+USER_COLUMNS = ['user_id', 'username', 'first_name', 'phone_number', 'registration_date',
+                'referrer_phone', 'referral_balance', 'subscription_end', 'tariff_type',
+                'tariff2_counter', 'has_paid', 'privacy_consent', 'privacy_consent_date', 'waiting_for_referrer']
+USER_SELECT = f"SELECT {', '.join(USER_COLUMNS)} FROM users"
+
+PAYMENT_COLUMNS = ['payment_id', 'user_id', 'amount', 'tariff_type', 'payment_date', 'status', 'discount_used']
+PAYMENT_SELECT = f"SELECT {', '.join(PAYMENT_COLUMNS)} FROM payments"
 
 class UserQueries:
     """Запросы для работы с пользователями"""
@@ -8,15 +18,18 @@ class UserQueries:
     @staticmethod
     async def create_user(user_id: int, phone_number: str, username: str = None, 
                          first_name: str = None, referrer_phone: str = None) -> bool:
-        """Создание нового пользователя"""
+        """Создание нового пользователя (номера приводятся к E.164)"""
         try:
+            phone_number = normalize_phone(phone_number) or phone_number
+            referrer_phone = normalize_phone(referrer_phone) or referrer_phone
             print(f"🔍 Создаем пользователя: user_id={user_id}, phone={phone_number}, referrer={referrer_phone}")
             
             await db.execute("""
                 INSERT OR REPLACE INTO users 
-                (user_id, phone_number, username, first_name, referrer_phone)
-                VALUES (?, ?, ?, ?, ?)
-            """, (user_id, phone_number, username, first_name, referrer_phone))
+                (user_id, phone_number, username, first_name, referrer_phone, phone_key, referrer_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (user_id, phone_number, username, first_name, referrer_phone,
+                  phone_key(phone_number), phone_key(referrer_phone)))
             return True
         except Exception as e:
             print(f"❌ Ошибка создания пользователя: {e}")
@@ -26,12 +39,9 @@ class UserQueries:
     async def get_user(user_id: int) -> Optional[Dict[str, Any]]:
         """Получение пользователя по ID"""
         try:
-            row = await db.fetchone("SELECT * FROM users WHERE user_id = ?", (user_id,))
+            row = await db.fetchone(f"{USER_SELECT} WHERE user_id = ?", (user_id,))
             if row:
-                columns = ['user_id', 'username', 'first_name', 'phone_number', 'registration_date',
-                          'referrer_phone', 'referral_balance', 'subscription_end', 'tariff_type', 
-                          'tariff2_counter', 'has_paid', 'privacy_consent', 'privacy_consent_date', 'waiting_for_referrer']
-                return dict(zip(columns, row))
+                return dict(zip(USER_COLUMNS, row))
             return None
         except Exception as e:
             print(f"❌ Ошибка получения пользователя: {e}")
@@ -39,14 +49,14 @@ class UserQueries:
     
     @staticmethod
     async def get_user_by_phone(phone_number: str) -> Optional[Dict[str, Any]]:
-        """Получение пользователя по номеру телефона (для веб-хука)"""
+        """Получение пользователя по номеру телефона в любом формате (для веб-хука)"""
         try:
-            row = await db.fetchone("SELECT * FROM users WHERE phone_number = ?", (phone_number,))
+            key = phone_key(phone_number)
+            if key is None:
+                return None
+            row = await db.fetchone(f"{USER_SELECT} WHERE phone_key = ?", (key,))
             if row:
-                columns = ['user_id', 'username', 'first_name', 'phone_number', 'registration_date',
-                          'referrer_phone', 'referral_balance', 'subscription_end', 'tariff_type', 
-                          'tariff2_counter', 'has_paid', 'privacy_consent', 'privacy_consent_date', 'waiting_for_referrer']
-                return dict(zip(columns, row))
+                return dict(zip(USER_COLUMNS, row))
             return None
         except Exception as e:
             print(f"❌ Ошибка получения пользователя по телефону: {e}")
@@ -72,14 +82,14 @@ class UserQueries:
                 await db.execute("""
                     UPDATE users 
                     SET subscription_end = ?, tariff_type = ?, tariff2_counter = tariff2_counter + 1, has_paid = TRUE
-                    WHERE phone_number = ?
-                """, (new_end.isoformat(), tariff_type, phone_number))
+                    WHERE phone_key = ?
+                """, (new_end.isoformat(), tariff_type, phone_key(phone_number)))
             else:
                 await db.execute("""
                     UPDATE users 
                     SET subscription_end = ?, tariff_type = ?, has_paid = TRUE
-                    WHERE phone_number = ?
-                """, (new_end.isoformat(), tariff_type, phone_number))
+                    WHERE phone_key = ?
+                """, (new_end.isoformat(), tariff_type, phone_key(phone_number)))
             
             return True
         except Exception as e:
@@ -91,15 +101,25 @@ class UserQueries:
         """Проверка активности подписки"""
         try:
             user = await UserQueries.get_user(user_id)
-            if not user or not user['subscription_end']:
-                return False
-            
-            end_date = datetime.fromisoformat(user['subscription_end'])
-            return end_date > datetime.now()
+            return UserQueries.is_subscription_active(user)
         except Exception as e:
             print(f"❌ Ошибка проверки подписки: {e}")
             return False
     
+    @staticmethod
+    def is_subscription_active(user: Optional[Dict[str, Any]]) -> bool:
+        """Проверка активности подписки по уже загруженным данным пользователя"""
+        if not user or not user['subscription_end']:
+            return False
+        
+        end_date = datetime.fromisoformat(user['subscription_end'])
+        return end_date > datetime.now()
+    
+    @staticmethod
+    def is_registered(user: Optional[Dict[str, Any]]) -> bool:
+        """Пользователь прошел регистрацию (temp_<id> - незавершенная регистрация старых версий)"""
+        return bool(user and user['phone_number'] and not user['phone_number'].startswith('temp_'))
+    
     @staticmethod
     async def get_users_expiring_soon(days: int) -> list:
         """Получение пользователей с истекающей подпиской"""
@@ -123,13 +143,14 @@ class PaymentQueries:
     """Запросы для работы с платежами"""
     
     @staticmethod
-    async def create_payment(payment_id: str, user_id: int, amount: float, tariff_type: int) -> bool:
+    async def create_payment(payment_id: str, user_id: int, amount: float, tariff_type: int,
+                             discount_used: float = 0.0) -> bool:
         """Создание записи о платеже"""
         try:
             await db.execute("""
-                INSERT INTO payments (payment_id, user_id, amount, tariff_type)
-                VALUES (?, ?, ?, ?)
-            """, (payment_id, user_id, amount, tariff_type))
+                INSERT INTO payments (payment_id, user_id, amount, tariff_type, discount_used)
+                VALUES (?, ?, ?, ?, ?)
+            """, (payment_id, user_id, amount, tariff_type, discount_used))
             return True
         except Exception as e:
             print(f"❌ Ошибка создания платежа: {e}")
@@ -146,6 +167,37 @@ class PaymentQueries:
         except Exception as e:
             print(f"❌ Ошибка обновления статуса платежа: {e}")
             return False
+    
+    @staticmethod
+    async def get_payment(payment_id: str) -> Optional[Dict[str, Any]]:
+        """Получение платежа по ID"""
+        try:
+            row = await db.fetchone(f"{PAYMENT_SELECT} WHERE payment_id = ?", (payment_id,))
+            return dict(zip(PAYMENT_COLUMNS, row)) if row else None
+        except Exception as e:
+            print(f"❌ Ошибка получения платежа: {e}")
+            return None
+    
+    @staticmethod
+    async def get_pending_payments(after_id: str, created_after: str, created_before: str,
+                                   limit: int) -> List[Dict[str, Any]]:
+        """Пачка ожидающих платежей по индексу (status, payment_id) - постранично по ключу"""
+        rows = await db.fetchall(f"""
+            {PAYMENT_SELECT}
+            WHERE status = 'pending' AND payment_id > ?
+              AND payment_date >= ? AND payment_date < ?
+            ORDER BY payment_id
+            LIMIT ?
+        """, (after_id, created_after, created_before, limit))
+        return [dict(zip(PAYMENT_COLUMNS, row)) for row in rows]
+    
+    @staticmethod
+    async def claim_pending_payment(payment_id: str, status: str) -> bool:
+        """Смена статуса только ожидающего платежа. False - платеж уже обработан (веб-хуком или сверкой)"""
+        cursor = await db.execute("""
+            UPDATE payments SET status = ? WHERE payment_id = ? AND status = 'pending'
+        """, (status, payment_id))
+        return cursor.rowcount == 1
 
 class ReferralQueries:
     """Запросы для работы с реферальной системой"""
@@ -154,17 +206,20 @@ class ReferralQueries:
     async def add_referral_bonus(referrer_phone: str, referred_phone: str, bonus_amount: float) -> bool:
         """Начисление реферального бонуса"""
         try:
+            referrer_phone = normalize_phone(referrer_phone) or referrer_phone
+            referred_phone = normalize_phone(referred_phone) or referred_phone
+            
             # Добавляем бонус к балансу реферера
             await db.execute("""
                 UPDATE users SET referral_balance = referral_balance + ? 
-                WHERE phone_number = ?
-            """, (bonus_amount, referrer_phone))
+                WHERE phone_key = ?
+            """, (bonus_amount, phone_key(referrer_phone)))
             
             # Записываем в таблицу рефералов
             await db.execute("""
-                INSERT INTO referrals (referrer_phone, referred_phone, bonus_amount)
-                VALUES (?, ?, ?)
-            """, (referrer_phone, referred_phone, bonus_amount))
+                INSERT INTO referrals (referrer_phone, referred_phone, bonus_amount, referrer_key, referred_key)
+                VALUES (?, ?, ?, ?, ?)
+            """, (referrer_phone, referred_phone, bonus_amount, phone_key(referrer_phone), phone_key(referred_phone)))
             
             return True
         except Exception as e:
@@ -181,8 +236,8 @@ class ReferralQueries:
             
             await db.execute("""
                 UPDATE users SET referral_balance = referral_balance - ? 
-                WHERE phone_number = ?
-            """, (amount, phone_number))
+                WHERE phone_key = ?
+            """, (amount, phone_key(phone_number)))
             
             return True
         except Exception as e:
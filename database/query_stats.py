@@ -0,0 +1,98 @@
+import re
+import time
+from collections import deque
+from typing import Dict, Optional
+
+
+class QueryStat:
+    """Агрегированная статистика по одному отпечатку запроса"""
+
+    __slots__ = ('fingerprint', 'calls', 'total_ms', 'max_ms', 'rows', 'slow_calls', 'plan')
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.slow_calls = 0
+        self.plan: Optional[str] = None
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
+
+
+class QueryStats:
+    """Учет времени выполнения SQL запросов и журнал медленных запросов"""
+
+    _LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+    _SPACE_RE = re.compile(r"\s+")
+
+    def __init__(self, slow_ms: float = 100.0, explain_slow: bool = True, slow_log_size: int = 100):
+        self.enabled = True
+        self.slow_ms = slow_ms
+        self.explain_slow = explain_slow
+        self.stats: Dict[str, QueryStat] = {}
+        self.slow_log = deque(maxlen=slow_log_size)
+        # Кэш отпечатков: запросы в коде - константные строки, нормализуем каждую один раз
+        self._fingerprints: Dict[str, str] = {}
+
+    def fingerprint(self, query: str) -> str:
+        """Нормализованный отпечаток запроса (без литералов и лишних пробелов)"""
+        fp = self._fingerprints.get(query)
+        if fp is None:
+            fp = self._LITERAL_RE.sub('?', query)
+            fp = self._SPACE_RE.sub(' ', fp).strip()
+            self._fingerprints[query] = fp
+        return fp
+
+    def record(self, query: str, params: tuple, elapsed_ms: float, rows: int) -> Optional[QueryStat]:
+        """Учитывает выполненный запрос. Возвращает статистику, если для запроса нужен план"""
+        fp = self.fingerprint(query)
+        stat = self.stats.get(fp)
+        if stat is None:
+            stat = self.stats[fp] = QueryStat(fp)
+
+        stat.calls += 1
+        stat.total_ms += elapsed_ms
+        stat.rows += rows
+        if elapsed_ms > stat.max_ms:
+            stat.max_ms = elapsed_ms
+
+        if elapsed_ms < self.slow_ms:
+            return None
+
+        stat.slow_calls += 1
+        self.slow_log.append((time.time(), fp, params, elapsed_ms))
+        print(f"🐢 Медленный запрос ({elapsed_ms:.1f} мс): {fp} {params}")
+
+        # План выполнения снимаем только при первом медленном вызове отпечатка
+        if self.explain_slow and stat.slow_calls == 1:
+            return stat
+        return None
+
+    def reset(self) -> None:
+        """Сброс накопленной статистики"""
+        self.stats.clear()
+        self.slow_log.clear()
+
+    def top(self, limit: int = 10, key: str = 'total_ms') -> list[QueryStat]:
+        """Самые затратные запросы по выбранной метрике"""
+        return sorted(self.stats.values(), key=lambda s: getattr(s, key), reverse=True)[:limit]
+
+    def report(self, limit: int = 10) -> str:
+        """Текстовый отчет по самым затратным запросам"""
+        if not self.stats:
+            return "📊 Статистика запросов пуста"
+
+        lines = ["📊 Статистика запросов (по суммарному времени):"]
+        for stat in self.top(limit):
+            lines.append(
+                f"• {stat.calls} вызовов, всего {stat.total_ms:.1f} мс, "
+                f"среднее {stat.avg_ms:.2f} мс, макс {stat.max_ms:.1f} мс, "
+                f"строк {stat.rows}, медленных {stat.slow_calls}\n  {stat.fingerprint}"
+            )
+            if stat.plan:
+                lines.append(f"  План: {stat.plan}")
+        return "\n".join(lines)
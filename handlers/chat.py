@@ -1,34 +1,64 @@
+import asyncio
+
 from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.filters import StateFilter
 
 from database.queries import UserQueries
-from services.openai_service import OpenAIService
+from services.openai_service import OpenAIService, OpenAIBusyError, BUSY_MESSAGE, ERROR_MESSAGE
+from services.message_coalescer import MessageCoalescer, Flight
+from services.faq import faq
+from utils.config_loader import config
+from utils.stream_renderer import StreamRenderer
 
 router = Router()
 
-@router.message(F.text & ~F.text.startswith("/"))
+@router.message(StateFilter(None), F.text & ~F.text.startswith("/"), flags={"rate_limit": "chat"})
 async def handle_user_message(message: Message):
     """Обработка обычных сообщений пользователя"""
+    # Несколько сообщений подряд объединяются в одну реплику
+    await coalescer.submit(message)
+
+async def process_user_turn(message: Message, user_text: str, flight: Flight):
+    """Обработка объединенной реплики пользователя"""
     user_id = message.from_user.id
-    user_text = message.text
     
-    # Проверяем подписку пользователя
-    has_subscription = await UserQueries.check_subscription(user_id)
+    # Проверяем подписку пользователя (данные нужны и для приоритета в очереди OpenAI)
+    user_data = await UserQueries.get_user(user_id)
+    has_subscription = UserQueries.is_subscription_active(user_data)
     
     if not has_subscription:
+        flight.answering = True
         await message.answer(
             "❌ У вас нет активной подписки!\n\n"
             "Для использования бота оформите подписку командой /start"
         )
         return
     
+    # Частый вопрос - отвечаем сразу, без OpenAI (срок подписки и уроки - из данных пользователя)
+    faq_answer = faq.answer(user_text, user_data)
+    if faq_answer:
+        flight.answering = True
+        await message.answer(faq_answer)
+        await OpenAIService.save_to_history(user_id, user_text, faq_answer)
+        return
+    
+    # Потоковый режим: ответ появляется по мере генерации
+    streaming = config.current.openai_streaming
+    if streaming and OpenAIService.is_configured():
+        await answer_streaming(message, user_id, user_text, flight, user_data['tariff_type'],
+                               user_data['tariff2_counter'] or 0)
+        return
+    
     # Показываем, что бот печатает
     await message.bot.send_chat_action(chat_id=user_id, action="typing")
     
     try:
-        # Получаем ответ от OpenAI (или заглушки)
-        ai_response = await OpenAIService.get_response(user_id, user_text)
+        # Получаем ответ от OpenAI (или заглушки). Генерацию можно отменить новым сообщением,
+        # пока ответ не записан в историю
+        ai_response = await OpenAIService.get_response(user_id, user_text, user_data['tariff_type'],
+                                                       user_data['tariff2_counter'] or 0, flight.start_answer)
+        flight.answering = True
         
         # Отправляем ответ пользователю
         await message.answer(ai_response)
@@ -38,4 +68,29 @@ async def handle_user_message(message: Message):
         await message.answer(
             "😔 Произошла ошибка при обработке вашего сообщения.\n"
             "Попробуйте еще раз через несколько секунд."
-        )
\ No newline at end of file
+        )
+
+async def answer_streaming(message: Message, user_id: int, user_text: str, flight: Flight, tariff_type: int = None,
+                           lessons_received: int = 0):
+    """Отправка ответа с постепенным обновлением сообщения"""
+    placeholder = await message.answer("✍️ Думаю...")
+    renderer = StreamRenderer(placeholder, min_interval=config.current.stream_edit_interval)
+    
+    try:
+        async for delta in OpenAIService.stream_response(user_id, user_text, tariff_type, lessons_received):
+            flight.answering = True
+            await renderer.feed(delta)
+        await renderer.finish()
+    except asyncio.CancelledError:
+        # Пришло новое сообщение до начала ответа - убираем заглушку
+        await placeholder.delete()
+        raise
+    except OpenAIBusyError as e:
+        print(f"⏳ OpenAI перегружен для пользователя {user_id}: {e}")
+        await renderer.message.edit_text(BUSY_MESSAGE)
+    except Exception as e:
+        print(f"❌ Ошибка потокового ответа: {e}")
+        await renderer.message.edit_text(ERROR_MESSAGE)
+
+# Буфер объединения сообщений (окно CHAT_COALESCE_MS, 0 - без объединения)
+coalescer = MessageCoalescer(process_user_turn)
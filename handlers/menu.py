@@ -0,0 +1,20 @@
+from database.queries import UserQueries
+from utils.screens import screens
+
+async def show_main_menu(message_or_callback, user_data, is_new_message=False):
+    """Показать главное меню"""
+    # Статус подписки определяем по уже загруженным данным, без повторного запроса
+    has_subscription = UserQueries.is_subscription_active(user_data)
+    welcome_text, keyboard = screens.main_menu(user_data, has_subscription)
+    
+    # Проверяем тип объекта для правильной отправки
+    if hasattr(message_or_callback, 'edit_text') and not is_new_message:
+        # Это callback и можно редактировать
+        try:
+            await message_or_callback.edit_text(welcome_text, reply_markup=keyboard)
+        except:
+            # Если не получается отредактировать - отправляем новое
+            await message_or_callback.answer(welcome_text, reply_markup=keyboard)
+    else:
+        # Это обычное сообщение или принудительная отправка нового
+        await message_or_callback.answer(welcome_text, reply_markup=keyboard)
\ No newline at end of file
@@ -4,12 +4,14 @@ import uuid
 from datetime import datetime
 
 from database.queries import UserQueries, PaymentQueries, ReferralQueries
-from utils.config_loader import config, load_tariff2_strings
+from utils.config_loader import config
 from services.payment_service import PaymentService
+from services.lesson_store import lesson_store
+from utils.send_scheduler import send_lane, Lane
 
 router = Router()
 
-@router.callback_query(F.data.startswith("buy_tariff_"))
+@router.callback_query(F.data.startswith("buy_tariff_"), flags={"rate_limit": "payment"})
 async def handle_tariff_purchase(callback: CallbackQuery):
     """Обработка покупки тарифа"""
     user_id = callback.from_user.id
@@ -23,10 +25,10 @@ async def handle_tariff_purchase(callback: CallbackQuery):
     
     # Определяем цену тарифа
     if tariff_type == 1:
-        original_price = config.get_int('TARIFF_1_PRICE')
+        original_price = config.current.tariff_1_price
         tariff_name = "Тариф 1 (Базовый)"
     elif tariff_type == 2:
-        original_price = config.get_int('TARIFF_2_PRICE')
+        original_price = config.current.tariff_2_price
         tariff_name = "Тариф 2 (Премиум)"
     else:
         await callback.answer("❌ Неверный тариф")
@@ -55,7 +57,7 @@ async def handle_tariff_purchase(callback: CallbackQuery):
         payment_text += "🔓 Что включено:\n• Доступ к боту на 30 дней\n• Безлимитные вопросы к ИИ\n• Эксклюзивные материалы курса"
     
     # Проверяем режим разработки
-    dev_mode = config.get('DEV_MODE', 'FALSE').upper() == 'TRUE'
+    dev_mode = config.current.dev_mode
     
     if dev_mode:
         # В режиме разработки - и тестовая оплата И реальный CloudPayments
@@ -78,7 +80,7 @@ async def handle_tariff_purchase(callback: CallbackQuery):
         )
         
         # Сохраняем платеж в БД
-        await PaymentQueries.create_payment(payment_id, user_id, final_price, tariff_type)
+        await PaymentQueries.create_payment(payment_id, user_id, final_price, tariff_type, discount_amount)
         
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="💳 Оплатить", url=payment_url)],
@@ -88,7 +90,7 @@ async def handle_tariff_purchase(callback: CallbackQuery):
     await callback.message.edit_text(payment_text, reply_markup=keyboard)
     await callback.answer()
 
-@router.callback_query(F.data.startswith("cloudpay_"))
+@router.callback_query(F.data.startswith("cloudpay_"), flags={"rate_limit": "payment"})
 async def handle_cloudpayments_test(callback: CallbackQuery):
     """Обработка CloudPayments тестовой оплаты"""
     user_id = callback.from_user.id
@@ -116,7 +118,7 @@ async def handle_cloudpayments_test(callback: CallbackQuery):
         )
         
         # Сохраняем платеж в БД
-        await PaymentQueries.create_payment(payment_id, user_id, final_price, tariff_type)
+        await PaymentQueries.create_payment(payment_id, user_id, final_price, tariff_type, discount_amount)
         
         cloudpay_text = "💳 <b>CloudPayments (Тестовый режим)</b>\n\n"
         cloudpay_text += f"💰 Сумма: {final_price}₽\n"
@@ -147,13 +149,13 @@ async def handle_cloudpayments_test(callback: CallbackQuery):
     
     await callback.answer()
 
-@router.callback_query(F.data.startswith("test_pay_"))
+@router.callback_query(F.data.startswith("test_pay_"), flags={"rate_limit": "payment"})
 async def handle_test_payment(callback: CallbackQuery):
     """Обработка тестовой оплаты (только в режиме разработки)"""
     user_id = callback.from_user.id
     
     # Проверяем режим разработки
-    dev_mode = config.get('DEV_MODE', 'FALSE').upper() == 'TRUE'
+    dev_mode = config.current.dev_mode
     if not dev_mode:
         await callback.answer("❌ Тестовая оплата доступна только в режиме разработки")
         return
@@ -213,7 +215,7 @@ async def process_successful_payment(phone_number: str, tariff_type: int, amount
         # Проверяем, что реферер существует и оплачивал
         referrer_data = await UserQueries.get_user_by_phone(referrer_phone)
         if referrer_data and referrer_data['has_paid']:
-            bonus_amount = config.get_int('REFERRAL_BONUS')
+            bonus_amount = config.current.referral_bonus
             success = await ReferralQueries.add_referral_bonus(
                 referrer_phone, 
                 phone_number, 
@@ -226,13 +228,14 @@ async def process_successful_payment(phone_number: str, tariff_type: int, amount
                 # Отправляем уведомление рефереру
                 if bot and referrer_data['user_id']:
                     try:
-                        await bot.send_message(
-                            referrer_data['user_id'],
-                            f"🎉 <b>Реферальный бонус начислен!</b>\n\n"
-                            f"💰 +{bonus_amount}₽ за приглашение друга\n"
-                            f"📱 Номер: {phone_number}\n\n"
-                            f"Бонус можно использовать как скидку при оплате подписки!"
-                        )
+                        with send_lane(Lane.PAYMENT):
+                            await bot.send_message(
+                                referrer_data['user_id'],
+                                f"🎉 <b>Реферальный бонус начислен!</b>\n\n"
+                                f"💰 +{bonus_amount}₽ за приглашение друга\n"
+                                f"📱 Номер: {phone_number}\n\n"
+                                f"Бонус можно использовать как скидку при оплате подписки!"
+                            )
                         print(f"📨 Уведомление отправлено рефереру {referrer_data['user_id']}")
                     except Exception as e:
                         print(f"❌ Ошибка отправки уведомления рефереру: {e}")
@@ -253,25 +256,58 @@ async def process_successful_payment(phone_number: str, tariff_type: int, amount
         # Получаем обновленные данные после обновления подписки
         user_data_after = await UserQueries.get_user_by_phone(phone_number)
         if user_data_after:
-            await send_course_material(user_data_after['user_id'], user_data_after['tariff2_counter'], bot)
+            # Уроки уходят после ответов и уведомлений об оплате
+            with send_lane(Lane.LESSON):
+                await send_course_material(user_data_after['user_id'], user_data_after['tariff2_counter'], bot)
+
+async def complete_payment(payment_id: str, amount: float = None, bot=None) -> bool:
+    """Проведение оплаченного платежа из БД (веб-хук и сверка). False - платеж уже проведен или не найден"""
+    payment = await PaymentQueries.get_payment(payment_id)
+    if not payment:
+        print(f"⚠️ Платеж {payment_id} не найден в базе")
+        return False
+    
+    user_data = await UserQueries.get_user(payment['user_id'])
+    if not user_data:
+        print(f"⚠️ Платеж {payment_id} оплачен, но пользователь {payment['user_id']} не найден")
+        return False
+    
+    # Статус меняется условно - при гонке веб-хука и сверки платеж проводится ровно один раз
+    if not await PaymentQueries.claim_pending_payment(payment_id, 'completed'):
+        return False
+    
+    await process_successful_payment(
+        user_data['phone_number'], payment['tariff_type'],
+        payment['amount'] if amount is None else amount, payment['discount_used'], bot=bot
+    )
+    
+    if bot:
+        try:
+            with send_lane(Lane.PAYMENT):
+                await bot.send_message(
+                    payment['user_id'],
+                    f"✅ <b>Оплата получена!</b>\n\n"
+                    f"📦 Тариф {payment['tariff_type']} активирован на 30 дней."
+                )
+        except Exception as e:
+            print(f"❌ Ошибка уведомления об оплате пользователя {payment['user_id']}: {e}")
+    return True
 
 async def send_course_material(user_id: int, lesson_number: int, bot=None):
     """Отправка материала курса для тарифа 2"""
-    strings = load_tariff2_strings()
+    lesson = lesson_store.get(lesson_number)
     
-    if lesson_number <= len(strings):
-        lesson_content = strings[lesson_number - 1]  # -1 так как индексация с 0
-        
+    if lesson:
         # Формируем красивое сообщение с материалом
         course_message = f"🎓 <b>Новый урок доступен!</b>\n\n"
         course_message += f"📚 <b>Урок {lesson_number}</b>\n\n"
-        course_message += f"{lesson_content}\n\n"
+        course_message += f"{lesson.text}\n\n"
         course_message += f"💡 <i>Этот материал доступен только пользователям Тарифа 2</i>"
         
         # Отправляем сообщение пользователю
         if bot:
             try:
-                await bot.send_message(user_id, course_message)
+                await lesson_store.deliver(bot, user_id, lesson, course_message)
                 print(f"✅ Урок {lesson_number} отправлен пользователю {user_id}")
             except Exception as e:
                 print(f"❌ Ошибка отправки урока пользователю {user_id}: {e}")
@@ -4,7 +4,7 @@ from aiogram.filters import Command
 from datetime import datetime
 
 from database.queries import UserQueries
-from utils.config_loader import config
+from utils.screens import screens
 
 router = Router()
 
@@ -78,41 +78,7 @@ async def show_referral(update):
         await answer_method("❌ Пользователь не найден")
         return
     
-    # Проверяем, есть ли у пользователя право на реферальную программу
-    if not user_data['has_paid']:
-        referral_text = "❌ <b>Реферальная программа недоступна</b>\n\n"
-        referral_text += "Для участия в реферальной программе необходимо хотя бы один раз оплатить подписку."
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="💳 Оплатить подписку", callback_data="show_tariffs")],
-            [InlineKeyboardButton(text="🏠 В главное меню", callback_data="main_menu")]
-        ])
-    else:
-        # Генерируем реферальную ссылку на основе номера телефона
-        bot_username = config.get('BOT_USERNAME', 'your_bot_username')
-        # Убираем + и делаем короткий параметр
-        phone_clean = user_data['phone_number'].replace('+', '')
-        referral_link = f"https://t.me/{bot_username}?start=r{phone_clean}"
-        
-        referral_text = f"👥 <b>Реферальная программа</b>\n\n"
-        referral_text += f"💰 Ваш реферальный баланс: <b>{user_data['referral_balance']}₽</b>\n\n"
-        referral_text += "🎁 <b>Как это работает:</b>\n"
-        referral_text += f"• Приглашайте друзей по вашей ссылке\n"
-        referral_text += f"• Когда друг оплачивает подписку, вы получаете {config.get_int('REFERRAL_BONUS')}₽\n"
-        referral_text += f"• Бонусы можно использовать как скидку при оплате\n\n"
-        referral_text += f"🔗 <b>Ваша реферальная ссылка:</b>\n"
-        referral_text += f"<code>{referral_link}</code>\n\n"
-        referral_text += f"🚨 <b>ОЧЕНЬ ВАЖНО!</b> Скажите другу:\n"
-        referral_text += f"1️⃣ Перейти по ссылке\n"
-        referral_text += f"2️⃣ ОБЯЗАТЕЛЬНО написать /start в чате с ботом\n"
-        referral_text += f"3️⃣ НЕ нажимать кнопку START в профиле!\n\n"
-        referral_text += f"📱 <b>Если ссылка не работает:</b>\n"
-        referral_text += f"Друг может указать ваш номер <code>{user_data['phone_number']}</code> при регистрации"
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="📤 Поделиться ссылкой", url=f"https://t.me/share/url?url={referral_link}")],
-            [InlineKeyboardButton(text="🏠 В главное меню", callback_data="main_menu")]
-        ])
+    referral_text, keyboard = screens.referral(user_data)
     
     await answer_method(referral_text, reply_markup=keyboard)
 
@@ -122,37 +88,8 @@ async def show_tariffs(callback: CallbackQuery):
     user_id = callback.from_user.id
     user_data = await UserQueries.get_user(user_id)
     
-    tariff_text = "📦 <b>Доступные тарифы</b>\n\n"
-    
-    # Цены с учетом реферального баланса
-    tariff1_price = config.get_int('TARIFF_1_PRICE')
-    tariff2_price = config.get_int('TARIFF_2_PRICE')
     referral_balance = user_data['referral_balance'] if user_data else 0
-    
-    if referral_balance > 0:
-        tariff1_final = max(0, tariff1_price - referral_balance)
-        tariff2_final = max(0, tariff2_price - referral_balance)
-        
-        tariff_text += f"💰 Ваша скидка: {referral_balance}₽\n\n"
-        tariff_text += f"💳 <b>Тариф 1</b> - ~~{tariff1_price}₽~~ <b>{tariff1_final}₽</b>\n"
-        tariff_text += "• Доступ к боту на 30 дней\n\n"
-        
-        tariff_text += f"💎 <b>Тариф 2</b> - ~~{tariff2_price}₽~~ <b>{tariff2_final}₽</b>\n"
-        tariff_text += "• Доступ к боту на 30 дней\n"
-        tariff_text += "• Материалы курса после каждой оплаты\n"
-    else:
-        tariff_text += f"💳 <b>Тариф 1</b> - {tariff1_price}₽\n"
-        tariff_text += "• Доступ к боту на 30 дней\n\n"
-        
-        tariff_text += f"💎 <b>Тариф 2</b> - {tariff2_price}₽\n"
-        tariff_text += "• Доступ к боту на 30 дней\n"
-        tariff_text += "• Материалы курса после каждой оплаты\n"
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="💳 Купить Тариф 1", callback_data="buy_tariff_1")],
-        [InlineKeyboardButton(text="💎 Купить Тариф 2", callback_data="buy_tariff_2")],
-        [InlineKeyboardButton(text="🏠 В главное меню", callback_data="main_menu")]
-    ])
+    tariff_text, keyboard = screens.tariffs(referral_balance)
     
     await callback.message.edit_text(tariff_text, reply_markup=keyboard)
     await callback.answer()
\ No newline at end of file
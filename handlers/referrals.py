@@ -1,8 +1,11 @@
 from aiogram import Router, F
+from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 
 from database.queries import UserQueries
-from utils.config_loader import config
+from handlers.registration import begin_registration, request_phone_number
+from handlers.states import RegistrationStates
+from utils.phone import normalize_phone
 
 router = Router()
 
@@ -21,10 +24,8 @@ async def ask_for_referral(message: Message, user_id: int, username: str, first_
     await message.answer(referral_text, reply_markup=keyboard)
 
 @router.callback_query(F.data == "has_referrer")
-async def handle_has_referrer(callback: CallbackQuery):
+async def handle_has_referrer(callback: CallbackQuery, state: FSMContext):
     """Пользователь пришел по приглашению"""
-    user_id = callback.from_user.id
-    
     referrer_text = "🤝 Отлично!\n\n"
     referrer_text += "📱 Пожалуйста, попросите друга, который вас пригласил, отправить вам свой номер телефона.\n\n"
     referrer_text += "Затем отправьте мне номер телефона вашего друга в формате:\n"
@@ -38,66 +39,35 @@ async def handle_has_referrer(callback: CallbackQuery):
     await callback.message.edit_text(referrer_text, reply_markup=keyboard)
     
     # Устанавливаем состояние "ожидание номера реферера"
-    from database.connection import db
-    await db.execute("""
-        INSERT OR REPLACE INTO users 
-        (user_id, phone_number, username, first_name, waiting_for_referrer)
-        VALUES (?, ?, ?, ?, ?)
-    """, (user_id, f"temp_{user_id}", callback.from_user.username, callback.from_user.first_name, True))
+    await state.set_state(RegistrationStates.waiting_for_referrer)
     
     await callback.answer()
 
 @router.callback_query(F.data == "no_referrer")
-async def handle_no_referrer(callback: CallbackQuery):
+async def handle_no_referrer(callback: CallbackQuery, state: FSMContext):
     """Пользователь пришел сам"""
-    user_id = callback.from_user.id
-    username = callback.from_user.username
-    first_name = callback.from_user.first_name
-    
-    from handlers.registration import save_temp_user_data, request_phone_number
-    
-    await save_temp_user_data(user_id, username, first_name, None)
+    await begin_registration(state, callback.from_user, None)
     
     await callback.message.edit_text("👍 Понятно, вы нашли нас сами!")
     await request_phone_number(callback.message)
     await callback.answer()
 
-@router.message(F.text.regexp(r'^\+\d{10,15}$'))
-async def handle_referrer_phone(message: Message):
-    """Обработка номера телефона реферера"""
-    user_id = message.from_user.id
-    
-    # Проверяем, что пользователь в состоянии ожидания реферера
-    from database.connection import db
-    user_data = await db.fetchone("""
-        SELECT waiting_for_referrer FROM users WHERE user_id = ?
-    """, (user_id,))
-    
-    if not user_data or not user_data[0]:
-        return  # Пользователь не в режиме ожидания реферера
-    
-    referrer_phone = message.text.strip()
-    username = message.from_user.username
-    first_name = message.from_user.first_name
+@router.message(RegistrationStates.waiting_for_referrer, F.text.func(normalize_phone).as_("referrer_phone"),
+                flags={"rate_limit": "referral"})
+async def handle_referrer_phone(message: Message, state: FSMContext, referrer_phone: str):
+    """Обработка номера телефона реферера (принимается в любом привычном формате)"""
     
     # Проверяем, что реферер существует в базе
     referrer_data = await UserQueries.get_user_by_phone(referrer_phone)
     
     if referrer_data:
-        from handlers.registration import save_temp_user_data, request_phone_number
-        
-        await save_temp_user_data(user_id, username, first_name, referrer_phone)
+        await begin_registration(state, message.from_user, referrer_phone)
         
         await message.answer(
             f"✅ Отлично! Ваш друг {referrer_phone} найден в системе.\n"
             f"После оплаты подписки он получит бонус!"
         )
         
-        # Убираем флаг ожидания
-        await db.execute("""
-            UPDATE users SET waiting_for_referrer = FALSE WHERE user_id = ?
-        """, (user_id,))
-        
         await request_phone_number(message)
     else:
         await message.answer(
@@ -109,4 +79,16 @@ async def handle_referrer_phone(message: Message):
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="⏭️ Пропустить", callback_data="no_referrer")]
             ])
-        )
\ No newline at end of file
+        )
+
+@router.message(RegistrationStates.waiting_for_referrer, F.text & ~F.text.startswith("/"),
+                flags={"rate_limit": "referral"})
+async def handle_referrer_invalid(message: Message):
+    """Текст в режиме ожидания номера реферера, не похожий на номер"""
+    await message.answer(
+        "📱 Отправьте номер телефона друга в формате <code>+79123456789</code>\n\n"
+        "Или нажмите \"Пропустить\"",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="⏭️ Пропустить", callback_data="no_referrer")]
+        ])
+    )
\ No newline at end of file
@@ -1,43 +1,46 @@
+from datetime import datetime, timezone
+
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, CallbackQuery, User, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
 
+from database.connection import db
 from database.queries import UserQueries
-from utils.config_loader import config
+from handlers.menu import show_main_menu
+from handlers.states import RegistrationStates
+from utils.phone import normalize_contact_phone, phone_key
+from utils.screens import screens
 
 router = Router()
 
 async def request_phone_number(message: Message):
     """Запрос согласия на обработку ПД и номера телефона у пользователя"""
-    welcome_text = f"👋 Добро пожаловать!\n\n"
-    welcome_text += "📱 Для использования бота необходимо ваше согласие на обработку персональных данных и номер телефона.\n\n"
-    welcome_text += "🔒 <b>Зачем нужен номер телефона?</b>\n"
-    welcome_text += "• Привязка покупок с сайта к вашему аккаунту\n"
-    welcome_text += "• Восстановление доступа при смене устройства\n"
-    welcome_text += "• Безопасность вашего аккаунта\n\n"
-    welcome_text += "📋 <b>Согласие на обработку персональных данных:</b>\n"
-    welcome_text += "Нажимая кнопку \"Согласен\", вы даете согласие на обработку ваших персональных данных в соответствии с 152-ФЗ \"О персональных данных\".\n\n"
-    welcome_text += "📄 С полной политикой конфиденциальности можно ознакомиться по ссылке: "
-    
-    # Получаем ссылку на политику из настроек
-    policy_url = config.get('PRIVACY_POLICY_URL', 'https://example.com/privacy')
-    welcome_text += f"{policy_url}"
-    
-    # Кнопки для согласия
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Согласен на обработку ПД", callback_data="agree_privacy")],
-        [InlineKeyboardButton(text="❌ Не согласен", callback_data="disagree_privacy")],
-        [InlineKeyboardButton(text="📄 Политика конфиденциальности", url=policy_url)]
-    ])
+    welcome_text, keyboard = screens.privacy_request()
     
     await message.answer(welcome_text, reply_markup=keyboard)
 
-@router.callback_query(F.data == "agree_privacy")
-async def handle_privacy_agreement(callback: CallbackQuery):
+async def begin_registration(state: FSMContext, user: User, referrer_phone: str = None):
+    """Начало регистрации: данные нового пользователя живут в FSM до получения номера телефона"""
+    print(f"🔍 Начинаем регистрацию: user_id={user.id}, referrer_phone={referrer_phone}")
+    
+    await state.set_data({
+        'username': user.username,
+        'first_name': user.first_name,
+        'referrer_phone': referrer_phone
+    })
+    await state.set_state(RegistrationStates.waiting_for_consent)
+
+@router.callback_query(RegistrationStates.waiting_for_consent, F.data == "agree_privacy")
+async def handle_privacy_agreement(callback: CallbackQuery, state: FSMContext):
     """Обработка согласия на обработку ПД"""
-    user_id = callback.from_user.id
-    
-    # Сохраняем факт согласия в БД
-    await save_privacy_consent(user_id, True)
+    # Фиксируем согласие и время - в users они попадут вместе с номером телефона
+    data = await state.get_data()
+    data.setdefault('username', callback.from_user.username)
+    data.setdefault('first_name', callback.from_user.first_name)
+    # Формат как у CURRENT_TIMESTAMP в SQLite (UTC)
+    data['privacy_consent_date'] = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    await state.set_data(data)
+    await state.set_state(RegistrationStates.waiting_for_contact)
     
     # Теперь запрашиваем номер телефона
     phone_text = "✅ Спасибо за согласие!\n\n"
@@ -57,13 +60,11 @@ async def handle_privacy_agreement(callback: CallbackQuery):
     await callback.message.answer("Поделитесь номером телефона:", reply_markup=keyboard)
     await callback.answer()
 
-@router.callback_query(F.data == "disagree_privacy")
-async def handle_privacy_disagreement(callback: CallbackQuery):
+@router.callback_query(RegistrationStates.waiting_for_consent, F.data == "disagree_privacy")
+async def handle_privacy_disagreement(callback: CallbackQuery, state: FSMContext):
     """Обработка отказа от согласия на обработку ПД"""
-    user_id = callback.from_user.id
-    
-    # Сохраняем факт отказа
-    await save_privacy_consent(user_id, False)
+    # Без согласия данные не сохраняем
+    await state.clear()
     
     disagree_text = "❌ <b>Согласие не предоставлено</b>\n\n"
     disagree_text += "К сожалению, без согласия на обработку персональных данных использование бота невозможно.\n\n"
@@ -73,8 +74,18 @@ async def handle_privacy_disagreement(callback: CallbackQuery):
     await callback.message.edit_text(disagree_text)
     await callback.answer()
 
-@router.message(F.contact)
-async def handle_contact(message: Message):
+@router.callback_query(F.data.in_({"agree_privacy", "disagree_privacy"}))
+async def handle_stale_privacy_answer(callback: CallbackQuery):
+    """Кнопки согласия вне шага согласия (старое сообщение): состояние регистрации не трогаем"""
+    user_data = await UserQueries.get_user(callback.from_user.id)
+    if UserQueries.is_registered(user_data):
+        await show_main_menu(callback.message, user_data)
+        await callback.answer()
+        return
+    await callback.answer("ℹ️ Кнопка устарела. Используйте команду /start", show_alert=True)
+
+@router.message(RegistrationStates.waiting_for_contact, F.contact)
+async def handle_contact(message: Message, state: FSMContext):
     """Обработка полученного контакта"""
     contact = message.contact
     user_id = message.from_user.id
@@ -92,31 +103,25 @@ async def handle_contact(message: Message):
         return
     
     # Проверяем наличие согласия на обработку ПД
-    temp_user = await UserQueries.get_user(user_id)
-    if not temp_user:
+    registration = await state.get_data()
+    if not registration.get('privacy_consent_date'):
         await message.answer(
-            "❌ Пользователь не найден в системе.\n\n"
-            "Пожалуйста, используйте команду /start для регистрации.",
+            "❌ Не найдено согласие на обработку персональных данных.\n\n"
+            "Пожалуйста, сначала дайте согласие, используя команду /start",
             reply_markup=ReplyKeyboardRemove()
         )
         return
     
-    # Проверяем согласие (оно должно быть True)
-    privacy_consent = temp_user.get('privacy_consent')
-    if privacy_consent != 1 and privacy_consent != True:  # SQLite может возвращать 0/1 вместо False/True
+    # Приводим номер к единому формату E.164 (в контакте код страны есть всегда)
+    phone_number = normalize_contact_phone(contact.phone_number)
+    if phone_number is None:
         await message.answer(
-            "❌ Не найдено согласие на обработку персональных данных.\n\n"
-            "Пожалуйста, сначала дайте согласие, используя команду /start",
+            "❌ Не удалось распознать номер телефона.\n\n"
+            "Пожалуйста, используйте команду /start и попробуйте еще раз.",
             reply_markup=ReplyKeyboardRemove()
         )
         return
     
-    phone_number = contact.phone_number
-    
-    # Приводим номер к единому формату (добавляем + если нет)
-    if not phone_number.startswith('+'):
-        phone_number = '+' + phone_number
-    
     # Проверяем, нет ли уже пользователя с таким номером
     existing_phone_user = await UserQueries.get_user_by_phone(phone_number)
     
@@ -129,22 +134,22 @@ async def handle_contact(message: Message):
         )
         return
     
-    # Обновляем пользователя с реальным номером телефона
-    # ВАЖНО: Сохраняем реферера из временной записи!
-    referrer_phone = temp_user.get('referrer_phone')
-    print(f"🔍 Данные пользователя из БД: {temp_user}")
+    # Создаем пользователя с реальным номером телефона
+    # ВАЖНО: Сохраняем реферера из данных регистрации!
+    referrer_phone = registration.get('referrer_phone')
     print(f"🔍 Извлеченный реферер: {referrer_phone}")
     
     await UserQueries.create_user(
         user_id=user_id,
         phone_number=phone_number,
-        username=temp_user['username'],
-        first_name=temp_user['first_name'],
-        referrer_phone=referrer_phone  # Передаем реферера из временной записи
+        username=registration.get('username'),
+        first_name=registration.get('first_name'),
+        referrer_phone=referrer_phone
     )
     
-    # Сохраняем факт согласия с новым номером
-    await save_privacy_consent_with_phone(user_id, phone_number, True)
+    # Сохраняем согласие с временем, когда оно было дано
+    await save_privacy_consent_with_phone(user_id, phone_number, True, registration['privacy_consent_date'])
+    await state.clear()
     
     # Получаем обновленные данные пользователя
     user_data = await UserQueries.get_user(user_id)
@@ -160,50 +165,25 @@ async def handle_contact(message: Message):
     await message.answer(success_text, reply_markup=ReplyKeyboardRemove())
     
     # Показываем главное меню
-    from handlers.start import show_main_menu
     await show_main_menu(message, user_data, is_new_message=True)
 
-async def save_temp_user_data(user_id: int, username: str, first_name: str, referrer_phone: str):
-    """Сохранение временных данных пользователя"""
-    # Используем специальный временный номер телефона
-    temp_phone = f"temp_{user_id}"
-    
-    print(f"🔍 Сохраняем временные данные: user_id={user_id}, referrer_phone={referrer_phone}")
-    
-    await UserQueries.create_user(
-        user_id=user_id,
-        phone_number=temp_phone,
-        username=username,
-        first_name=first_name,
-        referrer_phone=referrer_phone
+@router.message(F.contact)
+async def handle_unexpected_contact(message: Message):
+    """Контакт вне регистрации"""
+    await message.answer(
+        "ℹ️ Номер телефона принимается только во время регистрации.\n\n"
+        "Используйте команду /start",
+        reply_markup=ReplyKeyboardRemove()
     )
 
-async def save_privacy_consent(user_id: int, consent: bool):
-    """Сохранение согласия на обработку ПД"""
-    try:
-        from database.connection import db
-        
-        # НЕ используем INSERT OR REPLACE! Только UPDATE
-        await db.execute("""
-            UPDATE users 
-            SET privacy_consent = ?, privacy_consent_date = CURRENT_TIMESTAMP
-            WHERE user_id = ?
-        """, (consent, user_id))
-        
-        print(f"💾 Согласие пользователя {user_id}: {consent}")
-    except Exception as e:
-        print(f"❌ Ошибка сохранения согласия: {e}")
-
-async def save_privacy_consent_with_phone(user_id: int, phone_number: str, consent: bool):
+async def save_privacy_consent_with_phone(user_id: int, phone_number: str, consent: bool, consent_date: str):
     """Сохранение согласия на обработку ПД с номером телефона"""
     try:
-        from database.connection import db
-        
         await db.execute("""
             UPDATE users 
-            SET privacy_consent = ?, privacy_consent_date = CURRENT_TIMESTAMP
-            WHERE user_id = ? OR phone_number = ?
-        """, (consent, user_id, phone_number))
+            SET privacy_consent = ?, privacy_consent_date = ?
+            WHERE user_id = ? OR phone_key = ?
+        """, (consent, consent_date, user_id, phone_key(phone_number)))
         
         print(f"💾 Согласие пользователя {user_id} ({phone_number}): {consent}")
     except Exception as e:
@@ -0,0 +1,7 @@
+from aiogram.fsm.state import State, StatesGroup
+
+class RegistrationStates(StatesGroup):
+    """Шаги регистрации (данные шагов хранятся в FSM, а не во временных записях users)"""
+    waiting_for_referrer = State()
+    waiting_for_consent = State()
+    waiting_for_contact = State()
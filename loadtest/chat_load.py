@@ -0,0 +1,166 @@
+"""Офлайн нагрузочный тест handlers/chat.py против локального эмулятора OpenAI.
+
+Запуск (эмулятор поднимается в том же процессе):
+    python -m loadtest.chat_load --users 50 --messages 5 --ttft 0.6 --tps 40 --ratelimit-rate 0.05
+
+Сеть и Telegram не нужны: сообщения пользователей эмулируются, база создается во временном файле.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from utils.config_loader import config
+from loadtest import fake_openai
+
+class FakeBot:
+    """Заглушка Bot для send_chat_action"""
+    
+    async def send_chat_action(self, chat_id: int, action: str):
+        return True
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.username = f"load{user_id}"
+        self.first_name = "Load"
+
+class FakeReply:
+    """Отправленное ботом сообщение: фиксирует время отправки и правок"""
+    
+    def __init__(self, turn: "FakeMessage", text: str):
+        self.turn = turn
+        self.created = time.perf_counter()
+        self.edits: list[float] = []
+        self.text = text
+        turn.replies.append(self)
+    
+    async def edit_text(self, text: str, **kwargs):
+        self.edits.append(time.perf_counter())
+        self.text = text
+        return self
+    
+    async def answer(self, text: str, **kwargs):
+        return FakeReply(self.turn, text)
+    
+    async def delete(self):
+        self.turn.replies.remove(self)
+        return True
+
+class FakeMessage:
+    """Входящее сообщение пользователя"""
+    
+    def __init__(self, user_id: int, text: str, bot: FakeBot):
+        self.from_user = FakeUser(user_id)
+        self.chat = self.from_user
+        self.text = text
+        self.bot = bot
+        self.sent = time.perf_counter()
+        self.replies: list[FakeReply] = []
+    
+    async def answer(self, text: str, **kwargs):
+        return FakeReply(self, text)
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+async def simulate_user(user_id: int, args: argparse.Namespace, bot: FakeBot, turns: list[FakeMessage]):
+    from handlers import chat
+    
+    for i in range(args.messages):
+        # Серия коротких сообщений подряд, затем пауза на чтение ответа
+        message = FakeMessage(user_id, f"Вопрос {i} про уроки курса номер {random.randint(1, 1000)}", bot)
+        turns.append(message)
+        await chat.handle_user_message(message)
+        await asyncio.sleep(random.uniform(args.think_min, args.think_max))
+
+async def run(args: argparse.Namespace):
+    # Настройки подменяются до импорта модулей, которые читают их при загрузке
+    config.override({
+        'OPENAI_API_KEY': 'loadtest-key',
+        'OPENAI_BASE_URL': args.base_url or f"http://{args.host}:{args.port}/v1",
+        'OPENAI_STREAMING': 'TRUE' if args.stream else 'FALSE',
+        'CHAT_COALESCE_MS': str(args.coalesce_ms),
+        'LLM_CACHE_ENABLED': 'FALSE',
+        'STREAM_EDIT_INTERVAL': str(args.edit_interval)
+    })
+    
+    from database.connection import db
+    from database.queries import UserQueries
+    from services.openai_service import OpenAIService
+    
+    runner = fake = None
+    if not args.base_url:
+        runner, fake = await fake_openai.start_server(args)
+    
+    db_dir = tempfile.mkdtemp(prefix="chat_load_")
+    db.db_path = os.path.join(db_dir, "load.db")
+    await db.connect()
+    
+    try:
+        first_user = 10_000
+        for user_id in range(first_user, first_user + args.users):
+            phone = f"+7900{user_id:07d}"
+            await UserQueries.create_user(user_id, phone, f"load{user_id}", "Load")
+            await UserQueries.update_subscription(phone, 2 if user_id % 5 == 0 else 1)
+        
+        bot = FakeBot()
+        turns: list[FakeMessage] = []
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            simulate_user(user_id, args, bot, turns)
+            for user_id in range(first_user, first_user + args.users)
+        ))
+        # Ждем завершения последних объединенных реплик
+        await asyncio.sleep(args.coalesce_ms / 1000 + args.drain)
+        elapsed = time.perf_counter() - started
+        
+        first_output = []
+        total = []
+        for turn in turns:
+            for reply in turn.replies:
+                first = reply.edits[0] if reply.edits else reply.created
+                last = reply.edits[-1] if reply.edits else reply.created
+                first_output.append(first - turn.sent)
+                total.append(last - turn.sent)
+        
+        print(f"\n📈 Пользователей: {args.users}, сообщений: {len(turns)}, ответов: {len(total)}, "
+              f"время теста: {elapsed:.1f} с")
+        print(f"⏱ До первого текста: p50 {percentile(first_output, 0.5):.2f} с, "
+              f"p95 {percentile(first_output, 0.95):.2f} с, макс {max(first_output, default=0):.2f} с")
+        print(f"⏱ До полного ответа: p50 {percentile(total, 0.5):.2f} с, "
+              f"p95 {percentile(total, 0.95):.2f} с, макс {max(total, default=0):.2f} с")
+        if fake is not None:
+            print(f"🤖 Запросов к эмулятору: {fake.requests}, максимум одновременно: {fake.max_in_flight}")
+        print(OpenAIService.get_scheduler().report())
+        print(db.query_stats.report(5))
+    finally:
+        await OpenAIService.close()
+        await db.disconnect()
+        if runner is not None:
+            await runner.cleanup()
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Офлайн нагрузочный тест чата")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=3, help="сообщений на пользователя")
+    parser.add_argument('--think-min', type=float, default=0.2, help="минимальная пауза между сообщениями, с")
+    parser.add_argument('--think-max', type=float, default=3.0, help="максимальная пауза между сообщениями, с")
+    parser.add_argument('--coalesce-ms', type=int, default=1500)
+    parser.add_argument('--edit-interval', type=float, default=1.0)
+    parser.add_argument('--no-stream', dest='stream', action='store_false')
+    parser.add_argument('--drain', type=float, default=15.0, help="ожидание завершения ответов, с")
+    parser.add_argument('--base-url', default='', help="внешний эмулятор вместо встроенного")
+    # Параметры встроенного эмулятора
+    emulator = fake_openai.parse_args([])
+    for name, value in vars(emulator).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""Локальный эмулятор API CloudPayments для офлайн проверки сверки платежей.
+
+Запуск:
+    python -m loadtest.fake_cloudpayments --port 8200 --latency 0.3 --completed-rate 0.3 --missing-rate 0.5
+
+В config/settings.txt:
+    CLOUDPAYMENTS_API_URL=http://localhost:8200
+"""
+import argparse
+import asyncio
+import hashlib
+
+from aiohttp import web
+
+class FakeCloudPayments:
+    """Эмуляция /v2/payments/find: статус платежа детерминированно выводится из InvoiceId"""
+    
+    def __init__(self, latency: float, completed_rate: float, declined_rate: float, missing_rate: float):
+        self.latency = latency
+        self.completed_rate = completed_rate
+        self.declined_rate = declined_rate
+        self.missing_rate = missing_rate
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    def status_for(self, invoice_id: str):
+        """Статус платежа или None, если провайдер о нем не знает (одинаков для повторных запросов)"""
+        roll = int(hashlib.md5(invoice_id.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+        if roll < self.completed_rate:
+            return 'Completed'
+        if roll < self.completed_rate + self.declined_rate:
+            return 'Declined'
+        if roll < self.completed_rate + self.declined_rate + self.missing_rate:
+            return None
+        return 'AwaitingAuthentication'
+    
+    async def handle_find(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if request.headers.get('Authorization', '').split(' ')[0] != 'Basic':
+            return web.json_response({"Success": False, "Message": "Unauthorized"}, status=401)
+        
+        body = await request.json()
+        invoice_id = str(body.get("InvoiceId", ""))
+        
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        
+        status = self.status_for(invoice_id)
+        if status is None:
+            return web.json_response({"Success": False, "Message": "Not found"})
+        return web.json_response({
+            "Success": True,
+            "Message": None,
+            "Model": {"InvoiceId": invoice_id, "Status": status, "Currency": "RUB"}
+        })
+    
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight
+        })
+
+def create_app(fake: FakeCloudPayments) -> web.Application:
+    """Создание веб-приложения эмулятора"""
+    app = web.Application()
+    app.router.add_post('/v2/payments/find', fake.handle_find)
+    app.router.add_get('/stats', fake.handle_stats)
+    return app
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Локальный эмулятор API CloudPayments")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8200)
+    parser.add_argument('--latency', type=float, default=0.3, help="задержка ответа, секунды")
+    parser.add_argument('--completed-rate', type=float, default=0.3, help="доля оплаченных платежей")
+    parser.add_argument('--declined-rate', type=float, default=0.1, help="доля отклоненных платежей")
+    parser.add_argument('--missing-rate', type=float, default=0.5, help="доля неизвестных провайдеру платежей")
+    return parser.parse_args(argv)
+
+async def start_server(args: argparse.Namespace) -> tuple[web.AppRunner, FakeCloudPayments]:
+    """Запуск эмулятора в текущем event loop (для использования из нагрузочных тестов)"""
+    fake = FakeCloudPayments(args.latency, args.completed_rate, args.declined_rate, args.missing_rate)
+    runner = web.AppRunner(create_app(fake))
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    return runner, fake
+
+if __name__ == "__main__":
+    async def main():
+        args = parse_args()
+        await start_server(args)
+        print(f"💳 Эмулятор CloudPayments запущен на http://{args.host}:{args.port} "
+              f"(latency={args.latency}s, completed={args.completed_rate:.0%}, missing={args.missing_rate:.0%})")
+        await asyncio.Event().wait()
+    
+    asyncio.run(main())
\ No newline at end of file
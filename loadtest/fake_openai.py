@@ -0,0 +1,152 @@
+"""Локальный OpenAI-совместимый сервер для офлайн тестов производительности.
+
+Запуск:
+    python -m loadtest.fake_openai --port 8100 --ttft 0.6 --tps 40 --error-rate 0.01 --ratelimit-rate 0.05
+
+В config/settings.txt:
+    OPENAI_BASE_URL=http://localhost:8100/v1
+    OPENAI_API_KEY=любая строка кроме TEMP_PLACEHOLDER
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from aiohttp import web
+
+WORDS = (
+    "нейросети помогают автоматизировать рутинные задачи и экономить время "
+    "в курсе мы разбираем практические кейсы промпты и интеграцию ИИ в бизнес"
+).split()
+
+class FakeOpenAI:
+    """Эмуляция /v1/chat/completions с настраиваемыми задержками и ошибками"""
+    
+    def __init__(self, ttft: float, tps: float, answer_tokens: int, error_rate: float, ratelimit_rate: float):
+        self.ttft = ttft
+        self.tps = tps
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self.ratelimit_rate = ratelimit_rate
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    def _tokens(self, max_tokens: int) -> list[str]:
+        count = min(self.answer_tokens, max_tokens or self.answer_tokens)
+        return [random.choice(WORDS) + " " for _ in range(count)]
+    
+    async def handle_completions(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        body = await request.json()
+        
+        # Инъекция ошибок до начала генерации
+        roll = random.random()
+        if roll < self.ratelimit_rate:
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status=429, headers={"retry-after": "1"}
+            )
+        if roll < self.ratelimit_rate + self.error_rate:
+            return web.json_response(
+                {"error": {"message": "Injected server error", "type": "server_error"}}, status=500
+            )
+        
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            tokens = self._tokens(body.get("max_tokens", 0))
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            model = body.get("model", "fake-model")
+            
+            await asyncio.sleep(self.ttft)
+            if body.get("stream"):
+                return await self._stream(request, completion_id, model, tokens)
+            
+            await asyncio.sleep(len(tokens) / self.tps)
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+            })
+        finally:
+            self.in_flight -= 1
+    
+    async def _stream(self, request: web.Request, completion_id: str, model: str, tokens: list[str]) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        
+        def chunk(delta: dict, finish_reason=None) -> bytes:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+        
+        await response.write(chunk({"role": "assistant", "content": ""}))
+        for token in tokens:
+            await response.write(chunk({"content": token}))
+            await asyncio.sleep(1 / self.tps)
+        await response.write(chunk({}, finish_reason="stop"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+    
+    async def handle_models(self, request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": [{"id": "fake-model", "object": "model"}]})
+    
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight
+        })
+
+def create_app(fake: FakeOpenAI) -> web.Application:
+    """Создание веб-приложения эмулятора"""
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', fake.handle_completions)
+    app.router.add_get('/v1/models', fake.handle_models)
+    app.router.add_get('/stats', fake.handle_stats)
+    return app
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Локальный эмулятор OpenAI chat completions")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--ttft', type=float, default=0.5, help="время до первого токена, секунды")
+    parser.add_argument('--tps', type=float, default=40.0, help="скорость генерации, токенов в секунду")
+    parser.add_argument('--answer-tokens', type=int, default=120, help="длина ответа в токенах")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument('--ratelimit-rate', type=float, default=0.0, help="доля ответов 429")
+    return parser.parse_args(argv)
+
+async def start_server(args: argparse.Namespace) -> tuple[web.AppRunner, FakeOpenAI]:
+    """Запуск эмулятора в текущем event loop (для использования из нагрузочных тестов)"""
+    fake = FakeOpenAI(args.ttft, args.tps, args.answer_tokens, args.error_rate, args.ratelimit_rate)
+    runner = web.AppRunner(create_app(fake))
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    return runner, fake
+
+if __name__ == "__main__":
+    async def main():
+        args = parse_args()
+        await start_server(args)
+        print(f"🤖 Эмулятор OpenAI запущен на http://{args.host}:{args.port}/v1 "
+              f"(ttft={args.ttft}s, tps={args.tps}, 500={args.error_rate:.0%}, 429={args.ratelimit_rate:.0%})")
+        await asyncio.Event().wait()
+    
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""Сколько стоит новая HTTP сессия на каждый запрос по сравнению с общим клиентом (services/http_client.py).
+
+Запуск (заглушка API поднимается в том же процессе):
+    python -m loadtest.http_client_bench --calls 200
+    python -m loadtest.http_client_bench --calls 200 --tls   # с TLS, нужен openssl в PATH
+
+Заглушка - loadtest/fake_cloudpayments.py, запросы - POST /v2/payments/find.
+"""
+import argparse
+import asyncio
+import os
+import ssl
+import subprocess
+import tempfile
+import time
+from typing import Optional
+
+import aiohttp
+
+from loadtest import fake_cloudpayments
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+def make_tls_contexts() -> tuple[ssl.SSLContext, ssl.SSLContext]:
+    """Самоподписанный сертификат для localhost: контекст сервера и доверяющий ему контекст клиента"""
+    directory = tempfile.mkdtemp(prefix="http_bench_")
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost",
+         "-keyout", key, "-out", cert],
+        check=True, capture_output=True
+    )
+    server = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server.load_cert_chain(cert, key)
+    client = ssl.create_default_context(cafile=cert)
+    return server, client
+
+async def call(session: aiohttp.ClientSession, url: str, client_ssl: Optional[ssl.SSLContext]) -> float:
+    started = time.perf_counter()
+    async with session.post(url, json={"InvoiceId": "bench"}, auth=aiohttp.BasicAuth("id", "secret"),
+                            ssl=client_ssl if client_ssl else True) as response:
+        await response.read()
+    return time.perf_counter() - started
+
+async def run(args: argparse.Namespace):
+    from services.http_client import http_client
+    
+    server_ssl = client_ssl = None
+    if args.tls:
+        server_ssl, client_ssl = make_tls_contexts()
+    
+    fake = fake_cloudpayments.FakeCloudPayments(0.0, 0.5, 0.0, 0.0)
+    runner = fake_cloudpayments.web.AppRunner(fake_cloudpayments.create_app(fake))
+    await runner.setup()
+    await fake_cloudpayments.web.TCPSite(runner, args.host, args.port, ssl_context=server_ssl).start()
+    scheme = "https" if args.tls else "http"
+    url = f"{scheme}://{args.host}:{args.port}/v2/payments/find"
+    
+    try:
+        # Как было: новая сессия (и новое соединение) на каждый вызов
+        fresh = []
+        for _ in range(args.calls):
+            started = time.perf_counter()
+            async with aiohttp.ClientSession() as session:
+                await call(session, url, client_ssl)
+            fresh.append(time.perf_counter() - started)
+        
+        # Общий клиент: соединение устанавливается один раз и переиспользуется
+        session = await http_client.start()
+        shared = [await call(session, url, client_ssl) for _ in range(args.calls)]
+        
+        # Параллельные вызовы через общий пул
+        started = time.perf_counter()
+        await asyncio.gather(*(call(session, url, client_ssl) for _ in range(args.calls)))
+        parallel = time.perf_counter() - started
+    finally:
+        await http_client.close()
+        await runner.cleanup()
+    
+    def line(name: str, values: list[float]) -> str:
+        return (f"{name}: p50 {percentile(values, 0.5) * 1000:.2f} мс, "
+                f"p95 {percentile(values, 0.95) * 1000:.2f} мс, среднее {sum(values) / len(values) * 1000:.2f} мс")
+    
+    print(f"\n📈 {args.calls} вызовов {scheme.upper()} к заглушке")
+    print("🐢 " + line("Новая сессия на вызов", fresh))
+    print("⚡ " + line("Общий клиент", shared))
+    saved = (sum(fresh) - sum(shared)) / args.calls * 1000
+    print(f"💡 Экономия на вызов: {saved:.2f} мс; {args.calls} параллельных вызовов через пул: {parallel * 1000:.0f} мс")
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Сравнение новой сессии на вызов и общего HTTP клиента")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8201)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--tls', action='store_true', help="HTTPS с самоподписанным сертификатом")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
\ No newline at end of file
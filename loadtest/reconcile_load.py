@@ -0,0 +1,96 @@
+"""Офлайн прогон сверки платежей (services/reconciliation.py) против эмулятора CloudPayments.
+
+Запуск (эмулятор поднимается в том же процессе):
+    python -m loadtest.reconcile_load --payments 2000 --concurrency 20 --latency 0.3
+
+База создается во временном файле и заполняется ожидающими платежами за последние сутки.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from utils.config_loader import config
+from loadtest import fake_cloudpayments
+
+async def seed_payments(db, count: int, users: int) -> None:
+    """Пользователи и ожидающие платежи, равномерно распределенные по последним суткам"""
+    from database.queries import UserQueries
+    
+    first_user = 20_000
+    for user_id in range(first_user, first_user + users):
+        await UserQueries.create_user(user_id, f"+7901{user_id:07d}", f"pay{user_id}", "Pay")
+    
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(count):
+        created = now - timedelta(minutes=15 + i * (24 * 60 - 30) / max(count, 1))
+        rows.append((str(uuid.uuid4()), first_user + i % users, 990.0, 1 + i % 2,
+                     created.strftime('%Y-%m-%d %H:%M:%S')))
+    await db.connection.executemany("""
+        INSERT INTO payments (payment_id, user_id, amount, tariff_type, payment_date)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+    await db.connection.commit()
+
+async def run(args: argparse.Namespace):
+    config.override({
+        'CLOUDPAYMENTS_API_URL': args.base_url or f"http://{args.host}:{args.port}",
+        'PAYMENT_RECONCILE_MIN_AGE_MIN': '10',
+        # Все не найденные провайдером платежи старше часа считаются истекшими
+        'PAYMENT_RECONCILE_EXPIRE_HOURS': '1'
+    })
+    
+    from database.connection import db
+    from services.reconciliation import PaymentReconciler
+    from services.http_client import http_client
+    
+    runner = fake = None
+    if not args.base_url:
+        runner, fake = await fake_cloudpayments.start_server(args)
+    
+    db_dir = tempfile.mkdtemp(prefix="reconcile_load_")
+    db.db_path = os.path.join(db_dir, "load.db")
+    await db.connect()
+    db.query_stats.enabled = False
+    
+    try:
+        await seed_payments(db, args.payments, args.users)
+        print(f"🧾 Создано ожидающих платежей: {args.payments}")
+        
+        started = time.perf_counter()
+        report = await PaymentReconciler(concurrency=args.concurrency, batch_size=args.batch_size).run(since_hours=24)
+        elapsed = time.perf_counter() - started
+        
+        print(f"\n📈 Сверка {report.checked} платежей за {elapsed:.2f} с "
+              f"({report.checked / elapsed:.0f} платежей/с при {args.concurrency} запросах одновременно)")
+        if fake is not None:
+            print(f"💳 Запросов к эмулятору: {fake.requests}, максимум одновременно: {fake.max_in_flight}")
+        
+        # Повторный прогон не должен провести уже проведенные платежи второй раз
+        second = await PaymentReconciler(concurrency=args.concurrency, batch_size=args.batch_size).run(since_hours=24)
+        print(f"🔁 Повторная сверка: проведено {second.completed} (ожидается 0)")
+    finally:
+        await http_client.close()
+        await db.disconnect()
+        if runner is not None:
+            await runner.cleanup()
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Офлайн прогон сверки платежей")
+    parser.add_argument('--payments', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--base-url', default='', help="внешний эмулятор вместо встроенного")
+    # Параметры встроенного эмулятора
+    emulator = fake_cloudpayments.parse_args([])
+    for name, value in vars(emulator).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""Задержка поиска по материалам курса (services/course_retriever.py) на большом числе фрагментов.
+
+Запуск (нужен numpy):
+    python -m loadtest.retrieval_bench --chunks 5000 --queries 2000
+
+Фрагменты синтетические - слова уроков тарифа 2 в случайном порядке. Индекс собирается
+в памяти, сохраненный индекс бота не трогается. Цель - поиск быстрее 1 мс на вопрос.
+"""
+import argparse
+import random
+import time
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+def run(args: argparse.Namespace):
+    from utils.config_loader import config
+    from services.course_retriever import CourseRetriever, _load_numpy
+    
+    if _load_numpy() is None:
+        raise SystemExit("❌ Для поиска по материалам нужен numpy: pip install numpy")
+    
+    settings = config.current
+    retriever = CourseRetriever()
+    vocabulary = [word for _, text in retriever._sources() for word in text.split()]
+    rng = random.Random(args.seed)
+    chunks = [" ".join(rng.choices(vocabulary, k=settings.rag_chunk_words)) for _ in range(args.chunks)]
+    
+    started = time.perf_counter()
+    matrix, idf = retriever._build(chunks, settings.rag_dim)
+    build_seconds = time.perf_counter() - started
+    # Индекс подставляется напрямую, refresh() считает его актуальным
+    retriever.chunks, retriever._matrix, retriever._idf = chunks, matrix, idf
+    retriever.refresh = lambda: None
+    
+    questions = [" ".join(rng.choices(vocabulary, k=rng.randint(3, 15))) for _ in range(args.queries)]
+    timings = []
+    for question in questions:
+        started = time.perf_counter()
+        retriever.search(question)
+        timings.append((time.perf_counter() - started) * 1000)
+    
+    print(f"\n📈 {args.chunks} фрагментов, размерность {settings.rag_dim}, "
+          f"матрица {matrix.nbytes / 1024 / 1024:.1f} МБ, сборка {build_seconds:.2f} с")
+    print(f"🔎 {args.queries} вопросов: p50 {percentile(timings, 0.5):.3f} мс, "
+          f"p95 {percentile(timings, 0.95):.3f} мс, макс {max(timings):.3f} мс")
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Задержка поиска по материалам курса")
+    parser.add_argument('--chunks', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    run(parse_args())
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""Задержка интерактивных ответов во время массовой рассылки (utils/send_scheduler.py).
+
+Запуск:
+    python -m loadtest.send_load --broadcast 3000 --interactive 200 --latency 0.05
+
+Telegram не нужен: запросы уходят в сессию-заглушку с фиксированной задержкой.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from utils.config_loader import config
+
+BENCH_TOKEN = "123456:send-load"
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+async def run(args: argparse.Namespace):
+    from aiogram import Bot
+    from aiogram.client.session.base import BaseSession
+    from utils.send_scheduler import SendScheduler, send_lane, Lane
+    
+    class SlowSession(BaseSession):
+        """Сессия без сети с задержкой ответа Bot API"""
+        
+        def __init__(self, latency: float):
+            super().__init__()
+            self.latency = latency
+            self.requests = 0
+        
+        async def make_request(self, bot, method, timeout=None):
+            self.requests += 1
+            await asyncio.sleep(self.latency)
+            return True
+        
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            raise NotImplementedError
+            yield b""
+        
+        async def close(self):
+            pass
+    
+    config.override({'TELEGRAM_SEND_GLOBAL': args.global_rate, 'WORKER_PROCESSES': '0'})
+    scheduler = SendScheduler()
+    session = SlowSession(args.latency)
+    session.middleware(scheduler)
+    bot = Bot(token=BENCH_TOKEN, session=session)
+    
+    async def broadcast():
+        with send_lane(Lane.BROADCAST):
+            await asyncio.gather(*(
+                bot.send_message(100_000 + i, "📢 Рассылка") for i in range(args.broadcast)
+            ))
+    
+    interactive: list[float] = []
+    
+    async def user_reply(chat_id: int):
+        await asyncio.sleep(random.uniform(0, args.duration))
+        started = time.perf_counter()
+        await bot.send_message(chat_id, "Ответ")
+        interactive.append(time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    broadcast_task = asyncio.create_task(broadcast())
+    await asyncio.gather(*(user_reply(1_000 + i) for i in range(args.interactive)))
+    interactive_done = time.perf_counter() - started
+    await broadcast_task
+    elapsed = time.perf_counter() - started
+    
+    print(f"\n📈 Рассылка {args.broadcast} сообщений за {elapsed:.1f} с "
+          f"({args.broadcast / elapsed:.1f} сообщений/с), интерактивные ответы завершены за {interactive_done:.1f} с")
+    print(f"⏱ Интерактивный ответ: p50 {percentile(interactive, 0.5) * 1000:.0f} мс, "
+          f"p95 {percentile(interactive, 0.95) * 1000:.0f} мс, макс {max(interactive, default=0) * 1000:.0f} мс")
+    print(scheduler.report())
+    await bot.session.close()
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Интерактивные ответы на фоне рассылки")
+    parser.add_argument('--broadcast', type=int, default=1500, help="сообщений в рассылке")
+    parser.add_argument('--interactive', type=int, default=100, help="интерактивных ответов")
+    parser.add_argument('--duration', type=float, default=20.0, help="окно появления интерактивных ответов, с")
+    parser.add_argument('--latency', type=float, default=0.05, help="задержка Bot API, с")
+    parser.add_argument('--global-rate', default='30/1', help="общий лимит отправки N/S")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
\ No newline at end of file
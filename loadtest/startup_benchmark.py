@@ -0,0 +1,160 @@
+"""Замер времени запуска бота: стоимость импортов и время до первого обработанного апдейта.
+
+Запуск:
+    python -m loadtest.startup_benchmark --runs 5 --top 15
+
+Telegram и сеть не нужны: бот работает через сессию-заглушку, база создается во временном файле.
+Каждый прогон - отдельный процесс, чтобы импорты не брались из уже загруженных модулей.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_TOKEN = "123456:startup-benchmark"
+
+def start_update(update_id: int, user_id: int) -> dict:
+    """Сырой апдейт с командой /start от нового пользователя"""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}]
+        }
+    }
+
+async def child_run() -> dict:
+    """Один холодный запуск внутри отдельного процесса"""
+    started = time.perf_counter()
+    
+    import main
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.base import BaseSession
+    from aiogram.enums import ParseMode
+    from database.connection import db
+    imported = time.perf_counter()
+    
+    class RecordingSession(BaseSession):
+        """Сессия без сети: запоминает вызванные методы Bot API"""
+        
+        def __init__(self):
+            super().__init__()
+            self.calls: list[str] = []
+        
+        async def make_request(self, bot, method, timeout=None):
+            self.calls.append(type(method).__name__)
+            return True
+        
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            raise NotImplementedError
+            yield b""
+        
+        async def close(self):
+            pass
+    
+    db.db_path = os.path.join(tempfile.mkdtemp(prefix="startup_bench_"), "bench.db")
+    await db.connect()
+    dp = main.create_dispatcher()
+    session = RecordingSession()
+    bot = Bot(token=BENCH_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    ready = time.perf_counter()
+    
+    await dp.feed_raw_update(bot, start_update(1, 1001))
+    first = time.perf_counter()
+    await dp.feed_raw_update(bot, start_update(2, 1002))
+    second = time.perf_counter()
+    
+    await db.disconnect()
+    return {
+        "import_ms": (imported - started) * 1000,
+        "setup_ms": (ready - imported) * 1000,
+        "first_update_ms": (first - ready) * 1000,
+        "warm_update_ms": (second - first) * 1000,
+        "to_first_update_ms": (first - started) * 1000,
+        "calls": session.calls
+    }
+
+def run_child() -> dict:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", "loadtest.startup_benchmark", "--child"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    )
+    wall = (time.perf_counter() - started) * 1000
+    # Последняя строка вывода - результат, остальное - логи бота
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    data["process_ms"] = wall
+    return data
+
+def import_costs() -> list[tuple[str, int, int]]:
+    """Разбор вывода python -X importtime: (модуль, собственное время, накопленное), мкс"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def report_imports(rows: list[tuple[str, int, int]], top: int) -> None:
+    total = sum(row[1] for row in rows)
+    print(f"\n📦 Импорт main: {total / 1000:.1f} мс, модулей загружено: {len(rows)}")
+    
+    # Суммарное собственное время по пакетам верхнего уровня
+    packages: dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        packages[name.strip().split(".")[0]] += self_us
+    print("   Пакеты по собственному времени импорта:")
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"   {self_us / 1000:8.1f} мс  {self_us / total:5.1%}  {package}")
+    
+    # Модули проекта - их стоимость с учетом всего, что они тянут за собой
+    local = {"main", "handlers", "services", "database", "utils"}
+    print("   Модули проекта (накопленное время):")
+    for name, _, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True):
+        if name.strip().split(".")[0] in local:
+            print(f"   {cumulative_us / 1000:8.1f} мс  {name.strip()}")
+
+def report_runs(runs: list[dict]) -> None:
+    def median(key: str) -> float:
+        return statistics.median(run[key] for run in runs)
+    
+    print(f"\n🚀 Холодный старт, медиана по {len(runs)} прогонам:")
+    print(f"   Процесс целиком:          {median('process_ms'):8.1f} мс")
+    print(f"   Импорт модулей:           {median('import_ms'):8.1f} мс")
+    print(f"   База и диспетчер:         {median('setup_ms'):8.1f} мс")
+    print(f"   Первый апдейт (/start):   {median('first_update_ms'):8.1f} мс")
+    print(f"   Повторный апдейт:         {median('warm_update_ms'):8.1f} мс")
+    print(f"   От старта до ответа:      {median('to_first_update_ms'):8.1f} мс")
+    print(f"   Вызовы Bot API: {', '.join(runs[-1]['calls']) or 'нет'}")
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Замер времени запуска бота")
+    parser.add_argument('--runs', type=int, default=5, help="число холодных запусков")
+    parser.add_argument('--top', type=int, default=15, help="сколько пакетов показать в отчете импортов")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.child:
+        print(json.dumps(asyncio.run(child_run())))
+    else:
+        report_imports(import_costs(), args.top)
+        report_runs([run_child() for _ in range(args.runs)])
\ No newline at end of file
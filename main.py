@@ -3,31 +3,23 @@ import logging
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.types import BotCommand
 
 from utils.config_loader import config
 from database.connection import db
-from handlers import start, payments, chat
-# Подключаем дополнительные модули если они есть
-try:
-    from handlers import registration
-    registration_available = True
-except ImportError:
-    registration_available = False
-    print("⚠️ Модуль registration недоступен")
-
-try:
-    from handlers import referrals
-    referrals_available = True
-except ImportError:
-    referrals_available = False
-    print("⚠️ Модуль referrals недоступен")
-
-try:
-    from handlers import profile
-    profile_available = True
-except ImportError:
-    profile_available = False
-    print("⚠️ Модуль profile недоступен")
+from services.openai_service import OpenAIService
+from services.response_cache import response_cache
+from services.course_retriever import course_retriever
+from services.faq import faq
+from services.http_client import http_client
+from services.payment_service import PaymentService
+from services.reconciliation import reconcile_periodically
+from utils.fsm_storage import SQLiteStorage
+from utils.throttling import ThrottlingMiddleware, rate_limiter
+from utils.send_scheduler import send_scheduler
+# Тяжелые зависимости (OpenAI SDK, tiktoken, numpy) подгружаются лениво при первом использовании;
+# резервное копирование, аналитика и воркеры - только если включены в настройках
+from handlers import start, registration, referrals, profile, payments, chat
 
 # Настройка логирования
 logging.basicConfig(
@@ -36,43 +28,74 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def create_bot() -> Bot:
+    """Бот, все исходящие запросы которого проходят через общий планировщик отправки"""
+    bot = Bot(
+        token=config.current.telegram_bot_token,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+    bot.session.middleware(send_scheduler)
+    return bot
+
+def create_dispatcher() -> Dispatcher:
+    """Диспетчер со всеми роутерами (порядок важен: chat.router ловит любой текст)"""
+    dp = Dispatcher(storage=SQLiteStorage())
+    
+    # Антифлуд: общий лимит пользователя до фильтров и лимиты маршрутов по флагу rate_limit
+    for observer in (dp.message, dp.callback_query):
+        observer.outer_middleware(ThrottlingMiddleware(rate_limiter, outer=True))
+        observer.middleware(ThrottlingMiddleware(rate_limiter))
+    
+    dp.include_router(start.router)
+    dp.include_router(registration.router)
+    dp.include_router(referrals.router)
+    dp.include_router(profile.router)
+    dp.include_router(payments.router)
+    dp.include_router(chat.router)
+    return dp
+
 async def main():
     """Основная функция запуска бота"""
     
     # Проверяем наличие токена
-    bot_token = config.get('TELEGRAM_BOT_TOKEN')
+    bot_token = config.current.telegram_bot_token
     if not bot_token or bot_token == 'YOUR_BOT_TOKEN_HERE':
         logger.error("❌ Токен бота не найден! Проверьте файл config/settings.txt")
         return
     
     # Создаем бота и диспетчер
-    bot = Bot(
-        token=bot_token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
+    bot = create_bot()
     
-    dp = Dispatcher()
+    dp = create_dispatcher()
+    
+    # Отслеживаем изменения config/settings.txt без перезапуска
+    config_watcher = asyncio.create_task(config.watch())
+    reconciler = backups = analytics_refresher = None
     
     try:
         # Подключаемся к базе данных
         await db.connect()
         
-        # Регистрируем хендлеры
-        dp.include_router(start.router)
-        if registration_available:
-            dp.include_router(registration.router)
-            print("✅ Модуль registration подключен")
-        if referrals_available:
-            dp.include_router(referrals.router)
-            print("✅ Модуль referrals подключен")
-        if profile_available:
-            dp.include_router(profile.router)
-            print("✅ Модуль profile подключен")
-        dp.include_router(payments.router)  
-        dp.include_router(chat.router)
+        # Общая HTTP сессия для запросов к платежному провайдеру
+        await http_client.start()
+        PaymentService.use_http_client(http_client)
+        
+        # Индекс материалов курса собирается до первого вопроса (воркеры откроют сохраненный)
+        if course_retriever.available:
+            course_retriever.refresh()
+        
+        # Сверка платежей, по которым не пришел веб-хук (в основном процессе и в многопроцессном режиме)
+        reconciler = asyncio.create_task(reconcile_periodically(bot))
+        
+        # Фоновые задачи, выключенные при старте, включаются перезапуском бота
+        if config.current.backup_interval_hours > 0:
+            from database.backup import backup_manager
+            backups = asyncio.create_task(backup_manager.run_periodically())
+        if config.current.analytics_refresh_min > 0:
+            from admin.analytics import analytics
+            analytics_refresher = asyncio.create_task(analytics.refresh_periodically())
         
         # Устанавливаем команды бота (БЕЗ /start чтобы не терять реферальные параметры)
-        from aiogram.types import BotCommand
         await bot.set_my_commands([
             BotCommand(command="profile", description="👤 Мой профиль"),
             BotCommand(command="referral", description="👥 Реферальная программа"),
@@ -80,13 +103,34 @@ async def main():
         
         logger.info("✅ Бот запущен успешно!")
         
-        # Запускаем polling
-        await dp.start_polling(bot)
+        workers = config.current.worker_processes
+        if workers > 0:
+            # Этот процесс только принимает апдейты, обработка - в воркерах
+            from services.worker_pool import run_sharded
+            await run_sharded(bot, workers)
+        else:
+            # Запускаем polling
+            await dp.start_polling(bot)
         
     except Exception as e:
         logger.error(f"❌ Ошибка при запуске бота: {e}")
     finally:
         # Закрываем соединения
+        config_watcher.cancel()
+        if reconciler:
+            reconciler.cancel()
+        if backups:
+            backups.cancel()
+        if analytics_refresher:
+            analytics_refresher.cancel()
+        await OpenAIService.close()
+        await http_client.close()
+        print(response_cache.report())
+        print(course_retriever.report())
+        print(faq.report())
+        print(OpenAIService.get_scheduler().report())
+        print(rate_limiter.report())
+        print(send_scheduler.report())
         await db.disconnect()
         await bot.session.close()
 
@@ -0,0 +1,176 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from utils.config_loader import config
+from database.connection import db
+
+# Кодировка tiktoken загружается при первом подсчете: импорт и чтение словаря заметно замедляют старт
+_encoding = None
+_encoding_loaded = False
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = None
+    return _encoding
+
+Completion = Callable[[List[Dict[str, str]]], Awaitable[str]]
+
+SUMMARY_PROMPT = (
+    "Ты ведешь краткое резюме диалога пользователя с ассистентом. "
+    "Дополни текущее резюме новыми репликами: сохрани факты о пользователе, его цели, "
+    "вопросы и договоренности. Пиши по-русски, сжато, без вступлений."
+)
+
+# Сколько реплик сворачивать за одно обновление резюме (длинный хвост - за несколько обновлений)
+SUMMARY_BATCH = 100
+
+def count_tokens(text: str) -> int:
+    """Локальный подсчет токенов (tiktoken, если установлен, иначе оценка с запасом)"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Оценка сверху: ~4 байта UTF-8 на токен (кириллица - 2 байта на символ)
+    return len(text.encode('utf-8')) // 4 + 1
+
+class ContextBuilder:
+    """Сборка контекста диалога в пределах бюджета токенов с резюме старых реплик"""
+    
+    def __init__(self):
+        self._refreshing: Dict[int, asyncio.Task] = {}
+    
+    @staticmethod
+    def _budget() -> int:
+        return config.current.openai_context_tokens
+    
+    @staticmethod
+    def _summary_budget() -> int:
+        return config.current.openai_summary_tokens
+    
+    async def build(self, user_id: int, complete: Optional[Completion] = None) -> List[Dict[str, str]]:
+        """История для запроса: резюме + последние реплики, помещающиеся в бюджет"""
+        try:
+            summary, summarized_upto = await self._get_summary(user_id)
+            max_turns = config.current.openai_context_max_turns
+            
+            # На одну реплику больше окна - чтобы узнать, есть ли несвернутые реплики старше окна
+            rows = await db.fetchall("""
+                SELECT id, message, response FROM chat_history
+                WHERE user_id = ? AND id > ?
+                ORDER BY id DESC
+                LIMIT ?
+            """, (user_id, summarized_upto, max_turns + 1))
+            
+            # Идем от новых реплик к старым, пока укладываемся в бюджет и окно
+            budget = self._budget()
+            used = 0
+            included = []
+            for row in rows[:max_turns]:
+                cost = count_tokens(row[1]) + count_tokens(row[2] or "")
+                if used + cost > budget:
+                    break
+                used += cost
+                included.append(row)
+            
+            # Не поместившиеся в бюджет или окно реплики (и все более старые) сворачиваем в резюме в фоне
+            if len(included) < len(rows):
+                boundary = rows[len(included)][0]
+                self._schedule_refresh(user_id, boundary, complete)
+            
+            history = []
+            if summary:
+                history.append({
+                    "role": "system",
+                    "content": f"Краткое содержание предыдущего диалога: {summary}"
+                })
+            for row in reversed(included):
+                history.append({"role": "user", "content": row[1]})
+                if row[2]:
+                    history.append({"role": "assistant", "content": row[2]})
+            return history
+        
+        except Exception as e:
+            print(f"❌ Ошибка сборки контекста: {e}")
+            return []
+    
+    async def _get_summary(self, user_id: int) -> tuple[str, int]:
+        row = await db.fetchone("""
+            SELECT summary, summarized_upto FROM chat_summaries WHERE user_id = ?
+        """, (user_id,))
+        return (row[0], row[1]) if row else ("", 0)
+    
+    def _schedule_refresh(self, user_id: int, boundary: int, complete: Optional[Completion]) -> None:
+        """Запуск обновления резюме, если оно еще не выполняется для пользователя"""
+        task = self._refreshing.get(user_id)
+        if task is not None and not task.done():
+            return
+        self._refreshing[user_id] = asyncio.create_task(self.refresh_summary(user_id, boundary, complete))
+    
+    async def refresh_summary(self, user_id: int, boundary: int, complete: Optional[Completion] = None) -> None:
+        """Инкрементальное обновление резюме репликами до boundary включительно
+        
+        За раз сворачивается не больше SUMMARY_BATCH самых старых реплик, остаток - при следующих сборках контекста.
+        """
+        try:
+            summary, summarized_upto = await self._get_summary(user_id)
+            rows = await db.fetchall("""
+                SELECT id, message, response FROM chat_history
+                WHERE user_id = ? AND id > ? AND id <= ?
+                ORDER BY id
+                LIMIT ?
+            """, (user_id, summarized_upto, boundary, SUMMARY_BATCH))
+            if not rows:
+                return
+            
+            new_summary = None
+            if complete is not None:
+                try:
+                    new_summary = await self._summarize_with_llm(summary, rows, complete)
+                except Exception as e:
+                    print(f"⚠️ Резюме через LLM не получено, используем локальное: {e}")
+            if not new_summary:
+                new_summary = self._summarize_locally(summary, rows)
+            
+            await db.execute("""
+                INSERT OR REPLACE INTO chat_summaries (user_id, summary, summarized_upto, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            """, (user_id, new_summary, rows[-1][0]))
+            print(f"📝 Резюме диалога пользователя {user_id} обновлено ({len(rows)} реплик)")
+        
+        except Exception as e:
+            print(f"❌ Ошибка обновления резюме для {user_id}: {e}")
+        finally:
+            self._refreshing.pop(user_id, None)
+    
+    async def _summarize_with_llm(self, summary: str, rows: list, complete: Completion) -> str:
+        dialog = "\n".join(
+            f"Пользователь: {row[1]}\nАссистент: {row[2] or ''}" for row in rows
+        )
+        messages = [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Текущее резюме:\n{summary or '(пусто)'}\n\nНовые реплики:\n{dialog}"}
+        ]
+        new_summary = (await complete(messages)).strip()
+        return self._fit(new_summary)
+    
+    def _summarize_locally(self, summary: str, rows: list) -> str:
+        """Резюме без LLM: начала вопросов пользователя, самые новые в конце"""
+        points = [f"— {row[1][:150]}" for row in rows]
+        return self._fit("\n".join(filter(None, [summary, *points])))
+    
+    def _fit(self, text: str) -> str:
+        """Обрезка резюме до бюджета, отбрасывая самые старые строки"""
+        lines = text.split("\n")
+        while len(lines) > 1 and count_tokens("\n".join(lines)) > self._summary_budget():
+            lines.pop(0)
+        return "\n".join(lines)
+
+# Глобальный экземпляр сборщика контекста
+context_builder = ContextBuilder()
\ No newline at end of file
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from typing import List, Optional, Tuple
+
+from utils.config_loader import config
+from utils.screens import screens
+from services.lesson_store import lesson_store, PROJECT_ROOT
+from services.response_cache import ResponseCache
+
+TAG_RE = re.compile(r"<[^>]+>")
+WORD_RE = re.compile(r"\w+")
+
+# numpy - необязательная зависимость: без нее бот отвечает без материалов курса.
+# Импортируется при первом обращении к поиску, а не при старте бота
+np = None
+_numpy_loaded = False
+
+def _load_numpy():
+    global np, _numpy_loaded
+    if not _numpy_loaded:
+        _numpy_loaded = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np
+
+CONTEXT_HEADER = ("Фрагменты материалов курса, которые могут относиться к вопросу. "
+                  "Если они подходят - отвечай по ним, не выдумывай того, чего в них нет:")
+
+def chunk_text(text: str, max_words: int) -> List[str]:
+    """Разбиение текста на фрагменты: абзацы склеиваются до max_words слов, длинные режутся с перекрытием"""
+    chunks, current, size = [], [], 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        words = paragraph.split()
+        if not words:
+            continue
+        if size and size + len(words) > max_words:
+            chunks.append(" ".join(current))
+            current, size = [], 0
+        if len(words) > max_words:
+            # Длинный абзац - окнами по max_words слов с перекрытием в четверть окна
+            step = max(max_words - max_words // 4, 1)
+            start = 0
+            while True:
+                chunks.append(" ".join(words[start:start + max_words]))
+                if start + max_words >= len(words):
+                    break
+                start += step
+            continue
+        current.extend(words)
+        size += len(words)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+def hashed_features(text: str, dim: int) -> List[int]:
+    """Признаки текста: слова и символьные триграммы внутри слов, хэшированные в dim корзин
+    
+    Триграммы сглаживают русские окончания ("оплата" и "оплатил" делят большую часть признаков).
+    crc32 вместо hash(): индекс на диске должен совпадать между процессами и перезапусками.
+    """
+    features = []
+    for word in WORD_RE.findall(ResponseCache.normalize(text)):
+        features.append(zlib.crc32(f"w:{word}".encode('utf-8')) % dim)
+        padded = f" {word} "
+        features.extend(zlib.crc32(padded[i:i + 3].encode('utf-8')) % dim for i in range(len(padded) - 2))
+    return features
+
+class CourseRetriever:
+    """Поиск фрагментов материалов курса, близких к вопросу пользователя.
+    
+    Тексты уроков тарифа 2 и описание курса режутся на фрагменты и переводятся в векторы
+    хэшированных n-грамм (локально, без внешних API). Векторы - строки нормированной матрицы
+    numpy, поиск - одно умножение матрицы на вектор вопроса и выбор top-k.
+    Матрица сохраняется в RAG_INDEX_DIR и открывается через mmap: воркеры делят одну копию в памяти.
+    Каждый фрагмент помечен номером урока (0 - описание курса): пользователю подбираются только
+    фрагменты уроков, которые он уже получил, - в уроках есть платные ссылки на материалы.
+    """
+    
+    def __init__(self):
+        self.chunks: List[str] = []
+        # Номер урока каждого фрагмента (0 - описание курса, доступно всем)
+        self.lessons: List[int] = []
+        self._lesson_numbers = None
+        self._matrix = None
+        self._idf = None
+        self._signature: Optional[str] = None
+        # (время изменения файла уроков, версия настроек) - при изменении источники пересобираются
+        self._sources_key: Optional[Tuple[Optional[float], int]] = None
+        self._warned = False
+        self.searches = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+    
+    @property
+    def available(self) -> bool:
+        return config.current.rag_enabled and _load_numpy() is not None
+    
+    @staticmethod
+    def _sources() -> List[Tuple[int, str]]:
+        """Исходные тексты с номером урока: уроки тарифа 2 и описание курса с экрана "Купить курс" (0)"""
+        settings = config.current
+        texts = []
+        for number in range(1, lesson_store.count() + 1):
+            lesson = lesson_store.get(number)
+            if lesson and lesson.text:
+                texts.append((number, lesson.text))
+        course_text = TAG_RE.sub("", screens.current.course[0])
+        texts.append((0, f"Курс «{settings.course_name}», купить на сайте: {settings.course_url}\n\n{course_text}"))
+        return texts
+    
+    def _vectorize(self, features: List[int], dim: int):
+        counts = np.bincount(np.asarray(features, dtype=np.int64), minlength=dim).astype(np.float32)
+        return np.log1p(counts, out=counts)
+    
+    def _build(self, chunks: List[str], dim: int):
+        """Матрица фрагментов (строки нормированы) и веса idf признаков"""
+        matrix = np.zeros((len(chunks), dim), dtype=np.float32)
+        for row, chunk in enumerate(chunks):
+            matrix[row] = self._vectorize(hashed_features(chunk, dim), dim)
+        document_frequency = np.count_nonzero(matrix, axis=0)
+        idf = (np.log((1 + len(chunks)) / (1 + document_frequency)) + 1).astype(np.float32)
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.maximum(norms, 1e-6)
+        return matrix, idf
+    
+    def _paths(self) -> Tuple[str, str, str]:
+        directory = os.path.join(PROJECT_ROOT, config.current.rag_index_dir)
+        return (os.path.join(directory, 'matrix.npy'), os.path.join(directory, 'idf.npy'),
+                os.path.join(directory, 'chunks.json'))
+    
+    def _load(self, signature: str) -> bool:
+        """Открытие сохраненного индекса, если он собран из тех же текстов"""
+        matrix_path, idf_path, chunks_path = self._paths()
+        try:
+            with open(chunks_path, 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+            if meta.get('signature') != signature:
+                return False
+            matrix = np.load(matrix_path, mmap_mode='r')
+            idf = np.load(idf_path)
+        except (OSError, ValueError):
+            return False
+        if matrix.shape[0] != len(meta['chunks']) or len(meta.get('lessons', [])) != len(meta['chunks']):
+            return False
+        self.chunks, self._matrix, self._idf = meta['chunks'], matrix, idf
+        self._set_lessons(meta['lessons'])
+        return True
+    
+    def _set_lessons(self, lessons: List[int]) -> None:
+        self.lessons = lessons
+        self._lesson_numbers = np.asarray(lessons, dtype=np.int32)
+    
+    def _save(self, signature: str, matrix, idf) -> None:
+        """Запись индекса: сначала матрица, последним - chunks.json с подписью (по нему проверяется готовность)"""
+        matrix_path, idf_path, chunks_path = self._paths()
+        os.makedirs(os.path.dirname(matrix_path), exist_ok=True)
+        suffix = f".{os.getpid()}.tmp"
+        for path, array in ((matrix_path, matrix), (idf_path, idf)):
+            with open(path + suffix, 'wb') as file:
+                np.save(file, array)
+            os.replace(path + suffix, path)
+        with open(chunks_path + suffix, 'w', encoding='utf-8') as file:
+            json.dump({'signature': signature, 'chunks': self.chunks, 'lessons': self.lessons}, file, ensure_ascii=False)
+        os.replace(chunks_path + suffix, chunks_path)
+    
+    def refresh(self) -> None:
+        """Пересборка индекса, если изменились уроки или настройки"""
+        _load_numpy()
+        try:
+            lessons_mtime = os.path.getmtime(lesson_store.path)
+        except OSError:
+            lessons_mtime = None
+        sources_key = (lessons_mtime, config.current.version)
+        if sources_key == self._sources_key:
+            return
+        
+        settings = config.current
+        chunks, lessons = [], []
+        for number, text in self._sources():
+            for chunk in chunk_text(text, settings.rag_chunk_words):
+                chunks.append(chunk)
+                lessons.append(number)
+        signature = hashlib.sha256(
+            json.dumps([settings.rag_dim, chunks, lessons], ensure_ascii=False).encode('utf-8')
+        ).hexdigest()
+        if signature == self._signature:
+            self._sources_key = sources_key
+            return
+        
+        started = time.perf_counter()
+        if not self._load(signature):
+            matrix, idf = self._build(chunks, settings.rag_dim)
+            self.chunks, self._idf = chunks, idf
+            self._set_lessons(lessons)
+            try:
+                self._save(signature, matrix, idf)
+                self._matrix = np.load(self._paths()[0], mmap_mode='r')
+            except OSError as e:
+                print(f"⚠️ Индекс материалов курса не сохранен, работаем из памяти: {e}")
+                self._matrix = matrix
+        self._signature = signature
+        self._sources_key = sources_key
+        print(f"🔎 Индекс материалов курса: {len(self.chunks)} фрагментов "
+              f"за {(time.perf_counter() - started) * 1000:.0f} мс")
+    
+    def search(self, query: str, top_k: Optional[int] = None, min_score: Optional[float] = None,
+               max_lesson: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Фрагменты, ближайшие к запросу по косинусу, от лучшего к худшему
+        
+        max_lesson - только фрагменты описания курса и уроков с номером не больше него.
+        """
+        settings = config.current
+        top_k = settings.rag_top_k if top_k is None else top_k
+        min_score = settings.rag_min_score if min_score is None else min_score
+        self.refresh()
+        if not self.chunks or top_k <= 0:
+            return []
+        
+        started = time.perf_counter()
+        dim = self._matrix.shape[1]
+        vector = self._vectorize(hashed_features(query, dim), dim) * self._idf
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return []
+        
+        # Косинус со всеми фрагментами сразу: строки матрицы уже нормированы
+        scores = self._matrix @ (vector / norm)
+        if max_lesson is not None:
+            # Недоступные уроки не должны попасть в top-k, даже если они ближе всего к вопросу
+            scores[self._lesson_numbers > max_lesson] = -np.inf
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        results = [(self.chunks[i], float(scores[i])) for i in best if scores[i] >= min_score]
+        
+        elapsed = (time.perf_counter() - started) * 1000
+        self.searches += 1
+        self.total_ms += elapsed
+        self.max_ms = max(self.max_ms, elapsed)
+        return results
+    
+    def context_for(self, user_message: str, lessons_received: int) -> Optional[str]:
+        """Системное сообщение с подходящими фрагментами курса или None
+        
+        lessons_received - сколько уроков тарифа 2 получил пользователь (tariff2_counter).
+        """
+        if not self.available:
+            return None
+        try:
+            results = self.search(user_message, max_lesson=lessons_received)
+        except Exception as e:
+            # Поиск по материалам не должен ломать ответ - отвечаем без него
+            if not self._warned:
+                print(f"❌ Ошибка поиска по материалам курса: {e}")
+                self._warned = True
+            return None
+        if not results:
+            return None
+        return CONTEXT_HEADER + "\n" + "\n".join(f"- {chunk}" for chunk, _ in results)
+    
+    def report(self) -> str:
+        average = self.total_ms / self.searches if self.searches else 0.0
+        return (f"🔎 Поиск по материалам курса: {self.searches} запросов, "
+                f"среднее {average:.3f} мс, макс {self.max_ms:.3f} мс")
+
+# Глобальный поиск по материалам курса
+course_retriever = CourseRetriever()
\ No newline at end of file
@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from utils.config_loader import config
+from services.lesson_store import lesson_store, PROJECT_ROOT
+from services.response_cache import ResponseCache
+
+FAQ_PATH = os.path.join(PROJECT_ROOT, 'config', 'faq.txt')
+
+# Ответы, которые собираются из данных пользователя
+PERSONAL_ANSWERS = ('@subscription', '@lessons')
+
+# Настройки, которые можно подставить в текст ответа
+ANSWER_PLACEHOLDERS = ('course_name', 'course_url', 'tariff_1_price', 'tariff_2_price',
+                       'referral_bonus', 'bot_username', 'privacy_policy_url')
+
+def trigrams(normalized: str) -> FrozenSet[str]:
+    """Символьные триграммы слов: устойчивы к окончаниям и опечаткам ("закончится" ~ "заканчивается")"""
+    grams = set()
+    for word in normalized.split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+def content_words(normalized: str) -> FrozenSet[str]:
+    """Значимые слова (от 4 букв): "как", "где", "мне" на смысл вопроса почти не влияют"""
+    return frozenset(word for word in normalized.split() if len(word) >= 4)
+
+def _covered(words: FrozenSet[str], other: FrozenSet[str]) -> bool:
+    """У каждого слова есть пара с общим началом от 3 букв ("друга" ~ "друзей", но не "удалить" ~ "продлить")"""
+    return all(any(len(os.path.commonprefix([word, candidate])) >= 3 for candidate in other) for word in words)
+
+def same_intent(query_words: FrozenSet[str], key_words: FrozenSet[str]) -> bool:
+    """Значимые слова сообщения и формулировки соответствуют друг другу в обе стороны"""
+    return _covered(query_words, key_words) and _covered(key_words, query_words)
+
+@dataclass(frozen=True)
+class FaqEntry:
+    """Вопрос FAQ: формулировки и ответ (текст или @subscription / @lessons)"""
+    questions: Tuple[str, ...]
+    answer: str
+
+class FaqIndex:
+    """Быстрые ответы на частые вопросы без обращения к OpenAI.
+    
+    Формулировки из config/faq.txt нормализуются и раскладываются на триграммы один раз
+    при загрузке (файл перечитывается при изменении). Вопрос пользователя сначала ищется
+    точным совпадением, затем сравнивается с формулировками по коэффициенту Дайса.
+    Нечеткое совпадение засчитывается, только если похожесть не ниже FAQ_MIN_SIMILARITY,
+    лучший вопрос опережает следующий на FAQ_MIN_MARGIN и значимые слова совпадают
+    ("удалить подписку" не получит ответ про "продлить подписку").
+    Подобрать порог помогает python -m services.faq --check.
+    """
+    
+    def __init__(self, path: str = FAQ_PATH):
+        self.path = path
+        self._exact: Dict[str, FaqEntry] = {}
+        # (триграммы, значимые слова, нормализованная формулировка, вопрос)
+        self._keys: List[Tuple[FrozenSet[str], FrozenSet[str], str, FaqEntry]] = []
+        self._mtime: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+        self.total_ms = 0.0
+    
+    def _refresh(self) -> None:
+        """Перечитывает файл FAQ, если он изменился"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        
+        exact, keys = {}, []
+        for entry in self._load():
+            for question in entry.questions:
+                normalized = ResponseCache.normalize(question)
+                exact[normalized] = entry
+                keys.append((trigrams(normalized), content_words(normalized), normalized, entry))
+        self._exact, self._keys = exact, keys
+        self._mtime = mtime
+        print(f"❓ Загружено формулировок FAQ: {len(keys)}")
+    
+    def _load(self) -> List[FaqEntry]:
+        entries = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                for number, line in enumerate(file, start=1):
+                    line = line.strip()
+                    # Пропускаем комментарии и пустые строки
+                    if not line or line.startswith('#'):
+                        continue
+                    questions, separator, answer = line.partition('=>')
+                    questions = tuple(q.strip() for q in questions.split('|') if q.strip())
+                    answer = answer.strip().replace('\\n', '\n')
+                    if not separator or not questions or not answer:
+                        print(f"⚠️ FAQ, строка {number}: ожидается 'вопрос | вопрос => ответ', пропущена")
+                        continue
+                    if answer.startswith('@') and answer not in PERSONAL_ANSWERS:
+                        print(f"⚠️ FAQ, строка {number}: неизвестный ответ {answer}, пропущена")
+                        continue
+                    entries.append(FaqEntry(questions, answer))
+        except FileNotFoundError:
+            print(f"Файл FAQ не найден: {self.path}")
+        return entries
+    
+    def rank(self, normalized: str) -> List[Tuple[float, str, FaqEntry]]:
+        """Лучшая формулировка каждого вопроса FAQ по похожести: (похожесть, формулировка, вопрос)"""
+        self._refresh()
+        grams = trigrams(normalized)
+        if not grams:
+            return []
+        best: Dict[int, Tuple[float, str, FaqEntry]] = {}
+        for key, _, phrasing, entry in self._keys:
+            score = 2 * len(grams & key) / (len(grams) + len(key))
+            if score > best.get(id(entry), (-1.0,))[0]:
+                best[id(entry)] = (score, phrasing, entry)
+        return sorted(best.values(), key=lambda item: item[0], reverse=True)
+    
+    def explain(self, text: str) -> Tuple[Optional[FaqEntry], str]:
+        """Вопрос FAQ для сообщения (или None) и причина решения"""
+        settings = config.current
+        if len(text) > settings.faq_max_chars:
+            # Длинное сообщение - скорее всего не типовой вопрос
+            return None, "длинное сообщение"
+        self._refresh()
+        
+        normalized = ResponseCache.normalize(text)
+        entry = self._exact.get(normalized)
+        if entry is not None:
+            return entry, "точное совпадение"
+        
+        ranked = self.rank(normalized)
+        if not ranked:
+            return None, "нет вопросов"
+        score, phrasing, entry = ranked[0]
+        runner_up = ranked[1][0] if len(ranked) > 1 else 0.0
+        details = f"'{phrasing}' {score:.2f}, следующий {runner_up:.2f}"
+        if score < settings.faq_min_similarity:
+            return None, f"ниже порога: {details}"
+        if score - runner_up < settings.faq_min_margin:
+            return None, f"неоднозначно: {details}"
+        if not same_intent(content_words(normalized), content_words(phrasing)):
+            return None, f"другие значимые слова: {details}"
+        return entry, details
+    
+    def match(self, text: str) -> Optional[FaqEntry]:
+        """Вопрос FAQ, на который похоже сообщение, или None"""
+        return self.explain(text)[0]
+    
+    def answer(self, text: str, user_data: Dict[str, Any]) -> Optional[str]:
+        """Готовый ответ на частый вопрос или None (тогда вопрос уходит в OpenAI)"""
+        if not config.current.faq_enabled:
+            return None
+        
+        started = time.perf_counter()
+        entry = self.match(text)
+        if entry is None:
+            self.misses += 1
+            reply = None
+        else:
+            self.hits += 1
+            if entry.answer == '@subscription':
+                reply = self._subscription_answer(user_data)
+            elif entry.answer == '@lessons':
+                reply = self._lessons_answer(user_data)
+            else:
+                reply = self._render(entry.answer)
+        self.total_ms += (time.perf_counter() - started) * 1000
+        return reply
+    
+    @staticmethod
+    def _render(answer: str) -> str:
+        settings = config.current
+        values = {name: getattr(settings, name) for name in ANSWER_PLACEHOLDERS}
+        try:
+            return answer.format_map(values)
+        except (KeyError, ValueError, IndexError):
+            # Фигурные скобки в тексте ответа - отправляем как есть
+            return answer
+    
+    @staticmethod
+    def _subscription_answer(user_data: Dict[str, Any]) -> str:
+        if not user_data['subscription_end']:
+            return "❌ Подписка не активна. Оформить ее можно командой /start"
+        
+        end_date = datetime.fromisoformat(user_data['subscription_end'])
+        left = end_date - datetime.now()
+        if left.total_seconds() <= 0:
+            return f"❌ Подписка истекла {end_date.strftime('%d.%m.%Y %H:%M')}. Продлить ее можно командой /start"
+        return (f"✅ Подписка активна до: {end_date.strftime('%d.%m.%Y %H:%M')}\n"
+                f"⏳ Осталось дней: {left.days}\n"
+                f"📦 Тариф: {user_data['tariff_type']}\n\n"
+                "💳 Продлить можно в любой момент командой /start - дни добавятся к текущему сроку.")
+    
+    @staticmethod
+    def _lessons_answer(user_data: Dict[str, Any]) -> str:
+        received = user_data['tariff2_counter'] or 0
+        total = lesson_store.count()
+        if received == 0:
+            return ("📚 Уроки курса приходят с Тарифом 2: каждая оплата открывает следующий урок.\n"
+                    "Оформить тариф можно командой /start")
+        
+        text = f"📚 Получено уроков: {min(received, total)} из {total}\n\n"
+        lesson = lesson_store.get(min(received, total))
+        if lesson:
+            text += f"🎓 <b>Последний урок</b>\n{lesson.text}\n\n"
+        if received >= total:
+            text += "🎉 Вы получили все доступные уроки курса."
+        else:
+            text += "💎 Следующий урок придет сразу после следующей оплаты Тарифа 2."
+        return text
+    
+    def report(self) -> str:
+        total = self.hits + self.misses
+        average = self.total_ms / total if total else 0.0
+        return (f"❓ FAQ: ответов без OpenAI {self.hits} из {total} сообщений, "
+                f"проверка в среднем {average:.3f} мс")
+
+# Глобальный индекс частых вопросов
+faq = FaqIndex()
+
+def check(questions: List[str], near: float) -> None:
+    """Решение по каждому вопросу; отклоненные с похожестью от near - кандидаты в формулировки FAQ"""
+    matched = near_misses = 0
+    for question in questions:
+        entry, reason = faq.explain(question)
+        if entry is not None:
+            matched += 1
+            print(f"✅ {question!r} -> {entry.questions[0]!r} ({reason})")
+            continue
+        ranked = faq.rank(ResponseCache.normalize(question))
+        if ranked and ranked[0][0] >= near:
+            near_misses += 1
+            print(f"⚠️ {question!r}: {reason}")
+    print(f"❓ Проверено {len(questions)}: ответ из FAQ {matched}, близких промахов {near_misses} "
+          f"(порог {config.current.faq_min_similarity}, отрыв {config.current.faq_min_margin})")
+
+async def recent_questions(limit: int) -> List[str]:
+    """Последние вопросы пользователей из истории (read-only соединение)"""
+    from admin.export import open_readonly
+    from database.connection import db
+    
+    connection = await open_readonly(db.db_path)
+    try:
+        cursor = await connection.execute("SELECT message FROM chat_history ORDER BY id DESC LIMIT ?", (limit,))
+        return [row[0] for row in await cursor.fetchall()]
+    finally:
+        await connection.close()
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Проверка сопоставления вопросов с config/faq.txt")
+    parser.add_argument('--check', nargs='*', metavar='ВОПРОС', required=True,
+                        help="вопросы для проверки; без них - формулировки самого FAQ и последние вопросы из истории")
+    parser.add_argument('--history', type=int, default=500, help="сколько последних вопросов из истории проверить")
+    parser.add_argument('--near', type=float, default=0.5, help="с какой похожести показывать промахи")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    async def main():
+        args = parse_args()
+        questions = args.check
+        if not questions:
+            faq._refresh()
+            # Формулировка, которая попадает не в свой вопрос, - пересечение вопросов FAQ
+            for _, _, phrasing, entry in faq._keys:
+                ranked = faq.rank(phrasing)
+                rival = next((item for item in ranked if item[2] is not entry), None)
+                if rival and rival[0] >= args.near:
+                    print(f"🔀 {phrasing!r} похожа на {rival[1]!r} из другого вопроса: {rival[0]:.2f}")
+            questions = await recent_questions(args.history) if args.history > 0 else []
+        check(questions, args.near)
+    
+    asyncio.run(main())
\ No newline at end of file
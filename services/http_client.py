@@ -0,0 +1,48 @@
+from typing import Optional
+
+import aiohttp
+
+from utils.config_loader import config
+
+class HTTPClient:
+    """Общая HTTP сессия приложения для запросов к внешним API (CloudPayments и т.п.)
+    
+    Одна сессия на процесс: соединения переиспользуются (keep-alive), DNS кэшируется,
+    число соединений ограничено в целом и на каждый хост. Создается при запуске в main.py,
+    закрывается при остановке; скрипты без main.py получают сессию лениво.
+    """
+    
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    async def start(self) -> aiohttp.ClientSession:
+        """Создание сессии с пулом соединений по текущим настройкам"""
+        if self._session is not None and not self._session.closed:
+            return self._session
+        
+        settings = config.current
+        connector = aiohttp.TCPConnector(
+            limit=settings.http_pool_limit,
+            limit_per_host=settings.http_pool_limit_per_host,
+            ttl_dns_cache=settings.http_dns_cache_ttl,
+            keepalive_timeout=settings.http_keepalive_timeout
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=settings.http_timeout, connect=5.0)
+        )
+        return self._session
+    
+    async def session(self) -> aiohttp.ClientSession:
+        """Текущая сессия (создается при первом обращении)"""
+        if self._session is None or self._session.closed:
+            return await self.start()
+        return self._session
+    
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+# Глобальный HTTP клиент (передается в PaymentService при запуске)
+http_client = HTTPClient()
\ No newline at end of file
@@ -0,0 +1,166 @@
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from aiogram.types import FSInputFile
+from aiogram.exceptions import TelegramBadRequest
+
+from database.connection import db
+from utils.config_loader import load_tariff2_strings
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
+LESSONS_PATH = os.path.join(PROJECT_ROOT, 'config', 'tariff2_strings.txt')
+
+# Лимит Telegram на длину подписи к медиа
+CAPTION_LIMIT = 1024
+
+# Тип вложения -> (метод Bot, имя аргумента)
+MEDIA_METHODS = {
+    'photo': ('send_photo', 'photo'),
+    'video': ('send_video', 'video'),
+    'document': ('send_document', 'document'),
+    'audio': ('send_audio', 'audio'),
+}
+
+@dataclass(frozen=True)
+class Lesson:
+    """Урок тарифа 2"""
+    number: int
+    text: str
+    media_type: Optional[str] = None
+    media: Optional[str] = None
+    
+    @property
+    def is_remote(self) -> bool:
+        return bool(self.media) and self.media.startswith(('http://', 'https://'))
+
+class LessonStore:
+    """Уроки тарифа 2: загрузка один раз, перечитывание при изменении файла, кэш file_id"""
+    
+    def __init__(self, path: str = LESSONS_PATH):
+        self.path = path
+        self._lessons: Dict[int, Lesson] = {}
+        self._mtime: Optional[float] = None
+        self._signature = ""
+        self._file_ids: Optional[Dict[str, str]] = None
+    
+    def _refresh(self) -> None:
+        """Перечитывает файл уроков, если он изменился"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        
+        lessons = {}
+        lines = load_tariff2_strings()
+        for number, line in enumerate(lines, start=1):
+            lessons[number] = self._parse(number, line)
+        self._lessons = lessons
+        self._signature = hashlib.sha256("\n".join(lines).encode('utf-8')).hexdigest()
+        self._mtime = mtime
+        print(f"📚 Загружено уроков тарифа 2: {len(lessons)}")
+    
+    @staticmethod
+    def _parse(number: int, line: str) -> Lesson:
+        """Строка урока: 'текст' или 'текст || video: media/lesson1.mp4'"""
+        text, _, attachment = line.partition('||')
+        media_type, _, media = attachment.partition(':')
+        media_type = media_type.strip().lower()
+        if media_type not in MEDIA_METHODS:
+            if attachment.strip():
+                print(f"⚠️ Урок {number}: неизвестный тип вложения '{media_type}', отправим только текст")
+            return Lesson(number, text.strip())
+        return Lesson(number, text.strip(), media_type, media.strip())
+    
+    def get(self, number: int) -> Optional[Lesson]:
+        """Урок по номеру (нумерация с 1)"""
+        self._refresh()
+        return self._lessons.get(number)
+    
+    def count(self) -> int:
+        self._refresh()
+        return len(self._lessons)
+    
+    @property
+    def signature(self) -> str:
+        """Хэш текстов уроков: меняется при любой правке файла уроков"""
+        self._refresh()
+        return self._signature
+    
+    def _media_key(self, lesson: Lesson) -> Optional[str]:
+        """Ключ кэша file_id: URL или путь + размер + время изменения файла"""
+        if lesson.is_remote:
+            return lesson.media
+        path = os.path.join(PROJECT_ROOT, lesson.media)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            print(f"❌ Файл урока {lesson.number} не найден: {path}")
+            return None
+        return f"{lesson.media}|{stat.st_size}|{stat.st_mtime_ns}"
+    
+    async def _load_file_ids(self) -> Dict[str, str]:
+        if self._file_ids is None:
+            rows = await db.fetchall("SELECT media_key, file_id FROM media_file_ids")
+            self._file_ids = {row[0]: row[1] for row in rows}
+        return self._file_ids
+    
+    async def _remember_file_id(self, media_key: str, media_type: str, file_id: str) -> None:
+        self._file_ids[media_key] = file_id
+        await db.execute("""
+            INSERT OR REPLACE INTO media_file_ids (media_key, file_id, media_type, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        """, (media_key, file_id, media_type))
+    
+    async def deliver(self, bot, chat_id: int, lesson: Lesson, text: str) -> None:
+        """Отправка урока: текст и вложение (повторно используется file_id Telegram)"""
+        if not lesson.media_type:
+            await bot.send_message(chat_id, text)
+            return
+        
+        media_key = self._media_key(lesson)
+        if media_key is None:
+            await bot.send_message(chat_id, text)
+            return
+        
+        # Длинный текст не помещается в подпись - отправляем его отдельным сообщением
+        caption = text
+        if len(text) > CAPTION_LIMIT:
+            await bot.send_message(chat_id, text)
+            caption = None
+        
+        method_name, argument = MEDIA_METHODS[lesson.media_type]
+        method = getattr(bot, method_name)
+        file_ids = await self._load_file_ids()
+        
+        cached = file_ids.get(media_key)
+        if cached:
+            try:
+                await method(chat_id, **{argument: cached}, caption=caption)
+                return
+            except TelegramBadRequest as e:
+                # file_id устарел - загружаем файл заново
+                print(f"⚠️ file_id урока {lesson.number} недействителен, загружаем заново: {e}")
+                file_ids.pop(media_key, None)
+        
+        source = lesson.media if lesson.is_remote else FSInputFile(os.path.join(PROJECT_ROOT, lesson.media))
+        sent = await method(chat_id, **{argument: source}, caption=caption)
+        
+        file_id = self._extract_file_id(sent, lesson.media_type)
+        if file_id:
+            await self._remember_file_id(media_key, lesson.media_type, file_id)
+            print(f"💾 file_id урока {lesson.number} сохранен, повторная загрузка не потребуется")
+    
+    @staticmethod
+    def _extract_file_id(message, media_type: str) -> Optional[str]:
+        media = getattr(message, media_type, None)
+        if media_type == 'photo' and media:
+            # Самый большой размер фото - последний
+            media = media[-1]
+        return getattr(media, 'file_id', None)
+
+# Глобальный экземпляр хранилища уроков
+lesson_store = LessonStore()
\ No newline at end of file
@@ -0,0 +1,96 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiogram.types import Message
+
+from utils.config_loader import config
+
+class Flight:
+    """Обработка одной объединенной реплики пользователя"""
+    
+    __slots__ = ('texts', 'task', 'answering')
+    
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.task: Optional[asyncio.Task] = None
+        # Пользователь уже видит ответ (или ответ записан в историю) - отменять генерацию нельзя
+        self.answering = False
+    
+    def start_answer(self) -> None:
+        self.answering = True
+
+TurnHandler = Callable[[Message, str, Flight], Awaitable[None]]
+
+class MessageCoalescer:
+    """Объединение серии быстрых сообщений пользователя в одну реплику"""
+    
+    def __init__(self, handler: TurnHandler):
+        self.handler = handler
+        self._buffers: Dict[int, List[Message]] = {}
+        self._pending_texts: Dict[int, List[str]] = {}
+        self._timers: Dict[int, asyncio.Task] = {}
+        self._flights: Dict[int, Flight] = {}
+        self.merged = 0
+    
+    @property
+    def window(self) -> float:
+        """Окно объединения в секундах (читается из текущих настроек)"""
+        return config.current.chat_coalesce_ms / 1000
+    
+    async def submit(self, message: Message) -> None:
+        """Добавление сообщения в буфер пользователя с перезапуском таймера"""
+        user_id = message.from_user.id
+        
+        if self.window <= 0:
+            await self.handler(message, message.text, Flight([message.text]))
+            return
+        
+        texts = self._pending_texts.setdefault(user_id, [])
+        
+        # Генерация еще не начала отвечать - отменяем ее и добавляем ее текст в новую реплику
+        flight = self._flights.get(user_id)
+        if flight is not None and flight.task is not None and not flight.task.done() and not flight.answering:
+            flight.task.cancel()
+            self._flights.pop(user_id, None)
+            texts[:0] = flight.texts
+            print(f"🔀 Генерация для {user_id} отменена, текст объединен с новым сообщением")
+        
+        texts.append(message.text)
+        self._buffers.setdefault(user_id, []).append(message)
+        if len(texts) > 1:
+            self.merged += 1
+        
+        timer = self._timers.get(user_id)
+        if timer is not None and not timer.done():
+            timer.cancel()
+        self._timers[user_id] = asyncio.create_task(self._flush_later(user_id))
+    
+    async def _flush_later(self, user_id: int) -> None:
+        await asyncio.sleep(self.window)
+        
+        # Предыдущий ответ еще выводится - ждем его, чтобы сохранить порядок реплик
+        previous = self._flights.get(user_id)
+        if previous is not None and previous.task is not None and not previous.task.done():
+            await asyncio.wait({previous.task})
+        
+        self._timers.pop(user_id, None)
+        messages = self._buffers.pop(user_id, [])
+        texts = self._pending_texts.pop(user_id, [])
+        if not messages:
+            return
+        
+        flight = Flight(texts)
+        flight.task = asyncio.create_task(self._run(messages[-1], flight))
+        self._flights[user_id] = flight
+    
+    async def _run(self, message: Message, flight: Flight) -> None:
+        try:
+            await self.handler(message, "\n".join(flight.texts), flight)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Ошибка обработки объединенной реплики: {e}")
+        finally:
+            user_id = message.from_user.id
+            if self._flights.get(user_id) is flight:
+                self._flights.pop(user_id, None)
\ No newline at end of file
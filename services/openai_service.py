@@ -1,72 +1,408 @@
-from typing import List, Dict
+import asyncio
+import html
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, List, Dict, Optional, Set, Tuple
 from utils.config_loader import config
 from database.connection import db
+from services.response_cache import response_cache
+from services.context_builder import context_builder
+from services.course_retriever import course_retriever
+
+BUSY_MESSAGE = "⏳ Сейчас очень много запросов. Пожалуйста, повторите вопрос через минуту."
+ERROR_MESSAGE = "😔 Произошла ошибка при обработке вашего запроса. Попробуйте позже."
+
+class OpenAIBusyError(Exception):
+    """Все слоты для запросов к OpenAI заняты или upstream ответил 429"""
+
+# Очередь фоновых запросов (резюме диалогов и т.п.)
+BACKGROUND_QUEUE = 0
+
+class FairScheduler:
+    """Справедливое распределение слотов OpenAI между пользователями.
+    
+    У каждого пользователя своя FIFO очередь и не больше одного запроса в работе.
+    Свободный слот получает ожидающий пользователь с наименьшим виртуальным временем
+    (stride scheduling): вес 2 обслуживается вдвое чаще веса 1.
+    """
+    
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.in_flight = 0
+        self._queues: Dict[int, Deque[Tuple[asyncio.Future, float]]] = {}
+        self._active: Set[int] = set()
+        self._pass: Dict[int, float] = {}
+        self._weights: Dict[int, float] = {}
+        self._vtime = 0.0
+        self._waits: Deque[float] = deque(maxlen=1000)
+        self.granted = 0
+        self.rejected = 0
+    
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+    
+    async def acquire(self, user_id: int, weight: float, timeout: float, max_queue: int, max_user_queue: int) -> None:
+        """Ожидание слота в очереди пользователя"""
+        queue = self._queues.get(user_id)
+        if self.queued >= max_queue or (queue is not None and len(queue) >= max_user_queue):
+            self.rejected += 1
+            raise OpenAIBusyError("очередь запросов переполнена")
+        
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+            # Вернувшийся пользователь не получает преимущества за время простоя
+            self._pass[user_id] = max(self._pass.get(user_id, 0.0), self._vtime)
+        self._weights[user_id] = weight
+        
+        future = asyncio.get_running_loop().create_future()
+        enqueued = time.monotonic()
+        queue.append((future, enqueued))
+        self._dispatch()
+        
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Слот выдан одновременно с отменой ожидания - возвращаем его
+                if isinstance(e, asyncio.CancelledError):
+                    self.release(user_id)
+                    raise
+                return
+            future.cancel()
+            self._discard(user_id, future)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.rejected += 1
+            raise OpenAIBusyError("превышено время ожидания слота")
+    
+    def release(self, user_id: int) -> None:
+        """Освобождение слота пользователя"""
+        self.in_flight -= 1
+        self._active.discard(user_id)
+        if user_id not in self._queues and self._pass.get(user_id, 0.0) <= self._vtime:
+            self._pass.pop(user_id, None)
+            self._weights.pop(user_id, None)
+        self._dispatch()
+    
+    def _discard(self, user_id: int, future: asyncio.Future) -> None:
+        queue = self._queues.get(user_id)
+        if queue is None:
+            return
+        for item in queue:
+            if item[0] is future:
+                queue.remove(item)
+                break
+        if not queue:
+            del self._queues[user_id]
+    
+    def _dispatch(self) -> None:
+        """Выдача свободных слотов ожидающим пользователям"""
+        while self.in_flight < self.slots:
+            candidates = [uid for uid in self._queues if uid not in self._active]
+            if not candidates:
+                return
+            user_id = min(candidates, key=lambda uid: self._pass[uid])
+            
+            queue = self._queues[user_id]
+            future, enqueued = queue.popleft()
+            if not queue:
+                del self._queues[user_id]
+            if future.done():
+                continue
+            
+            future.set_result(None)
+            self.in_flight += 1
+            self.granted += 1
+            self._active.add(user_id)
+            self._waits.append(time.monotonic() - enqueued)
+            self._vtime = self._pass[user_id]
+            self._pass[user_id] += 1.0 / self._weights.get(user_id, 1.0)
+    
+    def stats(self) -> Dict[str, float]:
+        """Метрики очереди: глубина, число ожидающих пользователей, время ожидания"""
+        waits = sorted(self._waits)
+        return {
+            'queued': self.queued,
+            'users_waiting': len(self._queues),
+            'in_flight': self.in_flight,
+            'granted': self.granted,
+            'rejected': self.rejected,
+            'avg_wait_ms': sum(waits) / len(waits) * 1000 if waits else 0.0,
+            'p95_wait_ms': waits[int(len(waits) * 0.95)] * 1000 if waits else 0.0,
+            'max_wait_ms': waits[-1] * 1000 if waits else 0.0
+        }
+    
+    def report(self) -> str:
+        stats = self.stats()
+        return (f"🚦 Очередь OpenAI: выдано {stats['granted']}, отказов {stats['rejected']}, "
+                f"ожидание среднее {stats['avg_wait_ms']:.0f} мс, p95 {stats['p95_wait_ms']:.0f} мс, "
+                f"макс {stats['max_wait_ms']:.0f} мс")
 
 class OpenAIService:
     """Сервис для работы с OpenAI API"""
     
+    # Один общий клиент на процесс: пул keep-alive соединений переиспользуется между запросами
+    _client = None
+    _client_params: Optional[tuple] = None
+    _scheduler: Optional[FairScheduler] = None
+    # id клиента -> запросов в работе: замененный клиент закрывается после последнего из них
+    _client_users: Dict[int, int] = {}
+    _close_tasks: Set[asyncio.Task] = set()
+    
+    @staticmethod
+    def is_configured() -> bool:
+        """Настроен ли API ключ OpenAI"""
+        return config.current.openai_configured
+    
+    @classmethod
+    def _get_client(cls):
+        """Ленивое создание общего AsyncOpenAI клиента с пулом соединений"""
+        settings = config.current
+        params = (settings.openai_api_key, settings.openai_base_url, settings.openai_max_concurrency,
+                  settings.openai_timeout, settings.openai_max_retries)
+        
+        # После перезагрузки настроек клиент пересоздается; старый дорабатывает начатые запросы
+        if cls._client is not None and cls._client_params != params:
+            retired, cls._client = cls._client, None
+            if id(retired) not in cls._client_users:
+                cls._close_later(retired)
+        
+        if cls._client is None:
+            import httpx
+            from openai import AsyncOpenAI
+            
+            # Пул не больше лимита одновременных запросов - медленный upstream не съест все сокеты
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.openai_max_concurrency,
+                    max_keepalive_connections=settings.openai_max_concurrency,
+                    keepalive_expiry=60.0
+                ),
+                timeout=httpx.Timeout(settings.openai_timeout, connect=5.0)
+            )
+            cls._client = AsyncOpenAI(
+                api_key=settings.openai_api_key,
+                base_url=settings.openai_base_url or None,
+                timeout=settings.openai_timeout,
+                max_retries=settings.openai_max_retries,
+                http_client=http_client
+            )
+            cls._client_params = params
+        return cls._client
+    
+    @classmethod
+    def _checkout_client(cls):
+        """Клиент для одного запроса (учитывается, пока запрос не завершится)"""
+        client = cls._get_client()
+        cls._client_users[id(client)] = cls._client_users.get(id(client), 0) + 1
+        return client
+    
+    @classmethod
+    def _return_client(cls, client) -> None:
+        users = cls._client_users.pop(id(client)) - 1
+        if users:
+            cls._client_users[id(client)] = users
+        elif client is not cls._client:
+            # Последний запрос замененного клиента завершился
+            cls._close_later(client)
+    
+    @classmethod
+    def _close_later(cls, client) -> None:
+        task = asyncio.create_task(client.close())
+        cls._close_tasks.add(task)
+        task.add_done_callback(cls._close_tasks.discard)
+    
+    @classmethod
+    def get_scheduler(cls) -> FairScheduler:
+        """Планировщик с глобальным лимитом одновременных запросов к OpenAI"""
+        if cls._scheduler is None:
+            cls._scheduler = FairScheduler(config.current.openai_max_concurrency)
+        return cls._scheduler
+    
     @staticmethod
-    async def get_response(user_id: int, user_message: str) -> str:
-        """Получение ответа от OpenAI с учетом контекста"""
+    def priority_weight(tariff_type: Optional[int]) -> float:
+        """Вес пользователя в планировщике (тариф 2 обслуживается приоритетнее)"""
+        if tariff_type == 2:
+            return config.current.openai_tariff2_weight
+        return 1.0
+    
+    @classmethod
+    async def _acquire_slot(cls, queue_id: int, weight: float) -> None:
+        """Ожидание свободного слота с ограничением очереди и времени ожидания"""
+        settings = config.current
+        scheduler = cls.get_scheduler()
+        scheduler.slots = settings.openai_max_concurrency
+        await scheduler.acquire(
+            queue_id,
+            weight,
+            timeout=settings.openai_queue_timeout,
+            max_queue=settings.openai_max_queue,
+            max_user_queue=settings.openai_user_queue
+        )
+    
+    @classmethod
+    async def _complete(cls, messages: List[Dict[str, str]], queue_id: int = BACKGROUND_QUEUE,
+                        weight: float = 1.0) -> str:
+        """Запрос к OpenAI chat completions через планировщик"""
+        from openai import RateLimitError
+        
+        settings = config.current
+        await cls._acquire_slot(queue_id, weight)
+        client = None
+        try:
+            client = cls._checkout_client()
+            response = await client.chat.completions.create(
+                model=settings.openai_model,
+                messages=messages,
+                max_tokens=settings.openai_max_tokens,
+                temperature=settings.openai_temperature
+            )
+        except RateLimitError as e:
+            raise OpenAIBusyError(str(e))
+        finally:
+            if client is not None:
+                cls._return_client(client)
+            cls.get_scheduler().release(queue_id)
+        
+        return response.choices[0].message.content or ""
+    
+    @classmethod
+    async def _stream(cls, messages: List[Dict[str, str]], queue_id: int,
+                      weight: float = 1.0) -> AsyncIterator[str]:
+        """Потоковый запрос к OpenAI: отдает фрагменты ответа по мере генерации"""
+        from openai import RateLimitError
+        
+        settings = config.current
+        await cls._acquire_slot(queue_id, weight)
+        client = None
+        try:
+            client = cls._checkout_client()
+            try:
+                stream = await client.chat.completions.create(
+                    model=settings.openai_model,
+                    messages=messages,
+                    max_tokens=settings.openai_max_tokens,
+                    temperature=settings.openai_temperature,
+                    stream=True
+                )
+            except RateLimitError as e:
+                raise OpenAIBusyError(str(e))
+            
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Слот и клиент освобождаются и при досрочном закрытии генератора
+            if client is not None:
+                cls._return_client(client)
+            cls.get_scheduler().release(queue_id)
+    
+    @staticmethod
+    def _build_messages(message_history: List[Dict[str, str]], user_message: str,
+                        course_context: Optional[str]) -> List[Dict[str, str]]:
+        """Формирование списка сообщений для запроса (с фрагментами материалов курса)"""
+        system_message = config.current.openai_system_message
+        messages = [{"role": "system", "content": system_message}]
+        if course_context:
+            messages.append({"role": "system", "content": course_context})
+        return [*messages, *message_history, {"role": "user", "content": user_message}]
+    
+    @staticmethod
+    async def get_response(user_id: int, user_message: str, tariff_type: Optional[int] = None,
+                           lessons_received: int = 0, on_answer: Optional[Callable[[], None]] = None) -> str:
+        """Получение ответа от OpenAI с учетом контекста (готовый к отправке HTML)
+        
+        on_answer вызывается, когда ответ уже получен, но еще не записан в историю:
+        после этого вызывающий код не должен отменять обработку, иначе ответ останется неотправленным.
+        """
         
         # Проверяем наличие API ключа
-        api_key = config.get('OPENAI_API_KEY')
-        if not api_key or api_key == 'TEMP_PLACEHOLDER':
+        if not OpenAIService.is_configured():
             # Режим разработки - возвращаем заглушку
+            if on_answer:
+                on_answer()
             await OpenAIService._save_message_to_history(user_id, user_message, "dev_response")
-            return f"🤖 <b>Режим разработки</b>\n\nВаше сообщение: <i>{user_message}</i>\n\n" \
+            return f"🤖 <b>Режим разработки</b>\n\nВаше сообщение: <i>{html.escape(user_message, quote=False)}</i>\n\n" \
                    f"OpenAI API пока не настроен. Это заглушка ответа.\n" \
                    f"После настройки API здесь будет настоящий ИИ-ассистент!"
         
         try:
-            # Получаем историю сообщений (последние 10)
+            # Получаем историю сообщений (резюме + последние реплики в пределах бюджета)
             message_history = await OpenAIService._get_message_history(user_id)
             
-            # TODO: Здесь будет реальная интеграция с OpenAI
-            # import openai
-            # openai.api_key = api_key
+            # Фрагменты уже полученных уроков; от них зависит ответ, поэтому они входят в ключ кэша
+            course_context = course_retriever.context_for(user_message, lessons_received)
             
-            # Временная заглушка
-            ai_response = f"Ответ ИИ на ваше сообщение: {user_message}"
+            # Повторный вопрос - отвечаем из кэша без обращения к API
+            cache_key = response_cache.make_key(user_message, message_history, course_context)
+            ai_response = await response_cache.get(cache_key)
             
-            # Сохраняем сообщение и ответ в историю
-            await OpenAIService._save_message_to_history(user_id, user_message, ai_response)
+            if ai_response is None:
+                messages = OpenAIService._build_messages(message_history, user_message, course_context)
+                started = time.perf_counter()
+                weight = OpenAIService.priority_weight(tariff_type)
+                ai_response = await OpenAIService._complete(messages, user_id, weight)
+                if response_cache.is_shareable(message_history):
+                    await response_cache.set(cache_key, ai_response, (time.perf_counter() - started) * 1000)
             
-            return ai_response
+            # Сохраняем сообщение и ответ в историю (с этого момента ответ должен быть отправлен)
+            if on_answer:
+                on_answer()
+            await OpenAIService._save_message_to_history(user_id, user_message, ai_response)
             
+            # Бот отправляет в режиме HTML: текст модели экранируется, как в StreamRenderer
+            return html.escape(ai_response, quote=False)
+        
+        except OpenAIBusyError as e:
+            print(f"⏳ OpenAI перегружен для пользователя {user_id}: {e}")
+            return BUSY_MESSAGE
         except Exception as e:
             print(f"❌ Ошибка OpenAI API: {e}")
-            return "😔 Произошла ошибка при обработке вашего запроса. Попробуйте позже."
+            return ERROR_MESSAGE
     
     @staticmethod
-    async def _get_message_history(user_id: int, limit: int = 10) -> List[Dict[str, str]]:
-        """Получение истории сообщений пользователя"""
-        try:
-            rows = await db.fetchall("""
-                SELECT message, response FROM chat_history 
-                WHERE user_id = ? 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            """, (user_id, limit))
-            
-            # Возвращаем в обратном порядке (старые сообщения первыми)
-            history = []
-            for row in reversed(rows):
-                history.append({
-                    "role": "user",
-                    "content": row[0]
-                })
-                if row[1]:  # Если есть ответ
-                    history.append({
-                        "role": "assistant", 
-                        "content": row[1]
-                    })
-            
-            return history
-            
-        except Exception as e:
-            print(f"❌ Ошибка получения истории: {e}")
-            return []
+    async def stream_response(user_id: int, user_message: str, tariff_type: Optional[int] = None,
+                              lessons_received: int = 0) -> AsyncIterator[str]:
+        """Потоковое получение ответа от OpenAI с учетом контекста.
+        
+        Ошибки (в том числе OpenAIBusyError) пробрасываются вызывающему коду.
+        История сохраняется только после получения полного ответа.
+        """
+        message_history = await OpenAIService._get_message_history(user_id)
+        course_context = course_retriever.context_for(user_message, lessons_received)
+        
+        cache_key = response_cache.make_key(user_message, message_history, course_context)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            await OpenAIService._save_message_to_history(user_id, user_message, cached)
+            return
+        
+        messages = OpenAIService._build_messages(message_history, user_message, course_context)
+        started = time.perf_counter()
+        
+        parts = []
+        weight = OpenAIService.priority_weight(tariff_type)
+        async for delta in OpenAIService._stream(messages, user_id, weight):
+            parts.append(delta)
+            yield delta
+        
+        ai_response = "".join(parts)
+        if response_cache.is_shareable(message_history):
+            await response_cache.set(cache_key, ai_response, (time.perf_counter() - started) * 1000)
+        await OpenAIService._save_message_to_history(user_id, user_message, ai_response)
+    
+    @staticmethod
+    async def _get_message_history(user_id: int) -> List[Dict[str, str]]:
+        """Получение истории сообщений пользователя в пределах бюджета токенов"""
+        complete = OpenAIService._complete if OpenAIService.is_configured() else None
+        return await context_builder.build(user_id, complete)
+    
+    @staticmethod
+    async def save_to_history(user_id: int, message: str, response: str) -> None:
+        """Сохранение ответа, полученного без OpenAI (FAQ), чтобы он был в контексте диалога"""
+        await OpenAIService._save_message_to_history(user_id, message, response)
     
     @staticmethod
     async def _save_message_to_history(user_id: int, message: str, response: str) -> None:
@@ -77,45 +413,40 @@ class OpenAIService:
                 VALUES (?, ?, ?)
             """, (user_id, message, response))
             
-            # Удаляем старые сообщения (оставляем только последние 20 записей)
+            # Удаляем старые сообщения, уже свернутые в резюме (последние записи оставляем)
             await db.execute("""
                 DELETE FROM chat_history 
-                WHERE user_id = ? AND id NOT IN (
+                WHERE user_id = ? 
+                AND id <= COALESCE((SELECT summarized_upto FROM chat_summaries WHERE user_id = ?), 0)
+                AND id NOT IN (
                     SELECT id FROM chat_history 
                     WHERE user_id = ? 
-                    ORDER BY timestamp DESC 
-                    LIMIT 20
+                    ORDER BY id DESC 
+                    LIMIT ?
                 )
-            """, (user_id, user_id))
+            """, (user_id, user_id, user_id, config.current.chat_history_keep))
             
+            # Жесткий предел записей пользователя - и без резюме (режим разработки, сбой LLM).
+            # Удаленное остается в поиске по переписке (chat_search)
+            await db.execute("""
+                DELETE FROM chat_history
+                WHERE user_id = ?
+                AND id <= COALESCE((
+                    SELECT id FROM chat_history
+                    WHERE user_id = ?
+                    ORDER BY id DESC
+                    LIMIT 1 OFFSET ?
+                ), 0)
+            """, (user_id, user_id, config.current.chat_history_max_rows))
+        
         except Exception as e:
             print(f"❌ Ошибка сохранения в историю: {e}")
     
-    @staticmethod
-    async def setup_real_openai_integration():
-        """Настройка реальной интеграции с OpenAI (для будущего использования)"""
-        # TODO: Раскомментировать когда будет готов API ключ
-        
-        # import openai
-        # from openai import OpenAI
-        
-        # api_key = config.get('OPENAI_API_KEY')
-        # client = OpenAI(api_key=api_key)
-        
-        # system_message = config.get('OPENAI_SYSTEM_MESSAGE', 'Ты полезный ассистент.')
-        
-        # # Пример запроса к OpenAI
-        # response = await client.chat.completions.create(
-        #     model="gpt-3.5-turbo",  # ИЛИ ЗАМЕНИ НА НУЖНУЮ МОДЕЛЬ
-        #     messages=[
-        #         {"role": "system", "content": system_message},
-        #         *message_history,
-        #         {"role": "user", "content": user_message}
-        #     ],
-        #     max_tokens=1000,
-        #     temperature=0.7
-        # )
-        
-        # return response.choices[0].message.content
-        
-        pass
\ No newline at end of file
+    @classmethod
+    async def close(cls) -> None:
+        """Закрытие общего клиента и его пула соединений (и замененных, которые еще закрываются)"""
+        if cls._client is not None:
+            await cls._client.close()
+            cls._client = None
+        if cls._close_tasks:
+            await asyncio.gather(*cls._close_tasks, return_exceptions=True)
\ No newline at end of file
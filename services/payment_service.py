@@ -1,27 +1,53 @@
 import hashlib
 import json
 import aiohttp
-from typing import Optional
+from typing import Optional, Dict, Any
 from utils.config_loader import config
+from services.http_client import HTTPClient, http_client
 
 class PaymentService:
     """Сервис для работы с CloudPayments"""
     
+    # Общий HTTP клиент с пулом соединений (передается из main.py)
+    _http: HTTPClient = http_client
+    
+    @classmethod
+    def use_http_client(cls, client: HTTPClient) -> None:
+        """Подключение общего HTTP клиента приложения"""
+        cls._http = client
+    
+    @staticmethod
+    def _auth() -> aiohttp.BasicAuth:
+        settings = config.current
+        return aiohttp.BasicAuth(settings.cloudpayments_public_id, settings.cloudpayments_api_secret)
+    
+    @classmethod
+    async def find_payment(cls, payment_id: str) -> Optional[Dict[str, Any]]:
+        """Поиск платежа в CloudPayments по InvoiceId. None - провайдер о платеже не знает"""
+        session = await cls._http.session()
+        url = f"{config.current.cloudpayments_api_url.rstrip('/')}/v2/payments/find"
+        async with session.post(url, json={"InvoiceId": payment_id}, auth=cls._auth()) as response:
+            response.raise_for_status()
+            data = await response.json()
+        if not data.get('Success'):
+            return None
+        return data.get('Model')
+    
     @staticmethod
     async def create_payment(amount: float, description: str, payment_id: str, user_id: int) -> str:
         """Создание ссылки на оплату CloudPayments"""
         
         # Получаем настройки CloudPayments
-        public_id = config.get('CLOUDPAYMENTS_PUBLIC_ID')
-        api_secret = config.get('CLOUDPAYMENTS_API_SECRET')
+        public_id = config.current.cloudpayments_public_id
+        api_secret = config.current.cloudpayments_api_secret
         
         # Проверяем режим разработки
-        dev_mode = config.get('DEV_MODE', 'FALSE').upper() == 'TRUE'
+        dev_mode = config.current.dev_mode
         
         if dev_mode:
             print(f"🧪 Режим разработки: создаем тестовую оплату")
             # В тестовом режиме используем тестовый Public ID
-            public_id = config.get('CLOUDPAYMENTS_TEST_PUBLIC_ID', public_id)
+            public_id = config.current.cloudpayments_test_public_id or public_id
         
         if not public_id or public_id in ['TEMP_PLACEHOLDER', 'YOUR_PUBLIC_ID_HERE']:
             # Возвращаем тестовую ссылку если ключи не настроены
@@ -61,7 +87,7 @@ class PaymentService:
     @staticmethod
     async def create_payment_link_simple(amount: float, description: str, payment_id: str, user_id: int) -> str:
         """Упрощенная версия создания платежа для тестов"""
-        public_id = config.get('CLOUDPAYMENTS_PUBLIC_ID', 'test_api_00000000000000000000001')
+        public_id = config.current.cloudpayments_public_id or 'test_api_00000000000000000000001'
         
         # Простая ссылка на виджет CloudPayments
         payment_url = (
@@ -78,29 +104,28 @@ class PaymentService:
         
         return payment_url
     
-    @staticmethod
-    async def test_payment_api() -> bool:
+    @classmethod
+    async def test_payment_api(cls) -> bool:
         """Тестирование API CloudPayments"""
         try:
-            public_id = config.get('CLOUDPAYMENTS_PUBLIC_ID')
-            api_secret = config.get('CLOUDPAYMENTS_API_SECRET')
+            public_id = config.current.cloudpayments_public_id
+            api_secret = config.current.cloudpayments_api_secret
             
             if not public_id or not api_secret:
                 print("⚠️ Ключи CloudPayments не настроены")
                 return False
             
-            # Тестовый запрос к API
-            test_url = "https://api.cloudpayments.ru/test"
+            # Тестовый запрос к API (через общую сессию - без нового соединения на каждый вызов)
+            test_url = f"{config.current.cloudpayments_api_url.rstrip('/')}/test"
             
-            async with aiohttp.ClientSession() as session:
-                auth = aiohttp.BasicAuth(public_id, api_secret)
-                async with session.post(test_url, auth=auth) as response:
-                    if response.status == 200:
-                        print("✅ CloudPayments API работает")
-                        return True
-                    else:
-                        print(f"❌ CloudPayments API ошибка: {response.status}")
-                        return False
+            session = await cls._http.session()
+            async with session.post(test_url, auth=cls._auth()) as response:
+                if response.status == 200:
+                    print("✅ CloudPayments API работает")
+                    return True
+                else:
+                    print(f"❌ CloudPayments API ошибка: {response.status}")
+                    return False
         
         except Exception as e:
             print(f"❌ Ошибка тестирования CloudPayments API: {e}")
@@ -110,7 +135,7 @@ class PaymentService:
     def verify_webhook_signature(data: str, signature: str) -> bool:
         """Проверка подписи веб-хука CloudPayments"""
         
-        api_secret = config.get('CLOUDPAYMENTS_API_SECRET')
+        api_secret = config.current.cloudpayments_api_secret
         if not api_secret:
             print("⚠️ API Secret для проверки подписи не найден")
             return False
@@ -0,0 +1,154 @@
+"""Сверка зависших платежей с API CloudPayments.
+
+Запуск вручную (например, за последние сутки):
+    python -m services.reconciliation --since-hours 24
+
+В обычном режиме сверка запускается из main.py каждые PAYMENT_RECONCILE_INTERVAL_MIN минут.
+"""
+import argparse
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from utils.config_loader import config
+from database.queries import PaymentQueries
+from handlers.payments import complete_payment
+from services.payment_service import PaymentService
+
+# Статусы CloudPayments, после которых платеж уже не изменится
+FAILED_STATUSES = {'Declined': 'declined', 'Cancelled': 'cancelled'}
+
+@dataclass
+class ReconcileReport:
+    checked: int = 0
+    completed: int = 0
+    failed: int = 0
+    expired: int = 0
+    still_pending: int = 0
+    errors: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    
+    def __str__(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (f"🧾 Сверка платежей: проверено {self.checked} за {elapsed:.1f} с, "
+                f"оплачено {self.completed}, отклонено {self.failed}, истекло {self.expired}, "
+                f"в ожидании {self.still_pending}, ошибок {self.errors}")
+
+class PaymentReconciler:
+    """Потоковая сверка pending-платежей: пачки из БД, ограниченное число запросов через общую сессию"""
+    
+    def __init__(self, bot=None, concurrency: Optional[int] = None, batch_size: int = 200):
+        self.bot = bot
+        self.concurrency = concurrency or config.current.payment_reconcile_concurrency
+        self.batch_size = batch_size
+    
+    @staticmethod
+    def _timestamp(moment: datetime) -> str:
+        # Формат CURRENT_TIMESTAMP в SQLite (UTC)
+        return moment.strftime('%Y-%m-%d %H:%M:%S')
+    
+    async def run(self, since_hours: Optional[float] = None) -> ReconcileReport:
+        settings = config.current
+        now = datetime.now(timezone.utc)
+        # Совсем свежие платежи не трогаем - пользователь может быть еще на странице оплаты
+        created_before = self._timestamp(now - timedelta(minutes=settings.payment_reconcile_min_age_min))
+        created_after = self._timestamp(now - timedelta(hours=since_hours)) if since_hours else ''
+        expire_before = self._timestamp(now - timedelta(hours=settings.payment_reconcile_expire_hours))
+        
+        report = ReconcileReport()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        
+        # Запросы идут через общий HTTP клиент PaymentService, число одновременных - по числу воркеров
+        workers = [
+            asyncio.create_task(self._worker(queue, report, expire_before))
+            for _ in range(self.concurrency)
+        ]
+        try:
+            last_id = ''
+            while True:
+                batch = await PaymentQueries.get_pending_payments(
+                    last_id, created_after, created_before, self.batch_size
+                )
+                for payment in batch:
+                    await queue.put(payment)
+                if len(batch) < self.batch_size:
+                    break
+                last_id = batch[-1]['payment_id']
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        
+        print(report)
+        return report
+    
+    async def _worker(self, queue: asyncio.Queue, report: ReconcileReport, expire_before: str) -> None:
+        while True:
+            payment = await queue.get()
+            try:
+                await self._reconcile(payment, report, expire_before)
+            except Exception as e:
+                report.errors += 1
+                print(f"❌ Ошибка сверки платежа {payment['payment_id']}: {e}")
+            finally:
+                report.checked += 1
+                queue.task_done()
+    
+    async def _reconcile(self, payment: Dict[str, Any], report: ReconcileReport, expire_before: str) -> None:
+        payment_id = payment['payment_id']
+        model = await PaymentService.find_payment(payment_id)
+        status = model.get('Status') if model else None
+        
+        if status == 'Completed':
+            # Повторно проведенный (например, веб-хуком) платеж complete_payment пропустит
+            if await complete_payment(payment_id, float(model.get('Amount', payment['amount'])), bot=self.bot):
+                print(f"🧾 Платеж {payment_id} подтвержден сверкой и проведен")
+                report.completed += 1
+        elif status in FAILED_STATUSES:
+            if await PaymentQueries.claim_pending_payment(payment_id, FAILED_STATUSES[status]):
+                report.failed += 1
+        elif model is None and payment['payment_date'] < expire_before:
+            if await PaymentQueries.claim_pending_payment(payment_id, 'expired'):
+                report.expired += 1
+        else:
+            report.still_pending += 1
+
+async def reconcile_periodically(bot) -> None:
+    """Фоновая сверка платежей (интервал читается из текущих настроек)"""
+    while True:
+        interval = config.current.payment_reconcile_interval_min
+        if interval <= 0:
+            # Сверка выключена - проверяем настройку раз в минуту
+            await asyncio.sleep(60)
+            continue
+        await asyncio.sleep(interval * 60)
+        try:
+            await PaymentReconciler(bot).run(since_hours=config.current.payment_reconcile_expire_hours * 2)
+        except Exception as e:
+            print(f"❌ Ошибка сверки платежей: {e}")
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Сверка зависших платежей с CloudPayments")
+    parser.add_argument('--since-hours', type=float, default=24.0, help="глубина сверки, часы (0 - все)")
+    parser.add_argument('--concurrency', type=int, default=0, help="одновременных запросов к API")
+    parser.add_argument('--batch-size', type=int, default=200)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    async def main():
+        from database.connection import db
+        from services.http_client import http_client
+        
+        args = parse_args()
+        await db.connect()
+        try:
+            reconciler = PaymentReconciler(concurrency=args.concurrency or None, batch_size=args.batch_size)
+            await reconciler.run(since_hours=args.since_hours or None)
+        finally:
+            await http_client.close()
+            await db.disconnect()
+    
+    asyncio.run(main())
\ No newline at end of file
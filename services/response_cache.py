@@ -0,0 +1,174 @@
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+from utils.config_loader import config
+from database.connection import db
+from services.lesson_store import lesson_store
+
+class ResponseCache:
+    """Кэш ответов LLM: LRU в памяти + таблица llm_cache в SQLite с TTL"""
+    
+    _PUNCT_RE = re.compile(r"[^\w\s]+")
+    _SPACE_RE = re.compile(r"\s+")
+    
+    def __init__(self):
+        # key -> (ответ, время создания, время генерации в мс)
+        self.memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self._writes = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return config.current.llm_cache_enabled
+    
+    @property
+    def ttl(self) -> float:
+        return config.current.llm_cache_ttl_hours * 3600
+    
+    @classmethod
+    def normalize(cls, text: str) -> str:
+        """Нормализация вопроса: регистр, ё, пунктуация, пробелы"""
+        text = text.lower().replace('ё', 'е')
+        text = cls._PUNCT_RE.sub(' ', text)
+        return cls._SPACE_RE.sub(' ', text).strip()
+    
+    def _context(self, history: List[Dict[str, str]]) -> List[List[str]]:
+        """Часть истории, входящая в ключ: вся (LLM_CACHE_USE_CONTEXT) или последние
+        LLM_CACHE_CONTEXT_TURNS реплик без резюме, нормализованные"""
+        if config.current.llm_cache_use_context:
+            return [[item['role'], item['content']] for item in history]
+        turns = config.current.llm_cache_context_turns
+        if turns <= 0:
+            return []
+        dialog = [item for item in history if item['role'] != 'system']
+        # Реплика - вопрос пользователя и ответ на него; окно начинается с вопроса
+        starts = [index for index, item in enumerate(dialog) if item['role'] == 'user']
+        window = dialog[starts[-turns]:] if len(starts) > turns else dialog
+        return [[item['role'], self.normalize(item['content'])] for item in window]
+    
+    def make_key(self, user_message: str, history: Optional[List[Dict[str, str]]] = None,
+                 course_context: Optional[str] = None) -> Optional[str]:
+        """Ключ кэша или None, если сообщение не стоит кэшировать
+        
+        В ключ входят модель и параметры генерации, системное сообщение, фрагменты материалов курса,
+        версия уроков, вопрос и последние реплики диалога (вся история - с LLM_CACHE_USE_CONTEXT).
+        """
+        settings = config.current
+        if not self.enabled:
+            return None
+        
+        normalized = self.normalize(user_message)
+        # Короткие реплики ("а дальше?", "да") зависят от контекста - их не кэшируем
+        if len(normalized) < settings.llm_cache_min_chars:
+            return None
+        
+        parts = [settings.openai_model, str(settings.openai_temperature), str(settings.openai_max_tokens),
+                 settings.openai_system_message, course_context or "", lesson_store.signature, normalized,
+                 json.dumps(self._context(history or []), ensure_ascii=False)]
+        return hashlib.sha256("\x00".join(parts).encode('utf-8')).hexdigest()
+    
+    def is_shareable(self, history: Optional[List[Dict[str, str]]]) -> bool:
+        """Можно ли сохранить ответ, полученный с этой историей, для других пользователей
+        
+        Только если вся история вошла в ключ: резюме и реплики старше окна личные, ответ мог их учесть.
+        """
+        history = history or []
+        if config.current.llm_cache_use_context:
+            return True
+        return len(self._context(history)) == len(history)
+    
+    async def get(self, key: Optional[str]) -> Optional[str]:
+        """Поиск ответа сначала в памяти, затем в SQLite"""
+        if key is None:
+            return None
+        
+        now = time.time()
+        entry = self.memory.get(key)
+        if entry is not None and now - entry[1] < self.ttl:
+            self.memory.move_to_end(key)
+            return self._hit(entry)
+        
+        try:
+            row = await db.fetchone("""
+                SELECT response, created_at, gen_ms FROM llm_cache
+                WHERE cache_key = ? AND created_at > ?
+            """, (key, now - self.ttl))
+        except Exception as e:
+            print(f"❌ Ошибка чтения кэша ответов: {e}")
+            row = None
+        
+        if row is None:
+            self.misses += 1
+            self.memory.pop(key, None)
+            return None
+        
+        entry = (row[0], row[1], row[2])
+        self._remember(key, entry)
+        try:
+            await db.execute("""
+                UPDATE llm_cache SET hits = hits + 1, last_hit = ? WHERE cache_key = ?
+            """, (now, key))
+        except Exception as e:
+            print(f"❌ Ошибка обновления кэша ответов: {e}")
+        return self._hit(entry)
+    
+    async def set(self, key: Optional[str], response: str, gen_ms: float) -> None:
+        """Сохранение ответа в оба уровня кэша"""
+        if key is None or not response:
+            return
+        
+        now = time.time()
+        self._remember(key, (response, now, gen_ms))
+        try:
+            await db.execute("""
+                INSERT OR REPLACE INTO llm_cache (cache_key, response, created_at, last_hit, hits, gen_ms)
+                VALUES (?, ?, ?, ?, 0, ?)
+            """, (key, response, now, now, gen_ms))
+            
+            # Чистку выполняем не на каждой записи, а периодически
+            self._writes += 1
+            if self._writes % 50 == 0:
+                await self.evict()
+        except Exception as e:
+            print(f"❌ Ошибка записи в кэш ответов: {e}")
+    
+    async def evict(self) -> None:
+        """Удаление просроченных записей и ограничение размера таблицы"""
+        await db.execute("DELETE FROM llm_cache WHERE created_at <= ?", (time.time() - self.ttl,))
+        await db.execute("""
+            DELETE FROM llm_cache WHERE cache_key IN (
+                SELECT cache_key FROM llm_cache
+                ORDER BY last_hit DESC
+                LIMIT -1 OFFSET ?
+            )
+        """, (config.current.llm_cache_max_rows,))
+    
+    def _remember(self, key: str, entry: tuple) -> None:
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > config.current.llm_cache_memory_size:
+            self.memory.popitem(last=False)
+    
+    def _hit(self, entry: tuple) -> str:
+        self.hits += 1
+        self.saved_ms += entry[2] or 0.0
+        return entry[0]
+    
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+    
+    def report(self) -> str:
+        """Краткая статистика работы кэша"""
+        return (f"💾 Кэш ответов: попаданий {self.hits}, промахов {self.misses}, "
+                f"доля попаданий {self.hit_ratio:.0%}, сэкономлено {self.saved_ms / 1000:.1f} с генерации")
+
+# Глобальный экземпляр кэша ответов
+response_cache = ResponseCache()
\ No newline at end of file
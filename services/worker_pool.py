@@ -0,0 +1,308 @@
+import asyncio
+import bisect
+import hashlib
+import multiprocessing
+import queue
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from utils.config_loader import config
+
+# Пауза перед перезапуском упавшего воркера, секунды
+RESTART_DELAY = 1.0
+
+# Команда воркеру в очереди апдейтов: сбросить кэш состояний FSM (пользователи переехали)
+FSM_RESET = 'fsm_reset'
+
+def update_user_id(update: Dict[str, Any]) -> int:
+    """user_id отправителя апдейта (0 - апдейт без пользователя)"""
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        sender = value.get('from') or value.get('user')
+        if isinstance(sender, dict) and 'id' in sender:
+            return sender['id']
+        chat = value.get('chat')
+        if isinstance(chat, dict) and 'id' in chat:
+            return chat['id']
+    return 0
+
+class HashRing:
+    """Консистентное хеширование: при выпадении воркера переезжают только его пользователи"""
+    
+    def __init__(self, replicas: int = 64):
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: Dict[int, int] = {}
+    
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+    
+    def add(self, node: int) -> None:
+        for replica in range(self.replicas):
+            point = self._hash(f"worker-{node}-{replica}")
+            self._owners[point] = node
+            bisect.insort(self._points, point)
+    
+    def remove(self, node: int) -> None:
+        self._points = [point for point in self._points if self._owners[point] != node]
+        self._owners = {point: owner for point, owner in self._owners.items() if owner != node}
+    
+    def get(self, key: int) -> Optional[int]:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, self._hash(str(key))) % len(self._points)
+        return self._owners[self._points[index]]
+    
+    @property
+    def nodes(self) -> set:
+        return set(self._owners.values())
+
+class WorkerPool:
+    """Фронт-процесс: раздает апдейты воркерам по user_id с сохранением порядка для пользователя"""
+    
+    def __init__(self, size: int):
+        self.size = size
+        self.ring = HashRing()
+        self._context = multiprocessing.get_context('spawn')
+        self._events = self._context.Queue()
+        self._queues: Dict[int, Any] = {}
+        self._processes: Dict[int, Any] = {}
+        # Пользователь -> (воркер, необработанных апдейтов). Пока очередь не пуста,
+        # апдейты идут тому же воркеру, даже если кольцо уже перестроено
+        self._inflight: Dict[int, Tuple[int, int]] = {}
+        self._stopping = False
+        self.dispatched = 0
+        self.rerouted = 0
+        self.restarts = 0
+    
+    def start(self) -> None:
+        for index in range(self.size):
+            self._spawn(index)
+        print(f"🧩 Запущено воркеров: {self.size}")
+    
+    def _spawn(self, index: int) -> None:
+        updates = self._context.Queue()
+        process = self._context.Process(
+            target=worker_main, args=(index, updates, self._events),
+            name=f"bot-worker-{index}", daemon=True
+        )
+        process.start()
+        self._queues[index] = updates
+        self._processes[index] = process
+        self.ring.add(index)
+    
+    def dispatch(self, update: Dict[str, Any]) -> None:
+        """Передача сырого апдейта воркеру пользователя"""
+        user_id = update_user_id(update)
+        worker, pending = self._inflight.get(user_id, (None, 0))
+        if worker is None:
+            worker = self.ring.get(user_id)
+        self._queues[worker].put(update)
+        self._inflight[user_id] = (worker, pending + 1)
+        self.dispatched += 1
+    
+    def _on_done(self, worker: int, user_id: int) -> None:
+        current, pending = self._inflight.get(user_id, (None, 0))
+        # Подтверждение от уже перезапущенного воркера не относится к текущей очереди
+        if current != worker:
+            return
+        if pending <= 1:
+            self._inflight.pop(user_id, None)
+        else:
+            self._inflight[user_id] = (worker, pending - 1)
+    
+    async def _read_events(self) -> None:
+        while True:
+            event = await asyncio.to_thread(self._events.get)
+            if event is None:
+                return
+            kind, worker, user_id = event
+            if kind == 'done':
+                self._on_done(worker, user_id)
+    
+    def _rebalance(self, index: int) -> None:
+        """Перераспределение очереди упавшего воркера по оставшимся"""
+        self.ring.remove(index)
+        dead_queue = self._queues.pop(index)
+        
+        # Пользователи упавшего воркера переезжают к оставшимся: у тех могли остаться их состояния
+        # FSM с прошлого переезда. Команда идет в очередь раньше перенаправленных апдейтов
+        for updates in self._queues.values():
+            updates.put(FSM_RESET)
+        self._inflight = {
+            user_id: entry for user_id, entry in self._inflight.items() if entry[0] != index
+        }
+        
+        # Апдейт, который воркер обрабатывал в момент падения, теряется; ожидавшие в очереди - нет
+        moved = 0
+        while True:
+            try:
+                update = dead_queue.get(timeout=0.1)
+            except queue.Empty:
+                break
+            if update is None or update == FSM_RESET:
+                continue
+            if self.ring.nodes:
+                self.dispatch(update)
+                moved += 1
+        self.rerouted += moved
+        print(f"⚠️ Воркер {index} остановился, его апдейты ({moved}) переданы другим воркерам")
+    
+    async def _monitor(self) -> None:
+        while not self._stopping:
+            await asyncio.sleep(RESTART_DELAY)
+            for index, process in list(self._processes.items()):
+                if process.is_alive() or self._stopping:
+                    continue
+                self._rebalance(index)
+                self._spawn(index)
+                self.restarts += 1
+                print(f"🔁 Воркер {index} перезапущен (код выхода {process.exitcode})")
+    
+    async def run(self, source) -> None:
+        """Запуск пула и источника апдейтов до отмены"""
+        self.start()
+        tasks = [
+            asyncio.create_task(self._read_events()),
+            asyncio.create_task(self._monitor())
+        ]
+        try:
+            await source(self)
+        finally:
+            await self.stop()
+            for task in tasks:
+                task.cancel()
+    
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Мягкая остановка: воркеры дорабатывают свои очереди"""
+        self._stopping = True
+        for updates in self._queues.values():
+            updates.put(None)
+        
+        deadline = time.monotonic() + timeout
+        for process in self._processes.values():
+            await asyncio.to_thread(process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        self._events.put(None)
+        print(self.report())
+    
+    def report(self) -> str:
+        return (f"🧩 Воркеры: {self.size}, апдейтов роздано: {self.dispatched}, "
+                f"перераспределено: {self.rerouted}, перезапусков: {self.restarts}")
+
+async def poll_updates(bot, pool: WorkerPool) -> None:
+    """Источник апдейтов: long polling"""
+    await bot.delete_webhook(drop_pending_updates=False)
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=30)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Ошибка получения апдейтов: {e}")
+            await asyncio.sleep(RESTART_DELAY)
+            continue
+        
+        for update in updates:
+            pool.dispatch(update.model_dump(mode='json', by_alias=True, exclude_none=True))
+            offset = update.update_id + 1
+
+async def serve_webhook(bot, pool: WorkerPool) -> None:
+    """Источник апдейтов: веб-хук Telegram (тело запроса передается воркеру без разбора моделей)"""
+    from aiohttp import web
+    
+    settings = config.current
+    path = urlparse(settings.telegram_webhook_url).path or '/'
+    secret = settings.telegram_webhook_secret
+    
+    async def handle(request: web.Request) -> web.Response:
+        if secret and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret:
+            return web.Response(status=401)
+        pool.dispatch(await request.json())
+        return web.Response(text="OK")
+    
+    app = web.Application()
+    app.router.add_post(path, handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.telegram_webhook_host, settings.telegram_webhook_port)
+    await site.start()
+    await bot.set_webhook(settings.telegram_webhook_url, secret_token=secret or None)
+    print(f"🌐 Веб-хук Telegram: {settings.telegram_webhook_url} (порт {settings.telegram_webhook_port})")
+    
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+async def run_sharded(bot, size: int) -> None:
+    """Режим нескольких процессов: этот процесс только принимает апдейты"""
+    pool = WorkerPool(size)
+    if config.current.telegram_webhook_url:
+        await pool.run(lambda pool: serve_webhook(bot, pool))
+    else:
+        await pool.run(lambda pool: poll_updates(bot, pool))
+
+def worker_main(index: int, updates, events) -> None:
+    """Точка входа процесса-воркера"""
+    try:
+        asyncio.run(_worker_loop(index, updates, events))
+    except KeyboardInterrupt:
+        pass
+
+async def _worker_loop(index: int, updates, events) -> None:
+    import main
+    from database.connection import db
+    from services.openai_service import OpenAIService
+    from services.http_client import http_client
+    from services.payment_service import PaymentService
+    
+    bot = main.create_bot()
+    dp = main.create_dispatcher()
+    await db.connect()
+    await http_client.start()
+    PaymentService.use_http_client(http_client)
+    config_watcher = asyncio.create_task(config.watch())
+    
+    # Апдейты разных пользователей обрабатываются параллельно, одного пользователя - по очереди
+    chains: Dict[int, asyncio.Task] = {}
+    
+    async def handle(update: Dict[str, Any], user_id: int, previous: Optional[asyncio.Task]) -> None:
+        if previous is not None:
+            await asyncio.wait({previous})
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception as e:
+            print(f"❌ Воркер {index}: ошибка обработки апдейта: {e}")
+        finally:
+            events.put(('done', index, user_id))
+            if chains.get(user_id) is asyncio.current_task():
+                chains.pop(user_id, None)
+    
+    print(f"✅ Воркер {index} готов")
+    try:
+        while True:
+            update = await asyncio.to_thread(updates.get)
+            if update is None:
+                break
+            if update == FSM_RESET:
+                dp.fsm.storage.forget_all()
+                continue
+            user_id = update_user_id(update)
+            chains[user_id] = asyncio.create_task(handle(update, user_id, chains.get(user_id)))
+        
+        # Дорабатываем начатое перед выходом
+        if chains:
+            await asyncio.wait(set(chains.values()))
+    finally:
+        config_watcher.cancel()
+        await OpenAIService.close()
+        await http_client.close()
+        print(f"Воркер {index}: {main.send_scheduler.report()}")
+        await db.disconnect()
+        await bot.session.close()
\ No newline at end of file
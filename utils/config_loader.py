@@ -1,32 +1,275 @@
+import asyncio
 import os
-from typing import Dict, Any
+from dataclasses import dataclass, fields
+from typing import Dict, Any, Callable, List, Tuple
+
+def parse_rate(spec: str) -> Tuple[float, float]:
+    """Разбор лимита 'N/S' (N запросов за S секунд) в (емкость, пополнение в секунду)"""
+    count, _, seconds = spec.partition('/')
+    capacity, period = float(count), float(seconds or 1)
+    if capacity <= 0 or period <= 0:
+        raise ValueError("ожидается N/S с положительными N и S")
+    return capacity, capacity / period
+
+@dataclass(frozen=True)
+class Settings:
+    """Типизированный неизменяемый снимок настроек (разбирается один раз при загрузке)"""
+    
+    telegram_bot_token: str = ''
+    bot_username: str = 'your_bot_username'
+    dev_mode: bool = False
+    config_watch_interval: float = 5.0
+    
+    # Многопроцессный режим и веб-хук Telegram
+    worker_processes: int = 0
+    telegram_webhook_url: str = ''
+    telegram_webhook_secret: str = ''
+    telegram_webhook_host: str = '0.0.0.0'
+    telegram_webhook_port: int = 8080
+    
+    # Тарифы и реферальная программа
+    tariff_1_price: int = 0
+    tariff_2_price: int = 0
+    referral_bonus: int = 0
+    
+    # CloudPayments
+    cloudpayments_public_id: str = ''
+    cloudpayments_api_secret: str = ''
+    cloudpayments_test_public_id: str = ''
+    cloudpayments_api_url: str = 'https://api.cloudpayments.ru'
+    webhook_url: str = ''
+    
+    # Общий HTTP клиент для внешних API (services/http_client.py)
+    http_pool_limit: int = 100
+    http_pool_limit_per_host: int = 20
+    http_dns_cache_ttl: int = 300
+    http_keepalive_timeout: float = 30.0
+    http_timeout: float = 15.0
+    
+    # Сверка зависших платежей (services/reconciliation.py)
+    payment_reconcile_interval_min: int = 30
+    payment_reconcile_concurrency: int = 10
+    payment_reconcile_min_age_min: int = 10
+    payment_reconcile_expire_hours: int = 72
+    
+    # Курс и юридическая информация
+    course_url: str = 'https://example.com/course'
+    course_name: str = 'Полный курс по нейросетям'
+    privacy_policy_url: str = 'https://example.com/privacy'
+    company_name: str = ''
+    company_inn: str = ''
+    
+    # OpenAI
+    openai_api_key: str = ''
+    openai_system_message: str = 'Ты полезный ассистент.'
+    openai_model: str = 'gpt-4o-mini'
+    openai_max_tokens: int = 1000
+    openai_temperature: float = 0.7
+    openai_base_url: str = ''
+    openai_max_concurrency: int = 8
+    openai_max_queue: int = 50
+    openai_queue_timeout: float = 5.0
+    openai_user_queue: int = 3
+    openai_tariff2_weight: float = 2.0
+    openai_timeout: float = 30.0
+    openai_max_retries: int = 1
+    openai_streaming: bool = True
+    stream_edit_interval: float = 1.0
+    openai_context_tokens: int = 2000
+    openai_summary_tokens: int = 300
+    openai_context_max_turns: int = 50
+    chat_history_keep: int = 20
+    chat_history_max_rows: int = 200
+    chat_coalesce_ms: int = 1500
+    chat_search_retention_days: int = 365
+    
+    # Поиск по материалам курса для ответов LLM (services/course_retriever.py)
+    rag_enabled: bool = True
+    rag_top_k: int = 3
+    rag_min_score: float = 0.15
+    rag_chunk_words: int = 60
+    rag_dim: int = 1024
+    rag_index_dir: str = 'cache/course_index'
+    
+    # Быстрые ответы на частые вопросы без OpenAI (services/faq.py, config/faq.txt)
+    faq_enabled: bool = True
+    faq_min_similarity: float = 0.8
+    faq_min_margin: float = 0.1
+    faq_max_chars: int = 150
+    
+    # Кэш ответов LLM
+    llm_cache_enabled: bool = True
+    llm_cache_memory_size: int = 500
+    llm_cache_max_rows: int = 5000
+    llm_cache_ttl_hours: float = 72.0
+    llm_cache_use_context: bool = False
+    llm_cache_context_turns: int = 1
+    llm_cache_min_chars: int = 12
+    
+    # Антифлуд: лимиты 'N/S' - не больше N апдейтов за S секунд (utils/throttling.py)
+    rate_limit_enabled: bool = True
+    rate_limit_default: str = '20/10'
+    rate_limit_chat: str = '10/60'
+    rate_limit_payment: str = '5/60'
+    rate_limit_referral: str = '5/60'
+    rate_limit_global: str = '100/1'
+    
+    # Исходящие запросы к Telegram: лимиты 'N/S' (utils/send_scheduler.py)
+    telegram_send_global: str = '30/1'
+    telegram_send_private_chat: str = '3/3'
+    telegram_send_group_chat: str = '20/60'
+    telegram_send_max_retries: int = 3
+    
+    # База данных
+    database_url: str = 'sqlite:///bot_database.db'
+    fsm_cache_size: int = 10000
+    db_query_stats: bool = True
+    db_slow_query_ms: float = 100.0
+    db_explain_slow: bool = True
+    
+    # Резервное копирование (database/backup.py)
+    backup_interval_hours: float = 6.0
+    backup_dir: str = 'backups'
+    backup_keep: int = 7
+    backup_pages_per_step: int = 256
+    backup_step_sleep_ms: float = 5.0
+    
+    # Аналитический снимок для отчетов (admin/analytics.py)
+    analytics_path: str = 'analytics/analytics.db'
+    analytics_refresh_min: int = 60
+    
+    # Номер версии снимка (увеличивается при каждой перезагрузке)
+    version: int = 0
+    
+    @property
+    def openai_configured(self) -> bool:
+        """Настроен ли API ключ OpenAI"""
+        return bool(self.openai_api_key) and self.openai_api_key != 'TEMP_PLACEHOLDER'
+    
+    @classmethod
+    def from_dict(cls, raw: Dict[str, str], version: int = 0) -> "Settings":
+        """Разбор и проверка строковых настроек. При ошибке - ValueError"""
+        values: Dict[str, Any] = {'version': version}
+        errors: List[str] = []
+        
+        for field in fields(cls):
+            key = field.name.upper()
+            if field.name == 'version' or not raw.get(key):
+                continue
+            value = raw[key]
+            try:
+                if field.type is bool:
+                    if value.upper() not in ('TRUE', 'FALSE'):
+                        raise ValueError("ожидается TRUE или FALSE")
+                    values[field.name] = value.upper() == 'TRUE'
+                elif field.type is int:
+                    values[field.name] = int(value)
+                elif field.type is float:
+                    values[field.name] = float(value)
+                else:
+                    values[field.name] = value
+            except ValueError as e:
+                errors.append(f"{key}={value!r}: {e}")
+        
+        settings = cls(**values)
+        for name in ('tariff_1_price', 'tariff_2_price', 'referral_bonus'):
+            if getattr(settings, name) < 0:
+                errors.append(f"{name.upper()} не может быть отрицательным")
+        if settings.worker_processes < 0:
+            errors.append("WORKER_PROCESSES не может быть отрицательным")
+        if settings.backup_pages_per_step < 1:
+            errors.append("BACKUP_PAGES_PER_STEP должен быть не меньше 1")
+        if settings.payment_reconcile_concurrency < 1:
+            errors.append("PAYMENT_RECONCILE_CONCURRENCY должен быть не меньше 1")
+        for name in ('rate_limit_default', 'rate_limit_chat', 'rate_limit_payment',
+                     'rate_limit_referral', 'rate_limit_global', 'telegram_send_global',
+                     'telegram_send_private_chat', 'telegram_send_group_chat'):
+            try:
+                parse_rate(getattr(settings, name))
+            except ValueError as e:
+                errors.append(f"{name.upper()}={getattr(settings, name)!r}: {e}")
+        if settings.openai_max_concurrency < 1:
+            errors.append("OPENAI_MAX_CONCURRENCY должен быть не меньше 1")
+        
+        if errors:
+            raise ValueError("; ".join(errors))
+        return settings
 
 class Config:
     """Класс для загрузки настроек из файла config/settings.txt"""
     
     def __init__(self):
-        self.settings = {}
+        self.config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', 'settings.txt')
+        self.settings: Dict[str, str] = {}
+        self.current = Settings()
+        self._mtime = 0.0
+        self._listeners: List[Callable[[Settings], None]] = []
         self.load_settings()
     
     def load_settings(self) -> None:
         """Загружает настройки из файла config/settings.txt"""
-        config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', 'settings.txt')
-        
+        settings = {}
         try:
-            with open(config_path, 'r', encoding='utf-8') as file:
+            mtime = os.path.getmtime(self.config_path)
+            with open(self.config_path, 'r', encoding='utf-8') as file:
                 for line in file:
                     line = line.strip()
                     # Пропускаем комментарии и пустые строки
                     if line and not line.startswith('#'):
                         if '=' in line:
                             key, value = line.split('=', 1)
-                            self.settings[key.strip()] = value.strip()
+                            settings[key.strip()] = value.strip()
         except FileNotFoundError:
-            print(f"Файл настроек не найден: {config_path}")
+            print(f"Файл настроек не найден: {self.config_path}")
             raise
         except Exception as e:
             print(f"Ошибка при чтении настроек: {e}")
             raise
+        
+        self._apply(settings)
+        self._mtime = mtime
+    
+    def _apply(self, settings: Dict[str, str]) -> None:
+        """Проверка и атомарная замена снимка настроек"""
+        snapshot = Settings.from_dict(settings, self.current.version + 1)
+        # Обе ссылки заменяются целиком - читатели видят либо старый, либо новый снимок
+        self.settings = settings
+        self.current = snapshot
+        for listener in self._listeners:
+            listener(snapshot)
+    
+    def on_reload(self, listener: Callable[[Settings], None]) -> None:
+        """Подписка на замену снимка настроек"""
+        self._listeners.append(listener)
+    
+    def override(self, values: Dict[str, str]) -> None:
+        """Подмена отдельных настроек в памяти (для тестов и нагрузочных прогонов)"""
+        self._apply({**self.settings, **values})
+    
+    def reload_if_changed(self) -> bool:
+        """Перечитывает файл, если он изменился. Ошибочный файл не заменяет рабочие настройки"""
+        try:
+            mtime = os.path.getmtime(self.config_path)
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        
+        try:
+            self.load_settings()
+        except Exception as e:
+            self._mtime = mtime
+            print(f"❌ Новые настройки не применены, работаем на прежних: {e}")
+            return False
+        
+        print(f"🔄 Настройки перезагружены (версия {self.current.version})")
+        return True
+    
+    async def watch(self) -> None:
+        """Фоновое отслеживание изменений config/settings.txt"""
+        while True:
+            await asyncio.sleep(self.current.config_watch_interval)
+            self.reload_if_changed()
     
     def get(self, key: str, default: Any = None) -> str:
         """Получает значение настройки по ключу"""
@@ -0,0 +1,80 @@
+import json
+from collections import OrderedDict
+from dataclasses import astuple
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+
+from database.connection import db
+from utils.config_loader import config
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM: чтение из памяти, запись в SQLite (состояние переживает перезапуск)
+    
+    Записи пользователей кэшируются в памяти (LRU на FSM_CACHE_SIZE записей), при промахе
+    читаются из базы. Запись идет сразу в базу, поэтому база всегда актуальна.
+    В многопроцессном режиме пользователь может переехать в другой воркер при падении своего -
+    тогда фронт-процесс просит воркеры сбросить кэш (forget_all), чтобы не отдать устаревшее состояние.
+    """
+    
+    def __init__(self):
+        self._records: "OrderedDict[str, Tuple[Optional[str], Dict[str, Any]]]" = OrderedDict()
+    
+    def _remember(self, key: str, record: Tuple[Optional[str], Dict[str, Any]]) -> None:
+        self._records[key] = record
+        self._records.move_to_end(key)
+        while len(self._records) > config.current.fsm_cache_size:
+            self._records.popitem(last=False)
+    
+    def forget_all(self) -> None:
+        """Сброс кэша: следующие чтения пойдут в базу"""
+        self._records.clear()
+    
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ":".join("" if part is None else str(part) for part in astuple(key))
+    
+    async def _load(self, key: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        record = self._records.get(key)
+        if record is None:
+            row = await db.fetchone("SELECT state, data FROM fsm_states WHERE storage_key = ?", (key,))
+            record = (row[0], json.loads(row[1])) if row else (None, {})
+            self._remember(key, record)
+        else:
+            self._records.move_to_end(key)
+        return record
+    
+    async def _save(self, key: str, state: Optional[str], data: Dict[str, Any]) -> None:
+        self._remember(key, (state, data))
+        if state is None and not data:
+            await db.execute("DELETE FROM fsm_states WHERE storage_key = ?", (key,))
+        else:
+            await db.execute("""
+                INSERT OR REPLACE INTO fsm_states (storage_key, state, data, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            """, (key, state, json.dumps(data, ensure_ascii=False)))
+    
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        storage_key = self._key(key)
+        value = state.state if isinstance(state, State) else state
+        current, data = await self._load(storage_key)
+        if value != current:
+            await self._save(storage_key, value, data)
+    
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self._key(key))
+        return state
+    
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self._key(key)
+        state, current = await self._load(storage_key)
+        if data != current:
+            await self._save(storage_key, state, dict(data))
+    
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self._key(key))
+        return dict(data)
+    
+    async def close(self) -> None:
+        self._records.clear()
\ No newline at end of file
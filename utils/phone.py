@@ -0,0 +1,41 @@
+import re
+from typing import Optional
+
+_NON_DIGITS = re.compile(r'\D')
+_PHONE_CHARS = re.compile(r'\+?[\d\s\-().]+')
+
+def normalize_phone(raw: Optional[str]) -> Optional[str]:
+    """Приведение введенного вручную номера к E.164 (+79123456789). None - если это не номер телефона
+    
+    Номер без + разбирается по российским правилам (8XXXXXXXXXX, 9XXXXXXXXX).
+    Для номеров из контакта Telegram - normalize_contact_phone.
+    """
+    if not raw:
+        return None
+    raw = raw.strip()
+    if not _PHONE_CHARS.fullmatch(raw):
+        return None
+    digits = _NON_DIGITS.sub('', raw)
+    
+    # Российские форматы без кода страны: 8XXXXXXXXXX и 9XXXXXXXXX
+    if not raw.startswith('+'):
+        if len(digits) == 11 and digits.startswith('8'):
+            digits = '7' + digits[1:]
+        elif len(digits) == 10 and digits.startswith('9'):
+            digits = '7' + digits
+    
+    if not 10 <= len(digits) <= 15 or digits.startswith('0'):
+        return None
+    return '+' + digits
+
+def normalize_contact_phone(raw: Optional[str]) -> Optional[str]:
+    """Номер из контакта Telegram: всегда с кодом страны, но часто без + (84912345678 - Вьетнам)"""
+    if not raw:
+        return None
+    raw = raw.strip()
+    return normalize_phone(raw if raw.startswith('+') else '+' + raw)
+
+def phone_key(raw: Optional[str]) -> Optional[int]:
+    """Целочисленный ключ номера для индекса (цифры E.164 без +)"""
+    phone = normalize_phone(raw)
+    return int(phone[1:]) if phone else None
\ No newline at end of file
@@ -0,0 +1,204 @@
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from utils.config_loader import config, Settings
+
+Screen = Tuple[str, InlineKeyboardMarkup]
+
+def _keyboard(*rows: InlineKeyboardButton) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[button] for button in rows])
+
+MAIN_MENU_BUTTON = InlineKeyboardButton(text="🏠 В главное меню", callback_data="main_menu")
+
+class ScreenSet:
+    """Заранее собранные тексты и клавиатуры экранов для одного снимка настроек"""
+    
+    def __init__(self, settings: Settings):
+        self.version = settings.version
+        self.bot_username = settings.bot_username
+        
+        # Главное меню
+        self.menu_active_tail = "Теперь вы можете задавать мне любые вопросы! 💬"
+        self.menu_active_keyboard = _keyboard(
+            InlineKeyboardButton(text="👤 Мой профиль", callback_data="profile"),
+            InlineKeyboardButton(text="👥 Реферальная программа", callback_data="referral"),
+            InlineKeyboardButton(text="📚 Купить курс", callback_data="buy_course")
+        )
+        
+        self.menu_inactive_tail = (
+            "Для использования бота необходимо оформить подписку.\n\n"
+            "📦 Доступные тарифы:\n"
+            f"• Тариф 1 - {settings.tariff_1_price}₽ (базовый доступ)\n"
+            f"• Тариф 2 - {settings.tariff_2_price}₽ (доступ + материалы курса)"
+        )
+        self.menu_inactive_keyboard = _keyboard(
+            InlineKeyboardButton(text="💳 Тариф 1", callback_data="buy_tariff_1"),
+            InlineKeyboardButton(text="💎 Тариф 2", callback_data="buy_tariff_2"),
+            InlineKeyboardButton(text="📚 Купить курс", callback_data="buy_course"),
+            InlineKeyboardButton(text="👤 Профиль", callback_data="profile"),
+            InlineKeyboardButton(text="👥 Реферальная программа", callback_data="referral")
+        )
+        
+        # Информация о курсе - экран полностью статичен
+        self.course = (
+            f"📚 <b>{settings.course_name}</b>\n\n"
+            "🎯 <b>Что вы получите:</b>\n"
+            "• 20+ часов обучающего контента\n"
+            "• Практические задания и кейсы\n"
+            "• Доступ к закрытому сообществу\n"
+            "• Сертификат о прохождении\n"
+            "• Пожизненный доступ к материалам\n\n"
+            "💡 <b>Для кого курс:</b>\n"
+            "• Новичков в области ИИ\n"
+            "• Предпринимателей и маркетологов\n"
+            "• Всех, кто хочет освоить нейросети\n\n"
+            "🚀 <b>После курса вы сможете:</b>\n"
+            "• Эффективно работать с ChatGPT и другими ИИ\n"
+            "• Автоматизировать рутинные задачи\n"
+            "• Создавать контент с помощью ИИ\n"
+            "• Интегрировать ИИ в свой бизнес\n\n"
+            "💰 <b>Покупка и доступ:</b>\n"
+            "• Оформление курса происходит на сайте\n"
+            "• После покупки вам будет предоставлен доступ к боту\n"
+            "• Указывайте тот же номер телефона, что и в Telegram",
+            _keyboard(
+                InlineKeyboardButton(text="🌐 Купить курс на сайте", url=settings.course_url),
+                MAIN_MENU_BUTTON
+            )
+        )
+        
+        # Тарифы
+        self.tariff_1_price = settings.tariff_1_price
+        self.tariff_2_price = settings.tariff_2_price
+        self.tariffs_plain = (
+            "📦 <b>Доступные тарифы</b>\n\n"
+            f"💳 <b>Тариф 1</b> - {settings.tariff_1_price}₽\n"
+            "• Доступ к боту на 30 дней\n\n"
+            f"💎 <b>Тариф 2</b> - {settings.tariff_2_price}₽\n"
+            "• Доступ к боту на 30 дней\n"
+            "• Материалы курса после каждой оплаты\n"
+        )
+        self.tariffs_keyboard = _keyboard(
+            InlineKeyboardButton(text="💳 Купить Тариф 1", callback_data="buy_tariff_1"),
+            InlineKeyboardButton(text="💎 Купить Тариф 2", callback_data="buy_tariff_2"),
+            MAIN_MENU_BUTTON
+        )
+        
+        # Реферальная программа
+        self.referral_unavailable = (
+            "❌ <b>Реферальная программа недоступна</b>\n\n"
+            "Для участия в реферальной программе необходимо хотя бы один раз оплатить подписку.",
+            _keyboard(
+                InlineKeyboardButton(text="💳 Оплатить подписку", callback_data="show_tariffs"),
+                MAIN_MENU_BUTTON
+            )
+        )
+        self.referral_rules = (
+            "🎁 <b>Как это работает:</b>\n"
+            "• Приглашайте друзей по вашей ссылке\n"
+            f"• Когда друг оплачивает подписку, вы получаете {settings.referral_bonus}₽\n"
+            "• Бонусы можно использовать как скидку при оплате\n\n"
+            "🔗 <b>Ваша реферальная ссылка:</b>\n"
+        )
+        self.referral_warning = (
+            "🚨 <b>ОЧЕНЬ ВАЖНО!</b> Скажите другу:\n"
+            "1️⃣ Перейти по ссылке\n"
+            "2️⃣ ОБЯЗАТЕЛЬНО написать /start в чате с ботом\n"
+            "3️⃣ НЕ нажимать кнопку START в профиле!\n\n"
+            "📱 <b>Если ссылка не работает:</b>\n"
+            "Друг может указать ваш номер "
+        )
+        
+        # Согласие на обработку ПД
+        self.privacy = (
+            "👋 Добро пожаловать!\n\n"
+            "📱 Для использования бота необходимо ваше согласие на обработку персональных данных и номер телефона.\n\n"
+            "🔒 <b>Зачем нужен номер телефона?</b>\n"
+            "• Привязка покупок с сайта к вашему аккаунту\n"
+            "• Восстановление доступа при смене устройства\n"
+            "• Безопасность вашего аккаунта\n\n"
+            "📋 <b>Согласие на обработку персональных данных:</b>\n"
+            "Нажимая кнопку \"Согласен\", вы даете согласие на обработку ваших персональных данных в соответствии с 152-ФЗ \"О персональных данных\".\n\n"
+            f"📄 С полной политикой конфиденциальности можно ознакомиться по ссылке: {settings.privacy_policy_url}",
+            _keyboard(
+                InlineKeyboardButton(text="✅ Согласен на обработку ПД", callback_data="agree_privacy"),
+                InlineKeyboardButton(text="❌ Не согласен", callback_data="disagree_privacy"),
+                InlineKeyboardButton(text="📄 Политика конфиденциальности", url=settings.privacy_policy_url)
+            )
+        )
+
+class Screens:
+    """Рендеринг экранов: статичные части собираются один раз на версию настроек"""
+    
+    def __init__(self):
+        self._set: Optional[ScreenSet] = None
+    
+    @property
+    def current(self) -> ScreenSet:
+        settings = config.current
+        if self._set is None or self._set.version != settings.version:
+            self._set = ScreenSet(settings)
+        return self._set
+    
+    def main_menu(self, user_data: Dict[str, Any], has_subscription: bool) -> Screen:
+        """Главное меню: подставляются только имя и дата окончания подписки"""
+        screens = self.current
+        display_name = user_data['username'] or user_data['first_name'] or "дорогой пользователь"
+        greeting = f"👋 Добро пожаловать, {display_name}!\n\n"
+        
+        if has_subscription:
+            end_date = datetime.fromisoformat(user_data['subscription_end'])
+            text = f"{greeting}✅ У вас активная подписка до {end_date.strftime('%d.%m.%Y')}\n\n{screens.menu_active_tail}"
+            return text, screens.menu_active_keyboard
+        return greeting + screens.menu_inactive_tail, screens.menu_inactive_keyboard
+    
+    def course_info(self) -> Screen:
+        return self.current.course
+    
+    def tariffs(self, referral_balance: int) -> Screen:
+        """Тарифы: без скидки - готовый текст, со скидкой - подстановка цен"""
+        screens = self.current
+        if referral_balance <= 0:
+            return screens.tariffs_plain, screens.tariffs_keyboard
+        
+        tariff1_final = max(0, screens.tariff_1_price - referral_balance)
+        tariff2_final = max(0, screens.tariff_2_price - referral_balance)
+        text = (
+            "📦 <b>Доступные тарифы</b>\n\n"
+            f"💰 Ваша скидка: {referral_balance}₽\n\n"
+            f"💳 <b>Тариф 1</b> - ~~{screens.tariff_1_price}₽~~ <b>{tariff1_final}₽</b>\n"
+            "• Доступ к боту на 30 дней\n\n"
+            f"💎 <b>Тариф 2</b> - ~~{screens.tariff_2_price}₽~~ <b>{tariff2_final}₽</b>\n"
+            "• Доступ к боту на 30 дней\n"
+            "• Материалы курса после каждой оплаты\n"
+        )
+        return text, screens.tariffs_keyboard
+    
+    def referral(self, user_data: Dict[str, Any]) -> Screen:
+        """Реферальная программа: ссылка и баланс подставляются в готовые блоки"""
+        screens = self.current
+        if not user_data['has_paid']:
+            return screens.referral_unavailable
+        
+        # Убираем + и делаем короткий параметр
+        phone = user_data['phone_number']
+        referral_link = f"https://t.me/{screens.bot_username}?start=r{phone.replace('+', '')}"
+        text = (
+            "👥 <b>Реферальная программа</b>\n\n"
+            f"💰 Ваш реферальный баланс: <b>{user_data['referral_balance']}₽</b>\n\n"
+            f"{screens.referral_rules}<code>{referral_link}</code>\n\n"
+            f"{screens.referral_warning}<code>{phone}</code> при регистрации"
+        )
+        keyboard = _keyboard(
+            InlineKeyboardButton(text="📤 Поделиться ссылкой", url=f"https://t.me/share/url?url={referral_link}"),
+            MAIN_MENU_BUTTON
+        )
+        return text, keyboard
+    
+    def privacy_request(self) -> Screen:
+        return self.current.privacy
+
+# Глобальный экземпляр рендера экранов
+screens = Screens()
\ No newline at end of file
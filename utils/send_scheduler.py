@@ -0,0 +1,230 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from utils.config_loader import config, Settings, parse_rate
+
+class Lane(IntEnum):
+    """Полосы приоритета исходящих сообщений (меньше - важнее)"""
+    INTERACTIVE = 0
+    PAYMENT = 1
+    LESSON = 2
+    BROADCAST = 3
+
+# Полоса текущей задачи: обработчики по умолчанию отвечают интерактивно
+_current_lane: ContextVar[Lane] = ContextVar("send_lane", default=Lane.INTERACTIVE)
+
+@contextmanager
+def send_lane(lane: Lane):
+    """Отправка сообщений внутри блока идет по указанной полосе"""
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+# Методы без лимитов на сообщения (действия в чате, ответы на кнопки, служебные запросы) не планируются
+SCHEDULED_PREFIXES = ('send', 'edit', 'copy', 'forward')
+UNSCHEDULED_METHODS = {'sendChatAction'}
+
+# Сколько ожидающих в каждой полосе просматривать в поисках чата, которому уже можно писать
+SCAN_DEPTH = 64
+
+# Как часто удалять лимиты простаивающих чатов, секунды
+SWEEP_INTERVAL = 60.0
+
+class SendScheduler(BaseRequestMiddleware):
+    """Общий планировщик исходящих запросов Bot API (middleware сессии бота).
+    
+    Соблюдает общий лимит бота и лимиты отдельных чатов, раздает очередь по полосам
+    строго по приоритету и выдерживает паузу RetryAfter для чата перед повтором.
+    """
+    
+    def __init__(self):
+        self._lanes: Dict[Lane, Deque[Tuple[int, asyncio.Future, float]]] = {lane: deque() for lane in Lane}
+        # chat_id -> [токены, время обновления, пауза до]
+        self._chats: Dict[int, List[float]] = {}
+        self._global: List[float] = [0.0, 0.0]
+        self._version = -1
+        self._wakeup: Optional[asyncio.Event] = None
+        self._pump: Optional[asyncio.Task] = None
+        self._last_sweep = time.monotonic()
+        self._waits: Dict[Lane, Deque[float]] = {lane: deque(maxlen=1000) for lane in Lane}
+        self.sent: Dict[Lane, int] = {lane: 0 for lane in Lane}
+        self.retry_after = 0
+    
+    def _apply_settings(self, settings: Settings) -> None:
+        capacity, rate = parse_rate(settings.telegram_send_global)
+        # В многопроцессном режиме общий лимит бота делится между процессами
+        share = 1 / (settings.worker_processes + 1) if settings.worker_processes > 0 else 1
+        self._global_limit = (max(capacity * share, 1.0), rate * share)
+        self._private_limit = parse_rate(settings.telegram_send_private_chat)
+        self._group_limit = parse_rate(settings.telegram_send_group_chat)
+        self._max_retries = settings.telegram_send_max_retries
+        self._global = [self._global_limit[0], time.monotonic()]
+        self._version = settings.version
+    
+    def _chat_limit(self, chat_id: int) -> Tuple[float, float]:
+        # Отрицательные chat_id - группы и каналы, у них лимит строже
+        return self._group_limit if chat_id < 0 else self._private_limit
+    
+    async def __call__(self, make_request, bot, method):
+        api_method = method.__api_method__
+        chat_id = getattr(method, 'chat_id', None)
+        if (not isinstance(chat_id, int) or api_method in UNSCHEDULED_METHODS
+                or not api_method.startswith(SCHEDULED_PREFIXES)):
+            return await make_request(bot, method)
+        
+        lane = _current_lane.get()
+        attempt = 0
+        while True:
+            await self.acquire(chat_id, lane)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.retry_after += 1
+                self._pause_chat(chat_id, e.retry_after)
+                attempt += 1
+                # Промежуточные правки потокового ответа не повторяем - их заменит следующая правка
+                if api_method.startswith('edit') or attempt > self._max_retries:
+                    raise
+                print(f"⏳ RetryAfter {e.retry_after} с для чата {chat_id}, повтор {attempt}")
+    
+    async def acquire(self, chat_id: int, lane: Lane) -> None:
+        """Ожидание разрешения на отправку в чат"""
+        if config.current.version != self._version:
+            self._apply_settings(config.current)
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[lane].append((chat_id, future, time.monotonic()))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        self._wakeup.set()
+        try:
+            await future
+        except asyncio.CancelledError:
+            self._discard(lane, future)
+            raise
+    
+    def _discard(self, lane: Lane, future: asyncio.Future) -> None:
+        queue = self._lanes[lane]
+        for item in queue:
+            if item[1] is future:
+                queue.remove(item)
+                break
+    
+    def _pause_chat(self, chat_id: int, seconds: float) -> None:
+        now = time.monotonic()
+        bucket = self._chats.setdefault(chat_id, [0.0, now, 0.0])
+        bucket[0] = 0.0
+        bucket[1] = now
+        bucket[2] = max(bucket[2], now + seconds)
+    
+    def _chat_ready_at(self, chat_id: int, now: float) -> float:
+        """Момент, когда в чат можно отправить следующее сообщение"""
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            return now
+        capacity, rate = self._chat_limit(chat_id)
+        tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        ready = now if tokens >= 1.0 else now + (1.0 - tokens) / rate
+        return max(ready, bucket[2])
+    
+    def _take_chat(self, chat_id: int, now: float) -> None:
+        capacity, rate = self._chat_limit(chat_id)
+        bucket = self._chats.setdefault(chat_id, [capacity, now, 0.0])
+        bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate) - 1.0
+        bucket[1] = now
+    
+    def _next_ready(self, now: float) -> Tuple[Optional[Tuple[Lane, int]], float]:
+        """Первый по приоритету ожидающий, чей чат свободен, и ближайший момент освобождения остальных"""
+        earliest = float('inf')
+        for lane, queue in self._lanes.items():
+            for index, (chat_id, future, _) in enumerate(queue):
+                if index >= SCAN_DEPTH:
+                    break
+                if future.done():
+                    continue
+                ready = self._chat_ready_at(chat_id, now)
+                if ready <= now:
+                    return (lane, index), now
+                earliest = min(earliest, ready)
+        return None, earliest
+    
+    async def _run(self) -> None:
+        """Раздача разрешений на отправку, пока есть ожидающие"""
+        while any(self._lanes.values()):
+            self._wakeup.clear()
+            now = time.monotonic()
+            if now - self._last_sweep >= SWEEP_INTERVAL:
+                self._sweep(now)
+            
+            capacity, rate = self._global_limit
+            self._global[0] = min(capacity, self._global[0] + (now - self._global[1]) * rate)
+            self._global[1] = now
+            if self._global[0] < 1.0:
+                await asyncio.sleep((1.0 - self._global[0]) / rate)
+                continue
+            
+            found, earliest = self._next_ready(now)
+            if found is None:
+                # Ждем освобождения чата или нового сообщения
+                timeout = None if earliest == float('inf') else max(earliest - now, 0.001)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            lane, index = found
+            chat_id, future, enqueued = self._lanes[lane][index]
+            del self._lanes[lane][index]
+            self._global[0] -= 1.0
+            self._take_chat(chat_id, now)
+            self.sent[lane] += 1
+            self._waits[lane].append(now - enqueued)
+            future.set_result(None)
+    
+    def _sweep(self, now: float) -> None:
+        """Удаление лимитов чатов, которые уже полностью восстановились"""
+        self._last_sweep = now
+        idle = []
+        for chat_id, (tokens, updated, paused_until) in self._chats.items():
+            capacity, rate = self._chat_limit(chat_id)
+            if paused_until <= now and tokens + (now - updated) * rate >= capacity:
+                idle.append(chat_id)
+        for chat_id in idle:
+            del self._chats[chat_id]
+    
+    def stats(self) -> Dict[str, Any]:
+        """Метрики очереди по полосам: глубина, отправлено, время ожидания"""
+        lanes = {}
+        for lane in Lane:
+            waits = sorted(self._waits[lane])
+            lanes[lane.name.lower()] = {
+                'queued': len(self._lanes[lane]),
+                'sent': self.sent[lane],
+                'avg_wait_ms': sum(waits) / len(waits) * 1000 if waits else 0.0,
+                'p95_wait_ms': waits[int(len(waits) * 0.95)] * 1000 if waits else 0.0
+            }
+        return {'lanes': lanes, 'chats_tracked': len(self._chats), 'retry_after': self.retry_after}
+    
+    def report(self) -> str:
+        stats = self.stats()
+        lanes = ", ".join(
+            f"{name}: {lane['sent']} (очередь {lane['queued']}, p95 {lane['p95_wait_ms']:.0f} мс)"
+            for name, lane in stats['lanes'].items()
+        )
+        return f"📮 Отправка в Telegram: {lanes}; RetryAfter: {stats['retry_after']}"
+
+# Глобальный планировщик отправки (подключается к сессии бота в main.create_bot)
+send_scheduler = SendScheduler()
\ No newline at end of file
@@ -0,0 +1,89 @@
+import asyncio
+import html
+import time
+from typing import Optional
+
+from aiogram.types import Message
+from aiogram.exceptions import TelegramRetryAfter, TelegramBadRequest
+
+# Лимит Telegram на длину текста сообщения (с запасом под HTML сущности)
+MESSAGE_LIMIT = 4000
+CURSOR = " ▌"
+
+class StreamRenderer:
+    """Постепенный вывод потокового ответа в сообщение Telegram через edit_text"""
+    
+    def __init__(self, message: Message, min_interval: float = 1.0, max_interval: float = 10.0):
+        self.message = message
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.text = ""
+        self._rendered = ""
+        self._last_edit = 0.0
+    
+    async def feed(self, delta: str) -> None:
+        """Добавляет фрагмент ответа и при необходимости обновляет сообщение"""
+        self.text += delta
+        
+        # Ответ не помещается в одно сообщение - фиксируем готовую часть и продолжаем в новом
+        while len(html.escape(self.text, quote=False)) > MESSAGE_LIMIT:
+            cut = self._split_position(self.text)
+            head, self.text = self.text[:cut], self.text[cut:].lstrip()
+            await self._edit(html.escape(head, quote=False), force=True)
+            self.message = await self.message.answer("✍️")
+            self._rendered = ""
+        
+        if time.monotonic() - self._last_edit >= self.interval:
+            await self._edit(html.escape(self.text, quote=False) + CURSOR)
+    
+    async def finish(self) -> str:
+        """Финальное обновление сообщения без курсора"""
+        final_text = html.escape(self.text.strip(), quote=False) or "🤷"
+        await self._edit(final_text, force=True)
+        return self.text
+    
+    async def _edit(self, rendered: str, force: bool = False) -> None:
+        """Редактирование сообщения с адаптацией частоты к лимитам Telegram"""
+        if rendered == self._rendered:
+            return
+        
+        started = time.monotonic()
+        try:
+            await self.message.edit_text(rendered)
+            self._rendered = rendered
+            # Медленный ответ API - признак нагрузки, реже редактируем
+            if time.monotonic() - started > self.interval / 2:
+                self.interval = min(self.interval * 1.5, self.max_interval)
+            else:
+                self.interval = max(self.interval * 0.9, self.min_interval)
+        except TelegramRetryAfter as e:
+            self.interval = min(max(self.interval * 2, float(e.retry_after)), self.max_interval)
+            print(f"⚠️ Лимит редактирования, интервал увеличен до {self.interval:.1f} с")
+            if force:
+                await asyncio.sleep(e.retry_after)
+                await self.message.edit_text(rendered)
+                self._rendered = rendered
+        except TelegramBadRequest as e:
+            # "message is not modified" и подобные ошибки не критичны для промежуточных правок
+            if force and "not modified" not in str(e):
+                raise
+        finally:
+            self._last_edit = time.monotonic()
+    
+    @staticmethod
+    def _split_position(text: str) -> int:
+        """Позиция разреза текста, чтобы экранированная часть поместилась в сообщение"""
+        cut = min(len(text), MESSAGE_LIMIT)
+        while cut > 0 and len(html.escape(text[:cut], quote=False)) > MESSAGE_LIMIT:
+            cut -= 200
+        cut = max(cut, 1)
+        
+        # Стараемся резать по переводу строки или пробелу
+        boundary: Optional[int] = None
+        for separator in ("\n", " "):
+            position = text.rfind(separator, 0, cut)
+            if position > cut // 2:
+                boundary = position
+                break
+        return boundary or cut
\ No newline at end of file
@@ -0,0 +1,159 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from utils.config_loader import config, Settings, parse_rate
+
+# Маршруты с отдельными лимитами (флаг rate_limit у обработчика) и настройки, из которых они берутся
+ROUTES = {
+    'default': 'rate_limit_default',
+    'chat': 'rate_limit_chat',
+    'payment': 'rate_limit_payment',
+    'referral': 'rate_limit_referral',
+}
+
+THROTTLED_MESSAGE = "⏳ Слишком много запросов. Подождите немного и попробуйте снова."
+
+# Повторное предупреждение о превышении лимита - не чаще раза в столько секунд
+WARN_INTERVAL = 10.0
+
+# Как часто удалять записи простаивающих пользователей, секунды
+SWEEP_INTERVAL = 60.0
+
+class TokenBuckets:
+    """Таблица токен-бакетов: (user_id, маршрут) -> [токены, время обновления, время предупреждения]
+    
+    Полный бакет ничем не отличается от отсутствующего, поэтому записи простаивающих
+    пользователей периодически удаляются без потери состояния.
+    """
+    
+    def __init__(self):
+        self._buckets: Dict[Tuple[int, str], List[float]] = {}
+        self._limits: Dict[str, Tuple[float, float]] = {}
+        self._global: List[float] = [0.0, 0.0]
+        self._global_limit: Optional[Tuple[float, float]] = None
+        self._version = -1
+        self._last_sweep = time.monotonic()
+        self.allowed = 0
+        self.throttled = 0
+        self.throttled_global = 0
+    
+    def _apply_settings(self, settings: Settings) -> None:
+        """Лимиты разбираются один раз на снимок настроек"""
+        self._limits = {route: parse_rate(getattr(settings, name)) for route, name in ROUTES.items()}
+        self._global_limit = parse_rate(settings.rate_limit_global)
+        self._global = [self._global_limit[0], time.monotonic()]
+        self._version = settings.version
+    
+    @staticmethod
+    def _take(bucket: List[float], capacity: float, rate: float, now: float) -> bool:
+        bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if bucket[0] < 1.0:
+            return False
+        bucket[0] -= 1.0
+        return True
+    
+    def check(self, user_id: int, route: str, global_bucket: bool = False) -> Tuple[bool, bool]:
+        """Списание токена. Возвращает (разрешено, нужно ли предупредить пользователя)"""
+        settings = config.current
+        if settings.version != self._version:
+            self._apply_settings(settings)
+        
+        now = time.monotonic()
+        if now - self._last_sweep >= SWEEP_INTERVAL:
+            self._sweep(now)
+        
+        capacity, rate = self._limits.get(route, self._limits['default'])
+        key = (user_id, route)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [capacity, now, 0.0]
+        
+        if not self._take(bucket, capacity, rate, now):
+            self.throttled += 1
+            return False, self._should_warn(bucket, now)
+        
+        # Общий бакет защищает базу и LLM от суммарного всплеска всех пользователей
+        if global_bucket and not self._take(self._global, *self._global_limit, now):
+            bucket[0] += 1.0
+            self.throttled_global += 1
+            return False, self._should_warn(bucket, now)
+        
+        self.allowed += 1
+        return True, False
+    
+    @staticmethod
+    def _should_warn(bucket: List[float], now: float) -> bool:
+        if now - bucket[2] < WARN_INTERVAL:
+            return False
+        bucket[2] = now
+        return True
+    
+    def _sweep(self, now: float) -> None:
+        """Удаление записей, бакеты которых уже пополнились до полного"""
+        self._last_sweep = now
+        idle = []
+        for key, (tokens, updated, warned) in self._buckets.items():
+            capacity, rate = self._limits.get(key[1], self._limits['default'])
+            if tokens + (now - updated) * rate >= capacity and now - warned >= WARN_INTERVAL:
+                idle.append(key)
+        for key in idle:
+            del self._buckets[key]
+    
+    def report(self) -> str:
+        return (f"🚧 Антифлуд: пропущено {self.allowed}, отклонено {self.throttled} "
+                f"(из них по общему лимиту {self.throttled_global}), записей в таблице {len(self._buckets)}")
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Ограничение частоты апдейтов от одного пользователя.
+    
+    Внешний экземпляр (outer=True) срабатывает до фильтров и ограничивает все апдейты
+    пользователя лимитом default. Внутренний - после выбора обработчика, по его флагу
+    rate_limit (например, flags={"rate_limit": "chat"}), и дополнительно расходует общий бакет.
+    """
+    
+    def __init__(self, buckets: TokenBuckets, outer: bool = False):
+        self.buckets = buckets
+        self.outer = outer
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or not config.current.rate_limit_enabled:
+            return await handler(event, data)
+        
+        if self.outer:
+            allowed, warn = self.buckets.check(user.id, 'default')
+        else:
+            route = get_flag(data, "rate_limit")
+            if route is None:
+                return await handler(event, data)
+            allowed, warn = self.buckets.check(user.id, route, global_bucket=True)
+        
+        if allowed:
+            return await handler(event, data)
+        await self._reject(event, warn)
+        return None
+    
+    @staticmethod
+    async def _reject(event: TelegramObject, warn: bool) -> None:
+        """Дешевый ответ на лишний апдейт: без обращений к базе, не чаще одного сообщения"""
+        try:
+            if isinstance(event, CallbackQuery):
+                # Кнопку нужно погасить в любом случае, иначе у клиента висит индикатор загрузки
+                await event.answer(THROTTLED_MESSAGE if warn else None)
+            elif isinstance(event, Message) and warn:
+                await event.answer(THROTTLED_MESSAGE)
+        except Exception as e:
+            print(f"❌ Ошибка ответа на отклоненный апдейт: {e}")
+
+# Глобальная таблица лимитов (в многопроцессном режиме - своя в каждом воркере)
+rate_limiter = TokenBuckets()
\ No newline at end of file
@@ -2,7 +2,7 @@ from aiohttp import web, web_request
 import json
 from database.queries import UserQueries, PaymentQueries
 from services.payment_service import PaymentService
-from handlers.payments import process_successful_payment
+from handlers.payments import process_successful_payment, complete_payment
 
 class PaymentWebhook:
     """Веб-хук для обработки уведомлений о платежах"""
@@ -30,19 +30,8 @@ class PaymentWebhook:
             account_id = data.get('AccountId')  # user_id
             
             if status == 'Completed' and payment_id and account_id:
-                user_id = int(account_id)
-                
-                # Обновляем статус платежа в БД
-                await PaymentQueries.update_payment_status(payment_id, 'completed')
-                
-                # Определяем тариф (нужно получить из БД)
-                # TODO: Добавить в PaymentQueries метод для получения данных платежа
-                
-                # Временно берем тариф 1 (нужно доработать)
-                tariff_type = 1
-                
-                # Обрабатываем успешный платеж
-                await process_successful_payment(user_id, tariff_type, amount, 0.0, bot=None, is_test=False)
+                # Тариф и скидка берутся из записи платежа; повторное уведомление игнорируется
+                await complete_payment(payment_id, amount, bot=None)
                 
                 return web.Response(status=200, text="OK")
             